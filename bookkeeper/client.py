@@ -1,12 +1,43 @@
 """
 Основной модуль, обеспечивающий взаимодействие интерфейса и базы данных
 """
-from typing import Optional
+from dataclasses import replace
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Optional
 from bookkeeper.view.view import View
+from bookkeeper.repository.change_watcher import ChangeWatcher
+from bookkeeper.repository.changes import DELETED, Change, apply_changes
+from bookkeeper.repository.columns import Column, Money, Timestamp
+from bookkeeper.repository.migrations import Migrator
+from bookkeeper.repository.path_repository import PathRepository
+from bookkeeper.repository.query import Ge, Lt
+from bookkeeper.repository.replicated_repository import ReplicatedRepository
+from bookkeeper.repository.sqlite_connection import ConnectionManager
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
-from bookkeeper.models.expense import Expense, ExpenseWithStringDate
-from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category, CategoryTree
 from bookkeeper.models.budget import Budget
+from bookkeeper.models.migrations import MIGRATIONS
+
+# журнал изменений очищается от прочитанных записей раз в PRUNE_INTERVAL
+# опросов, чтобы он не рос, пока приложение открыто
+PRUNE_INTERVAL = 600
+
+
+def _stored(column: Column, value: Any) -> Any:
+    """
+    Значение, введенное в интерфейсе, в том виде, в каком оно будет
+    прочитано из столбца базы данных (сумма - Decimal с копейками,
+    дата - datetime)
+
+    Параметры
+    ----------
+    column - столбец базы данных
+    value - значение
+
+    """
+    return column.from_db(column.to_db(value))
 
 
 class Bookkeeper:
@@ -14,45 +45,129 @@ class Bookkeeper:
     Описывает взаимодействие интерфейса и базы данных.
     view - интерфейс
     db_path - путь к базе данных
-    cat_repo - репозиторий категорий
-    cats - категории
+    connection - общее соединение с базой данных для всех репозиториев
+    cat_repo - репозиторий категорий (чтение из копии в памяти,
+    запись в базу данных), аналогично exp_repo
+    cats - категории (обновляются по уведомлениям об изменениях cat_repo)
+    cat_tree - иерархия категорий (обновляется вместе с cats)
     exp_repo - репозиторий расходов
-    expenses - расходы
+    expenses - расходы в порядке убывания даты (обновляются
+    по уведомлениям об изменениях exp_repo)
     budget_repo - репозиторий бюджета
     budget_data - данные о бюджете и сумме расходов за определенный период
+    watcher - наблюдатель за изменениями базы данных другими процессами
+    (использует общее соединение, поэтому изменения, сделанные самим
+    приложением, не перечитываются)
+    polls - число опросов наблюдателя
     """
     def __init__(self, db_path: str) -> None:
         self.view = View()
         self.view.resize(600, 900)
         self.db_path = db_path
-        self.cat_repo: SQLiteRepository[Category] = SQLiteRepository(self.db_path,
-                                                                     Category)
+        self.connection = ConnectionManager(self.db_path)
+        Migrator(self.connection, MIGRATIONS).migrate()
+        cat_store: PathRepository[Category] = PathRepository(self.db_path,
+                                                             Category,
+                                                             self.connection)
+        exp_store: SQLiteRepository[Expense] = SQLiteRepository(self.db_path, Expense,
+                                                                self.connection)
+        self.budget_repo: SQLiteRepository[Budget] = SQLiteRepository(self.db_path,
+                                                                      Budget,
+                                                                      self.connection)
+        self.cat_repo = ReplicatedRepository(cat_store, hash_indexes=['parent', 'name'])
+        self.exp_repo = ReplicatedRepository(exp_store, hash_indexes=['category'],
+                                             sorted_indexes=['expense_date'])
+
         self.cats = self.cat_repo.get_all()
+        self.cat_tree = CategoryTree(self.cats)
+        self.cat_repo.subscribe(self.on_cat_changes)
         self.view.category_tab.cat_table.set_data(self.cats)
         self.view.category_tab.cat_table.register_cat_adder(self.add_cat)
         self.view.category_tab.cat_table.register_cat_deleter(self.delete_cat)
         self.view.category_tab.cat_table.register_cat_updater(self.update_cat)
 
-        self.exp_repo: SQLiteRepository[ExpenseWithStringDate] = \
-            SQLiteRepository(self.db_path, Expense)
-        self.expenses = self.exp_repo.get_all()
+        self.expenses = self.exp_repo.get_all(order_by='-expense_date')
+        self.exp_repo.subscribe(self.on_exp_changes)
         self.view.expense_tab.expense_table.set_categories(self.cats)
         self.view.expense_tab.expense_table.set_data(self.expenses)
         self.view.expense_tab.expense_table.register_expense_adder(self.add_exp)
         self.view.expense_tab.expense_table.register_expense_deleter(self.delete_exp)
         self.view.expense_tab.expense_table.register_expense_updater(self.update_expense)
 
-        self.budget_repo: SQLiteRepository[Budget] = SQLiteRepository(self.db_path,
-                                                                      Budget)
         self.budget_data = self.budget_repo.get_all()
         if len(self.budget_data) == 0:
-            self.budget_repo.add(Budget(amount=0, budget=1000))
-            self.budget_repo.add(Budget(amount=0, budget=7000))
-            self.budget_repo.add(Budget(amount=0, budget=30000))
-        self.view.budget_tab.budget_table.set_expenses(self.expenses)
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(1000)))
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(7000)))
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(30000)))
+        self.view.budget_tab.budget_table.register_amounts_getter(self.budget_amounts)
         self.view.budget_tab.budget_table.set_data(self.budget_data)
         self.view.budget_tab.budget_table.register_budget_updater(self.update_budget)
 
+        self.watcher = ChangeWatcher(self.db_path, [Category, Expense],
+                                     self.connection)
+        self.watcher.prune()
+        self.polls = 0
+        self.view.register_change_poller(self.sync_external_changes)
+
+    def sync_external_changes(self) -> None:
+        """
+        Применяет изменения базы данных, сделанные другими процессами,
+        к копиям репозиториев в памяти и обновляет отображение интерфейса
+
+        """
+        changes = self.watcher.poll()
+        self.polls += 1
+        if self.polls % PRUNE_INTERVAL == 0:
+            self.watcher.prune()
+        changed = False
+        for repo in (self.cat_repo, self.exp_repo):
+            pks = [change.pk for change in changes if change.model is repo.store.cls]
+            if pks and repo.sync(pks):
+                changed = True
+        if not changed:
+            return
+        self.view.category_tab.cat_table.set_data(self.cats)
+        self.view.expense_tab.expense_table.set_categories(self.cats)
+        self.view.expense_tab.expense_table.set_data(self.expenses)
+        self.view.budget_tab.budget_table.set_data(self.budget_data)
+
+    def on_cat_changes(self, changes: list[Change]) -> None:
+        """
+        Применяет изменения репозитория категорий к списку и иерархии
+        категорий
+
+        Параметры
+        ----------
+        changes - изменения
+
+        """
+        apply_changes(self.cats, changes, self.cat_repo.get_many)
+        fresh = self.cat_repo.get_many(change.pk for change in changes
+                                       if change.kind != DELETED)
+        for change in changes:
+            cat = fresh.get(change.pk)
+            if change.kind == DELETED or cat is None:
+                if change.pk in self.cat_tree:
+                    self.cat_tree.delete(change.pk)
+            elif change.pk in self.cat_tree:
+                self.cat_tree.update(cat)
+            else:
+                self.cat_tree.add(cat)
+
+    def on_exp_changes(self, changes: list[Change]) -> None:
+        """
+        Применяет изменения репозитория расходов к списку расходов,
+        сохраняя порядок убывания даты
+
+        Параметры
+        ----------
+        changes - изменения
+
+        """
+        apply_changes(self.expenses, changes, self.exp_repo.get_many)
+        if any(change.kind != DELETED for change in changes):
+            self.expenses.sort(key=lambda exp: (exp.expense_date, exp.pk), reverse=True)
+
     def add_cat(self, name: str, parent: int | None) -> None:
         """
         Добавляет категорию с/без родителем/я в баззу данных
@@ -66,7 +181,6 @@ class Bookkeeper:
         """
         cat = Category(name, parent)
         self.cat_repo.add(cat)
-        self.cats.append(cat)
         self.view.category_tab.cat_table.set_data(self.cats)
 
     def delete_cat(self, category: Category) -> None:
@@ -81,17 +195,15 @@ class Bookkeeper:
 
         """
         cat_subs_list = self.find_subs(category, [])
-        for cat in cat_subs_list:
-            self.cat_repo.delete(cat.pk)
-            self.cats.remove(cat)
-            for expense in self.expenses:
-                if expense.category == cat.name:
-                    self.exp_repo.delete(expense.pk)
-                    self.expenses.remove(expense)
+        cat_names = {cat.name for cat in cat_subs_list}
+        cat_pks = {cat.pk for cat in cat_subs_list}
+        with self.cat_repo.transaction(), self.exp_repo.transaction():
+            self.cat_repo.delete_many(cat_pks)
+            self.exp_repo.delete_many(expense.pk for expense in self.expenses
+                                      if expense.category in cat_names)
 
         self.view.category_tab.cat_table.set_data(self.cats)
         self.view.expense_tab.expense_table.set_data(self.expenses)
-        self.view.budget_tab.budget_table.set_expenses(self.expenses)
         self.view.budget_tab.budget_table.set_data(self.budget_data)
         budgets = self.view.budget_tab.budget_table.get_data_from_table()
         amounts = [str(budgets[0].amount), str(budgets[1].amount), str(budgets[2].amount)]
@@ -111,9 +223,7 @@ class Bookkeeper:
 
         """
         cat_subs_list.append(category)
-        sub_cats = self.cat_repo.get_all({'parent': category.pk})
-        for sub_cat in sub_cats:
-            self.find_subs(sub_cat, cat_subs_list)
+        cat_subs_list.extend(self.cat_tree.get_subtree(category.pk))
         return cat_subs_list
 
     def update_cat(self, pk: int, new_name: str, new_parent: Optional[int]) -> None:
@@ -128,22 +238,13 @@ class Bookkeeper:
 
         """
         new_cat = Category(pk=pk, name=new_name, parent=new_parent)
-        old_cat = self.cat_repo.get_all({'pk': pk})[0]
-        self.cat_repo.update(new_cat)
-        for cat in self.cats:
-            if cat.pk == new_cat.pk:
-                cat.name = new_cat.name
-                cat.parent = new_cat.parent
-
-        for expense in self.expenses:
-            if expense.category == old_cat.name:
-                new_expense = ExpenseWithStringDate(pk=expense.pk,
-                                                    expense_date=expense.expense_date,
-                                                    amount=expense.amount,
-                                                    category=new_name,
-                                                    comment=expense.comment)
-                self.exp_repo.update(new_expense)
-                expense.category = new_name
+        old_cat = self.cat_repo.get_many([pk])[pk]
+        new_expenses = [replace(expense, category=new_name)
+                        for expense in self.expenses
+                        if expense.category == old_cat.name]
+        with self.cat_repo.transaction(), self.exp_repo.transaction():
+            self.cat_repo.update(new_cat)
+            self.exp_repo.update_many(new_expenses)
 
         self.view.category_tab.cat_table.set_data(self.cats)
         self.view.expense_tab.expense_table.set_data(self.expenses)
@@ -161,19 +262,17 @@ class Bookkeeper:
         comment - комментарий
 
         """
-        expense = ExpenseWithStringDate(amount=summ, category=cat,
-                                        comment=comment, expense_date=date)
+        expense = Expense(amount=_stored(Money(), summ), category=cat, comment=comment,
+                          expense_date=_stored(Timestamp(), date))
         self.exp_repo.add(expense)
-        self.expenses = self.exp_repo.get_all()
         self.view.expense_tab.expense_table.set_data(self.expenses)
-        self.view.budget_tab.budget_table.set_expenses(self.expenses)
         self.view.budget_tab.budget_table.set_data(self.budget_data)
         budgets = self.view.budget_tab.budget_table.get_data_from_table()
         amounts = [str(budgets[0].amount), str(budgets[1].amount), str(budgets[2].amount)]
         self.update_budget(str(budgets[0].budget), str(budgets[1].budget),
                            str(budgets[2].budget), amounts)
 
-    def delete_exp(self, expense: ExpenseWithStringDate) -> None:
+    def delete_exp(self, expense: Expense) -> None:
         """
         Удаляет расход из базы данных и обновляет отображение интерфейса
 
@@ -183,9 +282,7 @@ class Bookkeeper:
 
         """
         self.exp_repo.delete(expense.pk)
-        self.expenses.remove(expense)
         self.view.expense_tab.expense_table.set_data(self.expenses)
-        self.view.budget_tab.budget_table.set_expenses(self.expenses)
         self.view.budget_tab.budget_table.set_data(self.budget_data)
         budgets = self.view.budget_tab.budget_table.get_data_from_table()
         amounts = [str(budgets[0].amount), str(budgets[1].amount), str(budgets[2].amount)]
@@ -206,25 +303,49 @@ class Bookkeeper:
         new_com - новый комментарий
 
         """
-        new_expense = ExpenseWithStringDate(pk=pk, expense_date=new_date,
-                                            amount=new_summ, category=new_cat,
-                                            comment=new_com)
+        new_expense = Expense(pk=pk, expense_date=_stored(Timestamp(), new_date),
+                              amount=_stored(Money(), new_summ), category=new_cat,
+                              comment=new_com)
         self.exp_repo.update(new_expense)
-        self.expenses = self.exp_repo.get_all()
-        for expense in self.expenses:
-            if expense.pk == new_expense.pk:
-                expense.expense_date = new_date
-                expense.amount = new_expense.amount
-                expense.category = new_expense.category
-                expense.comment = new_expense.comment
         self.view.expense_tab.expense_table.set_data(self.expenses)
-        self.view.budget_tab.budget_table.set_expenses(self.expenses)
         self.view.budget_tab.budget_table.set_data(self.budget_data)
         budgets = self.view.budget_tab.budget_table.get_data_from_table()
         amounts = [str(budgets[0].amount), str(budgets[1].amount), str(budgets[2].amount)]
         self.update_budget(str(budgets[0].budget), str(budgets[1].budget),
                            str(budgets[2].budget), amounts)
 
+    def budget_amounts(self, now: datetime) -> tuple[float, float, float]:
+        """
+        Вычисляет суммы расходов за текущие день, неделю и месяц одним
+        запросом к базе данных: суммы за каждый день текущего месяца
+
+        Параметры
+        ----------
+        now - текущее время
+
+        """
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        day_sums = self.exp_repo.aggregate('sum', 'amount',
+                                           where=Ge('expense_date', month_start)
+                                           & Lt('expense_date', next_month),
+                                           group_by='expense_date', period='day')
+        week_start = (now - timedelta(days=now.weekday())).strftime('%Y-%m-%d')
+        week_end = (now + timedelta(days=7 - now.weekday())).strftime('%Y-%m-%d')
+        today = now.strftime('%Y-%m-%d')
+        day_amount = 0.0
+        week_amount = 0.0
+        month_amount = 0.0
+        for day, amount in day_sums.items():
+            if amount is None:
+                continue
+            month_amount += float(amount)
+            if week_start <= day < week_end:
+                week_amount += float(amount)
+                if day == today:
+                    day_amount += float(amount)
+        return day_amount, week_amount, month_amount
+
     def update_budget(self, day_budget: str, week_budget: str,
                       month_budget: str, amounts: list[str]) -> None:
         """
@@ -240,15 +361,17 @@ class Bookkeeper:
 
 
         """
-        day_budget_data = Budget(pk=1, budget=day_budget, amount=amounts[0])
-        week_budget_data = Budget(pk=2, budget=week_budget, amount=amounts[1])
-        month_budget_data = Budget(pk=3, budget=month_budget, amount=amounts[2])
-        self.budget_repo.update(day_budget_data)
-        self.budget_repo.update(week_budget_data)
-        self.budget_repo.update(month_budget_data)
-        self.budget_data[0].budget = day_budget
-        self.budget_data[1].budget = week_budget
-        self.budget_data[2].budget = month_budget
+        day_budget_data = Budget(pk=1, budget=_stored(Money(), day_budget),
+                                 amount=_stored(Money(), amounts[0]))
+        week_budget_data = Budget(pk=2, budget=_stored(Money(), week_budget),
+                                  amount=_stored(Money(), amounts[1]))
+        month_budget_data = Budget(pk=3, budget=_stored(Money(), month_budget),
+                                   amount=_stored(Money(), amounts[2]))
+        self.budget_repo.update_many([day_budget_data, week_budget_data,
+                                      month_budget_data])
+        self.budget_data[0].budget = day_budget_data.budget
+        self.budget_data[1].budget = week_budget_data.budget
+        self.budget_data[2].budget = month_budget_data.budget
         self.view.budget_tab.budget_table.set_data(self.budget_data)
 
     def clear_db(self) -> None:
@@ -256,15 +379,11 @@ class Bookkeeper:
         Очистка базы данных
 
         """
-        for expense in self.expenses:
-            self.exp_repo.delete(expense.pk)
-        self.expenses = []
-        for cat in self.cats:
-            self.cat_repo.delete(cat.pk)
-        self.cats = []
-        for budget in self.budget_data:
-            self.budget_repo.delete(budget.pk)
-        self.budget_repo.add(Budget(amount=0, budget=1000))
-        self.budget_repo.add(Budget(amount=0, budget=7000))
-        self.budget_repo.add(Budget(amount=0, budget=30000))
+        with self.cat_repo.transaction(), self.exp_repo.transaction():
+            self.exp_repo.delete_many(expense.pk for expense in self.expenses)
+            self.cat_repo.delete_many(cat.pk for cat in self.cats)
+            self.budget_repo.delete_many(budget.pk for budget in self.budget_data)
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(1000)))
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(7000)))
+            self.budget_repo.add(Budget(amount=Decimal(0), budget=Decimal(30000)))
         self.view.budget_tab.budget_table.set_data(self.budget_data)
@@ -2,6 +2,10 @@
 Модель бюджета
 """
 from dataclasses import dataclass
+from decimal import Decimal
+from typing import Annotated
+
+from ..repository.columns import Money
 
 
 @dataclass
@@ -11,8 +15,9 @@ class Budget:
 
     amount - сумма расходов за определенный период
     budget - заданный бюджет на определенный период
+    (суммы хранятся в базе данных целыми числами копеек)
     pk - первчиный ключ записи бюджета на определенный период
     """
-    amount: float | str
-    budget: float | str
+    amount: Annotated[Decimal, Money()]
+    budget: Annotated[Decimal, Money()]
     pk: int = 0
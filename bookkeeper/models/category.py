@@ -1,9 +1,9 @@
 """
 Модель категории расходов
 """
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Iterator
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator
 
 from ..repository.abstract_repository import AbstractRepository
 
@@ -14,7 +14,10 @@ class Category:
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
+    __indexes__ - индексы таблицы категорий в базе данных
     """
+    __indexes__ = (('parent',), ('name',))
+
     name: str
     parent: int | None = None
     pk: int = 0
@@ -42,6 +45,8 @@ class Category:
                         ) -> Iterator['Category']:
         """
         Получить все категории верхнего уровня в иерархии.
+        Предки родителя получаются методом репозитория get_ancestors
+        (в sqlite - одним рекурсивным запросом).
 
         Parameters
         ----------
@@ -55,7 +60,7 @@ class Category:
         if parent is None:
             return
         yield parent
-        yield from parent.get_all_parents(repo)
+        yield from repo.get_ancestors(parent.pk)
 
     def get_subcategories(self,
                           repo: AbstractRepository['Category']
@@ -63,6 +68,8 @@ class Category:
         """
         Получить все подкатегории из иерархии, т.е. непосредственные
         подкатегории данной, все их подкатегории и т.д.
+        Подкатегории получаются методом репозитория get_subtree
+        (в sqlite - одним рекурсивным запросом).
 
         Parameters
         ----------
@@ -70,29 +77,21 @@ class Category:
 
         Yields
         -------
-        Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
+        Объекты Category, являющиеся подкатегориями разного уровня ниже данной,
+        по уровням иерархии.
         """
-
-        def get_children(graph: dict[int | None, list['Category']],
-                         root: int) -> Iterator['Category']:
-            """ dfs in graph from root """
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        yield from repo.get_subtree(self.pk)
 
     @classmethod
     def create_from_tree(
             cls,
-            tree: list[tuple[str, str | None]],
-            repo: AbstractRepository['Category']) -> list['Category']:
+            tree: Iterable[tuple[str, str | None]],
+            repo: AbstractRepository['Category'],
+            batch_size: int = 1000) -> list['Category']:
         """
-        Создать дерево категорий из списка пар "потомок-родитель".
-        Список должен быть топологически отсортирован, т.е. потомки
+        Создать дерево категорий из пар "потомок-родитель" (список или
+        поток, например read_tree от файла).
+        Пары должны быть топологически отсортированы, т.е. потомки
         не должны встречаться раньше своего родителя.
         Проверка корректности исходных данных не производится.
         При использовании СУБД с проверкой внешних ключей, будет получена
@@ -100,19 +99,361 @@ class Category:
         со стороны СУБД, результат, возможно, будет корректным, если исходные
         данные корректны за исключением сортировки. Если нет, то нет.
         "Мусор на входе, мусор на выходе".
+        Пары читаются пакетами по batch_size; категории пакета добавляются
+        методом add_many, по одному вызову на уровень дерева в пакете,
+        а все пакеты - в одной транзакции, если репозиторий их поддерживает
+        (метод transaction). Родитель ищется среди предков предыдущей
+        категории, поэтому для пар в порядке обхода в глубину (как их
+        возвращает read_tree) словарь всех категорий не нужен; родитель
+        в другом месте дерева ищется в репозитории по названию.
 
         Parameters
         ----------
-        tree - список пар "потомок-родитель"
+        tree - пары "потомок-родитель"
         repo - репозиторий для сохранения объектов
+        batch_size - количество категорий в пакете
 
         Returns
         -------
-        Список созданных объектов Category
-        """
-        created: dict[str, Category] = {}
-        for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
-        return list(created.values())
+        Список созданных объектов Category в порядке tree
+        """
+        if batch_size <= 0:
+            raise ValueError('batch_size must be positive')
+        loader = _TreeLoader(repo)
+        transaction = getattr(repo, 'transaction', nullcontext)
+        with transaction():
+            for child, parent in tree:
+                loader.add(cls(child), parent)
+                if len(loader.created) % batch_size == 0:
+                    loader.flush()
+            loader.flush()
+        return loader.created
+
+    @staticmethod
+    def export_tree(repo: AbstractRepository['Category']
+                    ) -> Iterator[tuple[str, str | None]]:
+        """
+        Получить дерево категорий в виде пар "потомок-родитель"
+        в порядке обхода в глубину (обратное к create_from_tree).
+        Категории читаются методом репозитория iter_tree, в памяти
+        хранятся только предки текущей категории.
+
+        Parameters
+        ----------
+        repo - репозиторий категорий
+
+        Yields
+        -------
+        Пары "потомок-родитель", как их возвращает read_tree
+        """
+        path: list[Category] = []
+        for cat in repo.iter_tree():
+            while path and path[-1].pk != cat.parent:
+                path.pop()
+            yield cat.name, path[-1].name if path else None
+            path.append(cat)
+
+
+class _TreeLoader:
+    """
+    Пакет категорий для Category.create_from_tree
+
+    created - все добавленные категории
+    path - предки последней категории и их уровни в текущем пакете
+    (-1 у уже сохраненных)
+    levels - категории пакета с их родителями по уровням в пакете
+    """
+
+    def __init__(self, repo: AbstractRepository[Category]) -> None:
+        self.repo = repo
+        self.created: list[Category] = []
+        self.path: list[tuple[Category, int]] = []
+        self.levels: list[list[tuple[Category, Category | None]]] = []
+
+    def add(self, cat: Category, parent: str | None) -> None:
+        """ Добавить категорию с родителем с названием parent в пакет """
+        path = self.path
+        while path and path[-1][0].name != parent:
+            path.pop()
+        if parent is not None and not path:
+            path.append((self.find(parent), -1))
+        parent_cat, parent_level = path[-1] if path else (None, -1)
+        level = 0 if parent_cat is None or parent_cat.pk else parent_level + 1
+        if level == len(self.levels):
+            self.levels.append([])
+        self.levels[level].append((cat, parent_cat))
+        path.append((cat, level))
+        self.created.append(cat)
+
+    def find(self, name: str) -> Category:
+        """ Сохранить пакет и найти в репозитории категорию по названию """
+        self.flush()
+        found = self.repo.get_all({'name': name})
+        if not found:
+            raise KeyError(name)
+        return found[-1]
+
+    def flush(self) -> None:
+        """ Сохранить пакет: по одному вызову add_many на уровень """
+        for level_cats in self.levels:
+            for cat, parent_cat in level_cats:
+                cat.parent = None if parent_cat is None else parent_cat.pk
+            self.repo.add_many([cat for cat, _ in level_cats])
+        self.levels.clear()
+
+
+class CategoryTree:
+    """
+    Иерархия категорий в памяти, построенная один раз и обновляемая
+    при изменениях (add, update, delete), чтобы не строить граф
+    категорий заново на каждую операцию.
+
+    Для каждой категории хранятся список детей, глубина (0 у категорий
+    верхнего уровня) и полный путь из названий от верхнего уровня
+    ('Еда / Фрукты'). Проверка "является ли категория потомком другой"
+    выполняется за O(1) по интервалам обхода в глубину (Эйлеров обход):
+    вход и выход категории помечены числами, и интервалы подкатегорий
+    лежат внутри интервала категории. Метки расставляются с большими
+    промежутками, поэтому новая или перенесенная категория занимает
+    свободный участок интервала родителя после его детей, не меняя
+    остальных меток, а удаление просто убирает метки поддерева. Только
+    когда в интервале родителя не остается места (после сотен добавлений
+    к одной категории без перестроения), метки всех категорий
+    расставляются заново за O(n). Объекты категорий в иерархии
+    не изменяются на месте: новое состояние передается в update.
+
+    Категория, родителя которой нет в иерархии (он удален или еще
+    не загружен), считается категорией верхнего уровня, пока родитель
+    не будет добавлен: в базе данных ссылка на родителя не проверяется.
+
+    separator - разделитель названий в полном пути
+    label_gap - промежуток между соседними метками при их расстановке
+    заново
+    """
+    separator = ' / '
+    label_gap = 1 << 96
+
+    def __init__(self, categories: Iterable[Category] = ()) -> None:
+        self._cats: dict[int, Category] = {}
+        self._children: dict[int | None, list[int]] = {None: []}
+        self._depth: dict[int, int] = {}
+        self._paths: dict[int, str] = {}
+        self._enter: dict[int, int] = {}
+        self._exit: dict[int, int] = {}
+        self._end = 0
+        for cat in categories:
+            if cat.pk in self._cats:
+                raise ValueError(f'category {cat.pk} is already in the tree')
+            self._cats[cat.pk] = cat
+            self._children.setdefault(cat.pk, [])
+            self._children.setdefault(cat.parent, []).append(cat.pk)
+        self._relabel()
+        if len(self._enter) != len(self._cats):
+            raise ValueError('categories form a cycle')
+        for pk in self._top():
+            self._place(pk)
+
+    @classmethod
+    def from_repo(cls, repo: AbstractRepository[Category]) -> 'CategoryTree':
+        """
+        Построить иерархию из всех категорий репозитория
+
+        Parameters
+        ----------
+        repo - репозиторий категорий
+        """
+        return cls(repo.iter_all())
+
+    def __len__(self) -> int:
+        return len(self._cats)
+
+    def __contains__(self, pk: object) -> bool:
+        return pk in self._cats
+
+    def __getitem__(self, pk: int) -> Category:
+        return self._cats[pk]
+
+    def _top(self) -> list[int]:
+        """ Категории верхнего уровня, в том числе с неизвестным родителем """
+        return [pk for parent, children in self._children.items()
+                if parent is None or parent not in self._cats for pk in children]
+
+    def roots(self) -> list[Category]:
+        """ Категории верхнего уровня """
+        return [self._cats[pk] for pk in self._top()]
+
+    def get_children(self, pk: int | None) -> list[Category]:
+        """ Непосредственные подкатегории категории pk (None - верхний уровень) """
+        return [self._cats[child] for child in self._children.get(pk, ())]
+
+    def depth(self, pk: int) -> int:
+        """ Глубина категории, 0 у категорий верхнего уровня """
+        return self._depth[pk]
+
+    def full_path(self, pk: int) -> str:
+        """ Названия категорий от верхнего уровня до категории pk """
+        return self._paths[pk]
+
+    def get_ancestors(self, pk: int) -> list[Category]:
+        """ Родитель категории, его родитель и т.д. до верхнего уровня """
+        result = []
+        parent = self._cats[pk].parent
+        while parent in self._cats:
+            cat = self._cats[parent]
+            result.append(cat)
+            parent = cat.parent
+        return result
+
+    def _walk(self, pks: Iterable[int]) -> Iterator[tuple[int, bool]]:
+        """
+        Обойти в глубину поддеревья категорий pks: (pk, False) при входе
+        в категорию, (pk, True) при выходе из нее
+        """
+        stack = [(pk, False) for pk in reversed(list(pks))]
+        while stack:
+            pk, done = stack.pop()
+            yield pk, done
+            if not done:
+                stack.append((pk, True))
+                stack.extend((child, False) for child in reversed(self._children[pk]))
+
+    def _relabel(self) -> None:
+        """ Расставить заново метки всех категорий за O(n) """
+        self._enter, self._exit = {}, {}
+        self._end = self._mark(self._walk(self._top()), 0, self.label_gap)
+
+    def _mark(self, events: Iterable[tuple[int, bool]], label: int, step: int) -> int:
+        """ Пометить события обхода метками label + step, label + 2 * step, ... """
+        for pk, done in events:
+            label += step
+            (self._exit if done else self._enter)[pk] = label
+        return label
+
+    def _label(self, pk: int) -> None:
+        """
+        Пометить поддерево категории pk, последней в списке детей своего
+        родителя, в свободном участке интервала родителя; если места нет,
+        расставить заново метки всех категорий
+        """
+        parent = self._cats[pk].parent
+        events = list(self._walk([pk]))
+        if parent not in self._cats:
+            self._end = self._mark(events, self._end, self.label_gap)
+            return
+        siblings = self._children[parent]
+        low = self._exit[siblings[-2]] if len(siblings) > 1 else self._enter[parent]
+        # после поддерева остается место еще для нескольких таких же
+        step = (self._exit[parent] - low) // (len(events) + 14)
+        if step:
+            self._mark(events, low, step)
+        else:
+            self._relabel()
+
+    def is_descendant(self, pk: int, ancestor: int) -> bool:
+        """ Является ли категория pk подкатегорией (любого уровня) ancestor """
+        return self._enter[ancestor] < self._enter[pk] < self._exit[ancestor]
+
+    def get_subtree(self, pk: int) -> list[Category]:
+        """ Все подкатегории категории pk в порядке обхода в глубину """
+        return [self._cats[sub] for sub, done in self._walk(self._children[pk])
+                if not done]
+
+    def _place(self, pk: int) -> None:
+        """ Вычислить глубину и путь категории pk и всех ее подкатегорий """
+        stack = [pk]
+        while stack:
+            current = stack.pop()
+            cat = self._cats[current]
+            if cat.parent not in self._cats:
+                self._depth[current] = 0
+                self._paths[current] = cat.name
+            else:
+                self._depth[current] = self._depth[cat.parent] + 1
+                self._paths[current] = self._paths[cat.parent] + self.separator + cat.name
+            stack.extend(self._children[current])
+
+    def _leads_to(self, parent: int | None, pk: int) -> bool:
+        """ Совпадает ли parent или кто-то из его предков с категорией pk """
+        while parent is not None:
+            if parent == pk:
+                return True
+            if parent not in self._cats:
+                return False
+            parent = self._cats[parent].parent
+        return False
+
+    def _unlink(self, pk: int, parent: int | None) -> None:
+        """ Убрать категорию pk из детей parent """
+        children = self._children[parent]
+        children.remove(pk)
+        if not children and parent is not None and parent not in self._cats:
+            del self._children[parent]
+
+    def add(self, cat: Category) -> None:
+        """
+        Добавить категорию; категории, ожидавшие ее как родителя,
+        становятся ее подкатегориями
+
+        Parameters
+        ----------
+        cat - категория с заполненным pk
+        """
+        if cat.pk in self._cats:
+            raise ValueError(f'category {cat.pk} is already in the tree')
+        if self._leads_to(cat.parent, cat.pk):
+            raise ValueError(f'cannot add category {cat.pk} under its own descendant')
+        self._cats[cat.pk] = cat
+        self._children.setdefault(cat.pk, [])
+        self._children.setdefault(cat.parent, []).append(cat.pk)
+        self._label(cat.pk)
+        self._place(cat.pk)
+
+    def update(self, cat: Category) -> None:
+        """
+        Заменить категорию с тем же pk: при смене родителя категория
+        переносится вместе с подкатегориями, при смене названия
+        пересчитываются полные пути подкатегорий
+
+        Parameters
+        ----------
+        cat - новое состояние категории
+        """
+        old = self._cats[cat.pk]
+        moved = cat.parent != old.parent
+        if moved and self._leads_to(cat.parent, cat.pk):
+            raise ValueError(f'cannot move category {cat.pk} under {cat.parent}')
+        self._cats[cat.pk] = cat
+        if moved:
+            self._unlink(cat.pk, old.parent)
+            self._children.setdefault(cat.parent, []).append(cat.pk)
+            self._label(cat.pk)
+        if cat.parent != old.parent or cat.name != old.name:
+            self._place(cat.pk)
+
+    def move(self, pk: int, parent: int | None) -> None:
+        """
+        Перенести категорию вместе с подкатегориями к новому родителю
+
+        Parameters
+        ----------
+        pk - первичный ключ категории
+        parent - первичный ключ нового родителя (None - верхний уровень)
+        """
+        self.update(replace(self._cats[pk], parent=parent))
+
+    def delete(self, pk: int) -> list[Category]:
+        """
+        Удалить категорию вместе с подкатегориями; вернуть удаленные
+        категории (сначала саму категорию)
+
+        Parameters
+        ----------
+        pk - первичный ключ категории
+        """
+        removed = [self._cats[pk], *self.get_subtree(pk)]
+        self._unlink(pk, removed[0].parent)
+        for cat in removed:
+            del self._cats[cat.pk], self._children[cat.pk]
+            del self._depth[cat.pk], self._paths[cat.pk]
+            del self._enter[cat.pk], self._exit[cat.pk]
+        return removed
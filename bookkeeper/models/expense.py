@@ -4,23 +4,30 @@
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from decimal import Decimal
+from typing import Annotated
+
+from ..repository.columns import Money, Timestamp
 
 
 @dataclass(slots=True)
 class Expense:
     """
     Расходная операция.
-    amount - сумма
+    amount - сумма (в базе данных - целое число копеек)
     category - id категории расходов
-    expense_date - дата расхода
-    added_date - дата добавления в бд
+    expense_date - дата расхода (в базе данных - целое число микросекунд)
+    added_date - дата добавления в бд (хранится так же)
     comment - комментарий
     pk - id записи в базе данных
+    __indexes__ - индексы таблицы расходов в базе данных
     """
-    amount: int | str
+    __indexes__ = (('expense_date',), ('category', 'expense_date'))
+
+    amount: Annotated[Decimal, Money()]
     category: int | str
-    expense_date: datetime = field(default_factory=datetime.now)
-    added_date: datetime = field(default_factory=datetime.now)
+    expense_date: Annotated[datetime, Timestamp()] = field(default_factory=datetime.now)
+    added_date: Annotated[datetime, Timestamp()] = field(default_factory=datetime.now)
     comment: str = ''
     pk: int = 0
 
@@ -0,0 +1,30 @@
+"""
+Миграции схемы базы данных приложения
+
+Новая миграция добавляется в конец списка MIGRATIONS с версией,
+на единицу большей последней. Миграции применяются до создания
+репозиториев:
+
+    Migrator(connection, MIGRATIONS).migrate()
+"""
+from ..repository.columns import Money, Timestamp
+from ..repository.migrations import Migration, RewriteData
+
+_MONEY = Money()
+_TIMESTAMP = Timestamp()
+
+MIGRATIONS: list[Migration] = [
+    # Суммы хранились строками ('101.30') или числами в рублях, даты -
+    # строками ISO; теперь это целые числа копеек и микросекунд.
+    # Целая сумма в рублях неотличима от преобразованной суммы
+    # в копейках, поэтому миграция атомарная
+    Migration(1, 'суммы и даты - целые числа',
+              RewriteData('expense', ('amount', 'expense_date', 'added_date'),
+                          lambda amount, expense_date, added_date: (
+                              _MONEY.to_db(amount), _TIMESTAMP.to_db(expense_date),
+                              _TIMESTAMP.to_db(added_date))),
+              RewriteData('budget', ('amount', 'budget'),
+                          lambda amount, budget: (_MONEY.to_db(amount),
+                                                  _MONEY.to_db(budget))),
+              atomic=True),
+]
@@ -8,7 +8,11 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from typing import Generic, TypeVar, Protocol, Any, Callable, Iterable, Iterator
+
+from bookkeeper.repository.aggregation import aggregate_objects
+from bookkeeper.repository.changes import Change, ChangeFeed, Listener
+from bookkeeper.repository.query import In, Where
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -30,8 +34,37 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Пакетные методы get_many, add_many, update_many, delete_many
+    по умолчанию вызывают одиночные методы в цикле, iter_all - get_all, а aggregate
+    вычисляет результат за один проход iter_all, get_subtree, get_ancestors
+    и iter_tree обходят иерархию запросами get_all и get; конкретные
+    репозитории переопределяют их более эффективной реализацией.
+    Изменения объектов публикуются подписчикам (метод subscribe) в ленту
+    изменений changes методом _publish.
     """
 
+    @property
+    def changes(self) -> ChangeFeed:
+        """ Лента изменений репозитория (создается при первом обращении) """
+        feed: ChangeFeed | None = vars(self).get('_changes')
+        if feed is None:
+            feed = vars(self).setdefault('_changes', ChangeFeed())
+        return feed
+
+    def subscribe(self, listener: Listener) -> Callable[[], None]:
+        """
+        Подписаться на изменения: listener получает список событий Change
+        (см. модуль changes) после каждого изменения репозитория.
+        Вернуть функцию отмены подписки.
+        """
+        return self.changes.subscribe(listener)
+
+    def _publish(self, kind: str, model: type, pks: Iterable[int]) -> None:
+        """ Сообщить подписчикам об изменении объектов модели с ключами pks """
+        feed = self.changes
+        if feed.listening:
+            feed.publish([Change(kind, model, pk) for pk in pks])
+
     @abstractmethod
     def add(self, obj: T) -> int:
         """
@@ -43,14 +76,121 @@ class AbstractRepository(ABC, Generic[T]):
     def get(self, pk: int) -> T | None:
         """ Получить объект по id """
 
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        """
+        Получить несколько объектов по id, вернуть словарь {id: объект}
+        в порядке pks. Отсутствующие в репозитории id в словарь не входят.
+        """
+        result = {}
+        for pk in pks:
+            if pk not in result and (obj := self.get(pk)) is not None:
+                result[pk] = obj
+        return result
+
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
+        или объекта Condition из модуля query (сравнения, диапазоны,
+        принадлежность набору, шаблоны, объединение через & и |);
         если условие не задано (по умолчанию), вернуть все записи
+        order_by - поле для сортировки, '-поле' - по убыванию;
+        при равенстве значений записи упорядочиваются по pk
+        limit - максимальное количество записей
+        after - последняя запись предыдущей страницы: вернуть записи,
+        следующие за ней в порядке order_by (постраничная выборка по ключу)
         """
 
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,  # pylint: disable=unused-argument
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        """
+        Перебрать записи по некоторому условию, не загружая их все
+        в память одновременно. Условие, сортировка и пагинация задаются
+        так же, как в get_all.
+        batch_size - количество записей, читаемых из хранилища за раз
+        """
+        yield from self.get_all(where, order_by, limit, after)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: Where | None = None, group_by: str | None = None,
+                  period: str | None = None) -> Any:
+        """
+        Вычислить агрегирующую функцию по записям, удовлетворяющим условию
+        func - функция: 'sum', 'count', 'avg', 'min' или 'max'
+        field - поле, по которому вычисляется функция
+        (для 'count' по умолчанию считаются все записи)
+        where - условие, как в get_all
+        group_by - поле группировки; если задано, вернуть словарь
+        {значение поля: значение функции}
+        period - группировать дату в поле group_by по периоду:
+        'day', 'week', 'month' или 'year'
+        """
+        return aggregate_objects(self.iter_all(where), func, field,
+                                 group_by, period)
+
+    def get_subtree(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех потомков объекта в иерархии, заданной полем
+        parent_field (pk родителя, None у объектов верхнего уровня):
+        детей, их детей и т.д. по уровням, внутри уровня - по pk.
+        Сам объект в результат не входит.
+        """
+        result: list[T] = []
+        seen = {pk}
+        level = [pk]
+        while level:
+            children = [obj for obj in self.get_all(In(parent_field, level), 'pk')
+                        if obj.pk not in seen]
+            seen.update(obj.pk for obj in children)
+            result.extend(children)
+            level = [obj.pk for obj in children]
+        return result
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить предков объекта в иерархии, заданной полем parent_field:
+        родителя, его родителя и т.д. до объекта верхнего уровня.
+        Сам объект в результат не входит.
+        """
+        result: list[T] = []
+        seen = {pk}
+        obj = self.get(pk)
+        while obj is not None:
+            parent = getattr(obj, parent_field)
+            if parent is None or parent in seen:
+                break
+            seen.add(parent)
+            obj = self.get(parent)
+            if obj is not None:
+                result.append(obj)
+        return result
+
+    def iter_tree(self, parent_field: str = 'parent',
+                  batch_size: int = 1000,  # pylint: disable=unused-argument
+                  ) -> Iterator[T]:
+        """
+        Перебрать объекты иерархии, заданной полем parent_field, в порядке
+        обхода в глубину: за каждым объектом подряд идут все его потомки,
+        дети одного родителя - по pk. В памяти одновременно находятся
+        только дети предков текущего объекта. Объекты, недостижимые
+        от объектов верхнего уровня (ссылки на отсутствующих родителей,
+        циклы), не возвращаются.
+        batch_size - количество записей, читаемых из хранилища за раз
+        """
+        stack = [iter(self.get_all({parent_field: None}, 'pk'))]
+        while stack:
+            obj = next(stack[-1], None)
+            if obj is None:
+                stack.pop()
+                continue
+            yield obj
+            stack.append(iter(self.get_all({parent_field: obj.pk}, 'pk')))
+
     @abstractmethod
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
@@ -58,3 +198,33 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список id
+        и записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
+
+
+def parse_order_by(order_by: str | None) -> tuple[str, bool]:
+    """
+    Разобрать параметр сортировки get_all.
+    Возвращает пару (название поля, сортировка по убыванию).
+    Если сортировка не задана, записи упорядочиваются по pk.
+    """
+    if order_by is None:
+        return 'pk', False
+    if order_by.startswith('-'):
+        return order_by[1:], True
+    return order_by, False
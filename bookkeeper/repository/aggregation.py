@@ -0,0 +1,136 @@
+"""
+Модуль описывает агрегирование записей репозитория (сумма, количество,
+среднее, минимум, максимум) с необязательной группировкой по полю.
+
+Используется реализацией AbstractRepository.aggregate по умолчанию,
+которая вычисляет результат за один проход по записям. Семантика
+совпадает с sqlite: значения None пропускаются, сумма, среднее, минимум
+и максимум по пустому набору равны None, количество - 0.
+"""
+
+from datetime import datetime
+from typing import Any, Iterable
+
+AGGREGATE_FUNCTIONS = ('sum', 'count', 'avg', 'min', 'max')
+
+PERIODS = ('day', 'week', 'month', 'year')
+
+
+def check_aggregate(func: str, period: str | None, group_by: str | None) -> None:
+    """
+    Проверить параметры агрегирования
+
+    Параметры
+    ----------
+    func - агрегирующая функция
+    period - период группировки по дате
+    group_by - поле группировки
+
+    """
+    if func not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f'unknown aggregate function {func!r}')
+    if period is not None:
+        if period not in PERIODS:
+            raise ValueError(f'unknown period {period!r}')
+        if group_by is None:
+            raise ValueError('period requires group_by')
+
+
+def to_number(value: Any) -> Any:
+    """
+    Привести значение к числу, как это делает sqlite при суммировании
+    (суммы в приложении могут храниться строками)
+    """
+    if isinstance(value, str):
+        return float(value)
+    return value
+
+
+def period_key(value: Any, period: str) -> str | None:
+    """
+    Вернуть ключ периода для даты: 'YYYY-MM-DD' для дня, 'YYYY-WW'
+    для недели (неделя начинается с понедельника, как %W), 'YYYY-MM'
+    для месяца и 'YYYY' для года. Дата может быть datetime или строкой
+    в формате ISO
+    """
+    if value is None:
+        return None
+    text = str(value)
+    if period == 'day':
+        return text[:10]
+    if period == 'month':
+        return text[:7]
+    if period == 'year':
+        return text[:4]
+    date = value if isinstance(value, datetime) else datetime.fromisoformat(text)
+    return date.strftime('%Y-%W')
+
+
+class _Accumulator:
+    """
+    Накопитель значения агрегирующей функции
+    """
+    __slots__ = ('func', 'count', 'value')
+
+    def __init__(self, func: str) -> None:
+        self.func = func
+        self.count = 0
+        self.value: Any = None
+
+    def add(self, x: Any) -> None:
+        """ Учесть значение """
+        if x is None:
+            return
+        self.count += 1
+        if self.func in ('sum', 'avg'):
+            x = to_number(x)
+            self.value = x if self.value is None else self.value + x
+        elif self.func == 'min':
+            self.value = x if self.value is None or x < self.value else self.value
+        elif self.func == 'max':
+            self.value = x if self.value is None or x > self.value else self.value
+
+    def result(self) -> Any:
+        """ Вернуть значение агрегирующей функции """
+        if self.func == 'count':
+            return self.count
+        if self.func == 'avg' and self.count:
+            return self.value / self.count
+        return self.value
+
+
+def aggregate_objects(objs: Iterable[Any], func: str, field: str,
+                      group_by: str | None = None,
+                      period: str | None = None) -> Any:
+    """
+    Вычислить агрегирующую функцию за один проход по объектам и вернуть
+    ее значение или, если задана группировка, словарь
+    {значение поля группировки: значение функции}
+
+    Параметры
+    ----------
+    objs - объекты
+    func - агрегирующая функция: sum, count, avg, min или max
+    field - поле, по которому вычисляется функция
+    group_by - поле группировки
+    period - период группировки по дате (day, week, month, year)
+
+    """
+    check_aggregate(func, period, group_by)
+    if group_by is None:
+        total = _Accumulator(func)
+        for obj in objs:
+            total.add(getattr(obj, field))
+        return total.result()
+
+    def key(obj: Any) -> Any:
+        value = getattr(obj, group_by)
+        return value if period is None else period_key(value, period)
+
+    groups: dict[Any, _Accumulator] = {}
+    for obj in objs:
+        group = key(obj)
+        if group not in groups:
+            groups[group] = _Accumulator(func)
+        groups[group].add(getattr(obj, field))
+    return {group: acc.result() for group, acc in groups.items()}
@@ -0,0 +1,184 @@
+"""
+Модуль описывает кэширующую обертку над репозиторием
+
+Обертка хранит объекты, полученные методами get и get_many, в ограниченном
+LRU-кэше (карте идентичности): повторный get(pk) возвращает тот же объект
+без обращения к хранилищу. Изменение или удаление записи через обертку
+удаляет ее из кэша, как и изменение через вложенный репозиторий (обертка
+подписана на его изменения, см. модуль changes). Изменения, сделанные
+в обход репозитория (например, другим процессом), кэш не видит,
+для них предназначен метод invalidate.
+
+Если вложенный репозиторий хранит данные в sqlite (имеет менеджер
+соединений connection), то внутри транзакции get и get_many обращаются
+к нему напрямую, не читая кэш и не пополняя его: уведомления
+об изменениях приходят только после фиксации, и объект, прочитанный
+в откаченной транзакции, остался бы в кэше навсегда.
+
+    cat_repo = CachedRepository(SQLiteRepository(db_file, Category))
+    path = list(category.get_all_parents(cat_repo))
+"""
+
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.changes import ADDED, Change, ChangeFeed
+from bookkeeper.repository.query import Where
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+
+
+class CacheInfo(NamedTuple):
+    """
+    Статистика кэша
+
+    hits - количество попаданий
+    misses - количество промахов
+    maxsize - максимальное количество объектов в кэше
+    currsize - текущее количество объектов в кэше
+    """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Репозиторий, кэширующий результаты get и get_many вложенного репозитория.
+    Выборки get_all, iter_all, aggregate, get_subtree и iter_tree
+    не кэшируются, get_ancestors обходит предков через кэширующий get.
+
+    repo - вложенный репозиторий
+    maxsize - максимальное количество объектов в кэше; при переполнении
+    вытесняется объект, к которому дольше всего не обращались
+    hits, misses - количество попаданий в кэш и промахов
+    """
+
+    def __init__(self, repo: AbstractRepository[T], maxsize: int = 1024) -> None:
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive')
+        self.repo = repo
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[int, T] = OrderedDict()
+        repo.subscribe(self._on_changes)
+
+    @property
+    def changes(self) -> ChangeFeed:
+        """ Лента изменений вложенного репозитория """
+        return self.repo.changes
+
+    def _on_changes(self, changes: list[Change]) -> None:
+        """ Удалить из кэша измененные и удаленные объекты """
+        for change in changes:
+            if change.kind != ADDED:
+                self._cache.pop(change.pk, None)
+
+    def _in_transaction(self) -> bool:
+        """ Выполняет ли текущий поток транзакцию sqlite вложенного репозитория """
+        connection = getattr(self.repo, 'connection', None)
+        return isinstance(connection, ConnectionManager) and connection.in_transaction()
+
+    def cache_info(self) -> CacheInfo:
+        """ Вернуть статистику кэша """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+    def invalidate(self, pk: int | None = None) -> None:
+        """
+        Удалить объект с первичным ключом pk из кэша,
+        если pk не задан - очистить кэш
+        """
+        if pk is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(pk, None)
+
+    def add(self, obj: T) -> int:
+        return self.repo.add(obj)
+
+    def get(self, pk: int) -> T | None:
+        if self._in_transaction():
+            return self.repo.get(pk)
+        cache = self._cache
+        obj = cache.get(pk)
+        if obj is not None:
+            self.hits += 1
+            cache.move_to_end(pk)
+            return obj
+        self.misses += 1
+        obj = self.repo.get(pk)
+        if obj is not None:
+            self._store(pk, obj)
+        return obj
+
+    def _store(self, pk: int, obj: T) -> None:
+        """ Поместить объект в кэш, вытеснив самый старый при переполнении """
+        cache = self._cache
+        cache[pk] = obj
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        if self._in_transaction():
+            return self.repo.get_many(pks)
+        pks = list(dict.fromkeys(pks))
+        cache = self._cache
+        cached = {pk: cache[pk] for pk in pks if pk in cache}
+        missing = [pk for pk in pks if pk not in cached]
+        self.hits += len(cached)
+        self.misses += len(missing)
+        for pk in cached:
+            cache.move_to_end(pk)
+        found = self.repo.get_many(missing) if missing else {}
+        for pk, obj in found.items():
+            self._store(pk, obj)
+        result = cached | found
+        return {pk: result[pk] for pk in pks if pk in result}
+
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
+        return self.repo.get_all(where, order_by, limit, after)
+
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        return self.repo.iter_all(where, batch_size, order_by, limit, after)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: Where | None = None, group_by: str | None = None,
+                  period: str | None = None) -> Any:
+        return self.repo.aggregate(func, field, where, group_by, period)
+
+    def get_subtree(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        return self.repo.get_subtree(pk, parent_field)
+
+    def iter_tree(self, parent_field: str = 'parent',
+                  batch_size: int = 1000) -> Iterator[T]:
+        return self.repo.iter_tree(parent_field, batch_size)
+
+    def update(self, obj: T) -> None:
+        self.invalidate(obj.pk)
+        self.repo.update(obj)
+
+    def delete(self, pk: int) -> None:
+        self.invalidate(pk)
+        self.repo.delete(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        return self.repo.add_many(objs)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        for obj in objs:
+            self.invalidate(obj.pk)
+        self.repo.update_many(objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for pk in pks:
+            self.invalidate(pk)
+        self.repo.delete_many(pks)
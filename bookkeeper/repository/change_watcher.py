@@ -0,0 +1,151 @@
+"""
+Модуль описывает обнаружение изменений базы данных sqlite,
+сделанных другими соединениями (например, другим процессом)
+
+Триггеры на таблицах моделей записывают каждое изменение строки в таблицу
+change_log с монотонно возрастающим номером seq. ChangeWatcher помнит
+номер последней прочитанной записи и возвращает только изменения после
+него. Опрос дешев: журнал читается, только если изменилось значение
+PRAGMA data_version, которое sqlite увеличивает при фиксации транзакции
+любым другим соединением с базой.
+
+Если наблюдатель использует менеджер соединений репозиториев процесса,
+то собственные изменения процесса, сделанные между опросами, в которых
+база не менялась другими соединениями, пропускаются без чтения журнала:
+копии репозиториев их уже содержат.
+
+    watcher = ChangeWatcher(db_file, [Category, Expense], connection)
+    ...
+    for change in watcher.poll():   # периодически, например по таймеру
+        ...
+
+Триггеры удаляются вместе с таблицей (drop_table), после создания
+таблицы заново ChangeWatcher нужно создать еще раз.
+"""
+
+from inspect import get_annotations
+from typing import Iterable
+
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED, Change
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+
+CHANGE_LOG_TABLE = 'change_log'
+
+_TRIGGERS = {
+    ADDED: ('INSERT', 'NEW'),
+    UPDATED: ('UPDATE OF {columns}', 'NEW'),
+    DELETED: ('DELETE', 'OLD'),
+}
+
+
+def _coalesce(rows: Iterable[tuple[str, int, str]]) -> dict[tuple[str, int], str]:
+    """
+    Свести записи журнала (таблица, pk, вид изменения) к одному изменению
+    на строку: изменение добавленной строки остается добавлением,
+    а строка, добавленная и удаленная, исключается
+    """
+    result: dict[tuple[str, int], str] = {}
+    for table, pk, kind in rows:
+        key = (table, pk)
+        first = result.get(key)
+        if first == ADDED and kind == DELETED:
+            del result[key]
+        elif first != ADDED:
+            result[key] = kind
+    return result
+
+
+class ChangeWatcher:
+    """
+    Наблюдатель за изменениями таблиц моделей
+
+    db_file - путь к базе данных
+    models - модели, изменения таблиц которых отслеживаются
+    (таблица модели называется как класс в нижнем регистре,
+    как в SQLiteRepository)
+    connection - менеджер соединений. Если не задан, наблюдатель создает
+    собственный. Изменения, зафиксированные через переданный менеджер,
+    poll не возвращает, если с предыдущего опроса базу не меняли другие
+    соединения
+    last_seq - номер последней прочитанной записи журнала; изменения,
+    сделанные до создания наблюдателя, не возвращаются
+    """
+
+    def __init__(self, db_file: str, models: Iterable[type],
+                 connection: ConnectionManager | None = None) -> None:
+        self.models = {cls.__name__.lower(): cls for cls in models}
+        self.connection = connection or ConnectionManager(db_file)
+        self.install()
+        with self.connection.connect() as con:
+            self._data_version = con.execute('PRAGMA data_version').fetchone()[0]
+            self.last_seq: int = con.execute(
+                f'SELECT coalesce(max(seq), 0) FROM {CHANGE_LOG_TABLE}').fetchone()[0]
+
+    def install(self) -> None:
+        """
+        Создать журнал изменений, если его еще нет, и заново создать
+        триггеры. Изменения записываются, только если меняются столбцы
+        полей модели: служебные столбцы, которые поддерживают триггеры
+        репозитория (например, path в PathRepository), не учитываются
+
+        """
+        with self.connection.transaction() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE}('
+                        'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'table_name TEXT NOT NULL, pk INTEGER NOT NULL, '
+                        'kind TEXT NOT NULL)')
+            for table, cls in self.models.items():
+                columns = ', '.join(name for name in get_annotations(cls)
+                                    if name != 'pk')
+                for kind, (event, row) in _TRIGGERS.items():
+                    con.execute(f'DROP TRIGGER IF EXISTS {table}_{kind}_log')
+                    con.execute(
+                        f'CREATE TRIGGER {table}_{kind}_log '
+                        f'AFTER {event.format(columns=columns)} ON {table} BEGIN '
+                        f'INSERT INTO {CHANGE_LOG_TABLE}(table_name, pk, kind) '
+                        f"VALUES ('{table}', {row}.pk, '{kind}'); END")
+
+    def poll(self) -> list[Change]:
+        """
+        Вернуть изменения, сделанные после предыдущего вызова,
+        по одному на строку, в порядке их первого появления в журнале
+
+        """
+        with self.connection.connect() as con:
+            # журнал читается до data_version: если после этого базу изменит
+            # другое соединение, data_version изменится и журнал перечитается
+            last = con.execute(f'SELECT coalesce(max(seq), 0) '
+                               f'FROM {CHANGE_LOG_TABLE}').fetchone()[0]
+            version = con.execute('PRAGMA data_version').fetchone()[0]
+            if version == self._data_version:
+                # базу меняло только это соединение
+                self.last_seq = max(self.last_seq, last)
+                return []
+            self._data_version = version
+            rows = con.execute(f'SELECT seq, table_name, pk, kind '
+                               f'FROM {CHANGE_LOG_TABLE} WHERE seq > ? ORDER BY seq',
+                               (self.last_seq,)).fetchall()
+        if not rows:
+            return []
+        self.last_seq = rows[-1][0]
+        changes = _coalesce(row[1:] for row in rows)
+        return [Change(kind, self.models[table], pk)
+                for (table, pk), kind in changes.items() if table in self.models]
+
+    def prune(self, keep: int = 10000) -> None:
+        """
+        Удалить из журнала все записи, кроме последних keep.
+        Наблюдатели, не прочитавшие удаленные записи, их пропустят
+
+        """
+        with self.connection.transaction() as con:
+            con.execute(f'DELETE FROM {CHANGE_LOG_TABLE} WHERE seq <= '
+                        f'(SELECT max(seq) FROM {CHANGE_LOG_TABLE}) - ?', (keep,))
+
+    def close(self) -> None:
+        """
+        Закрыть соединение с базой данных. Если менеджер соединений
+        общий, соединения закрываются и у репозиториев, использующих его
+
+        """
+        self.connection.close()
@@ -0,0 +1,122 @@
+"""
+Модуль описывает уведомления об изменениях в репозитории
+
+Репозиторий сообщает подписчикам о каждом изменении списком событий
+Change(вид изменения, класс модели, pk). Подписчик получает события
+синхронно, сразу после изменения (изменения в транзакции sqlite -
+после ее фиксации), или одним списком в конце блока batch:
+
+    unsubscribe = exp_repo.subscribe(on_changes)
+    with exp_repo.changes.batch():
+        exp_repo.add(expense)
+        exp_repo.delete(pk)         # on_changes вызывается здесь один раз
+    unsubscribe()
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+
+ADDED = 'added'
+
+UPDATED = 'updated'
+
+DELETED = 'deleted'
+
+
+class Change(NamedTuple):
+    """
+    Изменение объекта в репозитории
+
+    kind - вид изменения: ADDED, UPDATED или DELETED
+    model - класс объекта
+    pk - первичный ключ объекта
+    """
+    kind: str
+    model: type
+    pk: int
+
+
+Listener = Callable[[list[Change]], None]
+
+
+class ChangeFeed:
+    """
+    Подписчики на изменения репозитория. Изменения, опубликованные
+    внутри блока batch, накапливаются отдельно для каждого потока
+    и доставляются при выходе из внешнего блока batch
+    """
+
+    def __init__(self) -> None:
+        self._listeners: tuple[Listener, ...] = ()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def listening(self) -> bool:
+        """ Есть ли подписчики """
+        return bool(self._listeners)
+
+    def subscribe(self, listener: Listener) -> Callable[[], None]:
+        """
+        Подписать listener на изменения; вернуть функцию отмены подписки
+        """
+        with self._lock:
+            self._listeners += (listener,)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._listeners = tuple(other for other in self._listeners
+                                        if other is not listener)
+        return unsubscribe
+
+    def publish(self, changes: list[Change]) -> None:
+        """ Доставить изменения подписчикам или отложить до конца batch """
+        if not changes:
+            return
+        pending: list[Change] | None = getattr(self._local, 'pending', None)
+        if pending is not None:
+            pending.extend(changes)
+            return
+        for listener in self._listeners:
+            listener(changes)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Доставить изменения, опубликованные внутри блока with, одним
+        списком при выходе из блока (в том числе по исключению: изменения,
+        которые уже сделаны, не теряются). Вложенные блоки
+        присоединяются к внешнему
+        """
+        if getattr(self._local, 'pending', None) is not None:
+            yield
+            return
+        pending: list[Change] = []
+        self._local.pending = pending
+        try:
+            yield
+        finally:
+            self._local.pending = None
+            self.publish(pending)
+
+
+def apply_changes(objs: list[Any], changes: list[Change],
+                  get_many: Callable[[Iterable[int]], dict[int, Any]]) -> None:
+    """
+    Применить изменения к списку объектов: измененные объекты заменяются
+    на месте, удаленные убираются, добавленные дописываются в конец
+
+    Параметры
+    ----------
+    objs - список объектов, изменяется на месте
+    changes - изменения
+    get_many - функция получения объектов по первичным ключам
+    (метод get_many репозитория)
+
+    """
+    changed = {change.pk for change in changes}
+    fresh = get_many(changed)
+    objs[:] = [fresh.pop(obj.pk) if obj.pk in fresh else obj
+               for obj in objs if obj.pk in fresh or obj.pk not in changed]
+    objs.extend(fresh.values())
@@ -0,0 +1,141 @@
+"""
+Модуль описывает типы столбцов таблиц sqlite и преобразование значений
+между объектами моделей и базой данных
+
+Тип столбца определяется по аннотации поля модели: int и bool - INTEGER,
+float - REAL, str - TEXT, bytes - BLOB (в том числе для X | None).
+Для остальных аннотаций (например, int | str) тип не задается.
+
+Поле можно явно связать со столбцом с преобразованием значений
+с помощью typing.Annotated:
+
+    amount: Annotated[Decimal, Money(2)]       # целое число копеек
+    expense_date: Annotated[datetime, Timestamp()]  # целое число микросекунд
+
+Такие значения хранятся как целые числа, поэтому сравниваются, сортируются
+и суммируются в sqlite без разбора строк, а при чтении преобразуются обратно.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_EVEN, Decimal
+from types import NoneType, UnionType
+from typing import Annotated, Any, Union, get_args, get_origin
+
+SQL_TYPES: dict[type, str] = {
+    bool: 'INTEGER',
+    int: 'INTEGER',
+    float: 'REAL',
+    str: 'TEXT',
+    bytes: 'BLOB',
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    Столбец без преобразования значений
+
+    sql_type - тип столбца в sqlite (пустая строка - без типа)
+    """
+    sql_type: str = ''
+
+    @property
+    def converts(self) -> bool:
+        """ Преобразует ли столбец значения """
+        return False
+
+    def to_db(self, value: Any) -> Any:
+        """ Преобразовать значение поля в значение для базы данных """
+        return value
+
+    def from_db(self, value: Any) -> Any:
+        """ Преобразовать значение из базы данных в значение поля """
+        return value
+
+    def sql_datetime(self, name: str) -> str:
+        """
+        Вернуть SQL-выражение, дающее дату столбца name в виде
+        строки 'YYYY-MM-DD HH:MM:SS' (для группировки по периодам)
+        """
+        return name
+
+
+@dataclass(frozen=True)
+class Timestamp(Column):
+    """
+    Дата и время, хранящиеся как целое число микросекунд от 1970-01-01.
+    Принимает datetime или строку в формате ISO, возвращает datetime
+    без часового пояса. Значения с часовым поясом приводятся к UTC,
+    значения без него хранятся как есть
+    """
+    sql_type: str = field(default='INTEGER', init=False)
+
+    @property
+    def converts(self) -> bool:
+        return True
+
+    def to_db(self, value: Any) -> Any:
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - EPOCH) // timedelta(microseconds=1)
+
+    def from_db(self, value: Any) -> Any:
+        if value is None:
+            return None
+        return EPOCH + timedelta(microseconds=value)
+
+    def sql_datetime(self, name: str) -> str:
+        return f"datetime({name} / 1000000, 'unixepoch')"
+
+
+@dataclass(frozen=True)
+class Money(Column):
+    """
+    Денежная сумма, хранящаяся как целое число младших единиц
+    (при digits=2 - копеек). Принимает число или строку,
+    возвращает Decimal с digits знаками после запятой. Дробное
+    значение из базы данных (например, среднее) округляется
+    до младших единиц
+    """
+    digits: int = 2
+    sql_type: str = field(default='INTEGER', init=False)
+
+    @property
+    def converts(self) -> bool:
+        return True
+
+    def to_db(self, value: Any) -> Any:
+        if value is None:
+            return None
+        minor = Decimal(str(value)).scaleb(self.digits)
+        return int(minor.to_integral_value(ROUND_HALF_EVEN))
+
+    def from_db(self, value: Any) -> Any:
+        if value is None:
+            return None
+        minor = Decimal(value).to_integral_value(ROUND_HALF_EVEN)
+        return minor.scaleb(-self.digits)
+
+
+def column_for(annotation: Any) -> Column:
+    """
+    Определить столбец sqlite по аннотации поля модели
+    """
+    if get_origin(annotation) is Annotated:
+        for meta in annotation.__metadata__:
+            if isinstance(meta, Column):
+                return meta
+        annotation = get_args(annotation)[0]
+    if get_origin(annotation) in (Union, UnionType):
+        args = [a for a in get_args(annotation) if a is not NoneType]
+        if len(args) != 1:
+            return Column()
+        annotation = args[0]
+    return Column(SQL_TYPES.get(annotation, ''))
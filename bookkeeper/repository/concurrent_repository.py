@@ -0,0 +1,205 @@
+"""
+Модуль описывает потокобезопасный репозиторий в оперативной памяти
+
+ConcurrentMemoryRepository защищает MemoryRepository блокировкой чтения-
+записи: чтения выполняются параллельно, изменения - по одному и не
+одновременно с чтениями. iter_all собирает подходящие объекты под
+блокировкой и перебирает их уже без нее, поэтому репозиторий можно
+изменять во время перебора. Снимок (snapshot) создается без копирования
+данных, а контейнер и индексы копирует тот репозиторий, который первым
+изменит их после создания снимка (copy-on-write).
+
+    repo = ConcurrentMemoryRepository(sorted_indexes=['expense_date'])
+    snapshot = repo.snapshot()     # не меняется при изменениях repo
+    for exp in repo.iter_all(order_by='expense_date'):
+        ...                        # repo можно изменять из других потоков
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.aggregation import aggregate_objects
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Where
+
+
+class RWLock:
+    """
+    Блокировка чтения-записи: ее одновременно удерживают несколько
+    читателей или один писатель. Ожидающий писатель не пропускает новых
+    читателей вперед. Писатель может повторно захватить блокировку
+    на запись или на чтение; повторный захват на чтение читателем
+    при ожидающем писателе приводит к взаимной блокировке
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer: int | None = None
+        self._depth = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Удерживать блокировку на чтение внутри блока with """
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Удерживать блокировку на запись внутри блока with """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class ConcurrentMemoryRepository(MemoryRepository[T]):
+    """
+    Потокобезопасный репозиторий в оперативной памяти.
+    Параметры конструктора такие же, как у MemoryRepository.
+
+    Объекты, возвращаемые репозиторием, общие для всех потоков:
+    изменять их нужно через копию и метод update.
+    """
+
+    def __init__(self, hash_indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = ()) -> None:
+        self._lock = RWLock()
+        self._shared = False
+        super().__init__(hash_indexes, sorted_indexes)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """
+        Удерживать блокировку на запись; если данные общие со снимком,
+        предварительно скопировать их
+        """
+        with self._lock.write():
+            if self._shared:
+                self._container = dict(self._container)
+                self._set_indexes({field: [index.copy() for index in indexes]
+                                   for field, indexes in self._indexes.items()})
+                self._shared = False
+            yield
+
+    def snapshot(self) -> 'ConcurrentMemoryRepository[T]':
+        """
+        Вернуть снимок: репозиторий с текущим содержимым и индексами,
+        который не меняется при дальнейших изменениях исходного (и сам
+        может изменяться независимо от него). Журнал изменений
+        в снимок не переносится
+        """
+        # pylint: disable=protected-access
+        snapshot: ConcurrentMemoryRepository[T] = ConcurrentMemoryRepository()
+        # флаг _shared меняется только под блокировкой на запись
+        with self._lock.write():
+            snapshot._container = self._container
+            snapshot._set_indexes(self._indexes)
+            snapshot._next_pk = self._next_pk
+            snapshot._shared = self._shared = True
+        return snapshot
+
+    def create_index(self, field: str, kind: str = 'hash') -> None:
+        with self._writing():
+            super().create_index(field, kind)
+
+    def add(self, obj: T) -> int:
+        with self._writing():
+            return super().add(obj)
+
+    def get(self, pk: int) -> T | None:
+        with self._lock.read():
+            return super().get(pk)
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        with self._lock.read():
+            return super().get_many(pks)
+
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
+        with self._lock.read():
+            return super().get_all(where, order_by, limit, after)
+
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        """
+        Перебирает объекты, выбранные при вызове метода (без копирования
+        данных репозитория). Репозиторий можно изменять во время перебора.
+        """
+        return iter(self.get_all(where, order_by, limit, after))
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: Where | None = None, group_by: str | None = None,
+                  period: str | None = None) -> Any:
+        with self._lock.read():
+            return aggregate_objects(MemoryRepository.iter_all(self, where), func,
+                                     field, group_by, period)
+
+    def update(self, obj: T) -> None:
+        with self._writing():
+            super().update(obj)
+
+    def delete(self, pk: int) -> None:
+        with self._writing():
+            super().delete(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        with self._writing():
+            return super().add_many(objs)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        with self._writing():
+            super().update_many(objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        with self._writing():
+            super().delete_many(pks)
+
+    def dump(self, snapshot_file: str) -> None:
+        with self._lock.write():
+            super().dump(snapshot_file)
+
+    def load(self, snapshot_file: str, log_file: str | None = None) -> None:
+        with self._writing():
+            super().load(snapshot_file, log_file)
+
+    def reset(self, objs: Iterable[T] = ()) -> None:
+        with self._writing():
+            super().reset(objs)
+
+    def close(self) -> None:
+        with self._lock.write():
+            super().close()
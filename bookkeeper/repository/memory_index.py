@@ -0,0 +1,213 @@
+"""
+Модуль описывает индексы по полям объектов для MemoryRepository
+
+HashIndex - хеш-индекс: словарь {значение поля: первичные ключи},
+ускоряет условия Eq и In. SortedIndex - упорядоченный список ключей
+сортировки с бинарным поиском (модуль bisect), ускоряет сравнения,
+Between, StartsWith и выборку с сортировкой по полю. Значения поля
+в SortedIndex должны быть сравнимы между собой.
+
+Индекс возвращает первичные ключи объектов, которые могут удовлетворять
+условию; окончательно условие проверяет репозиторий. Индексы обновляются
+методами репозитория, поэтому объект, измененный на месте, нужно
+сохранить методом update.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from math import inf
+from typing import Any, Collection, Iterable, Iterator
+
+from bookkeeper.repository.query import (
+    Between, Condition, Eq, Ge, Gt, In, Le, Lt, StartsWith, prefix_upper)
+
+INDEX_KINDS = ('hash', 'sorted')
+
+
+class FieldIndex(ABC):
+    """
+    Индекс по полю объектов.
+    Абстрактные методы:
+    add - добавить значение поля объекта
+    remove - удалить объект из индекса
+    lookup - найти объекты, которые могут удовлетворять условию
+    copy - создать независимую копию индекса
+
+    field - название поля
+    """
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+
+    @abstractmethod
+    def add(self, pk: int, value: Any) -> None:
+        """ Добавить в индекс объект с первичным ключом pk и значением поля """
+
+    @abstractmethod
+    def remove(self, pk: int) -> None:
+        """ Удалить объект из индекса, если он там есть """
+
+    def build(self, items: Iterable[tuple[int, Any]]) -> None:
+        """ Добавить в индекс пары (первичный ключ, значение поля) """
+        for pk, value in items:
+            self.add(pk, value)
+
+    @abstractmethod
+    def lookup(self, condition: Condition) -> Collection[int] | None:
+        """
+        Вернуть первичные ключи объектов, которые могут удовлетворять
+        условию на поле индекса, или None, если индекс к условию неприменим
+        """
+
+    @abstractmethod
+    def copy(self) -> 'FieldIndex':
+        """ Вернуть копию индекса, не зависящую от исходного """
+
+
+class HashIndex(FieldIndex):
+    """
+    Хеш-индекс для проверки равенства. Объекты с нехешируемым значением
+    поля хранятся отдельно и попадают в результат любого поиска
+    """
+
+    def __init__(self, field: str) -> None:
+        super().__init__(field)
+        self._buckets: dict[Any, set[int]] = {}
+        self._values: dict[int, Any] = {}
+        self._unhashable: set[int] = set()
+
+    def add(self, pk: int, value: Any) -> None:
+        try:
+            self._buckets.setdefault(value, set()).add(pk)
+        except TypeError:
+            self._unhashable.add(pk)
+            return
+        self._values[pk] = value
+
+    def remove(self, pk: int) -> None:
+        if pk not in self._values:
+            self._unhashable.discard(pk)
+            return
+        value = self._values.pop(pk)
+        bucket = self._buckets[value]
+        bucket.discard(pk)
+        if not bucket:
+            del self._buckets[value]
+
+    def lookup(self, condition: Condition) -> Collection[int] | None:
+        if isinstance(condition, Eq):
+            values: Collection[Any] = (condition.value,)
+        elif isinstance(condition, In):
+            values = tuple(value for value in condition.values if value is not None)
+        else:
+            return None
+        pks = set(self._unhashable)
+        try:
+            for value in values:
+                pks.update(self._buckets.get(value, ()))
+        except TypeError:
+            return None
+        return pks
+
+    def copy(self) -> 'HashIndex':
+        # pylint: disable=protected-access
+        index = HashIndex(self.field)
+        index._buckets = {value: set(pks) for value, pks in self._buckets.items()}
+        index._values = dict(self._values)
+        index._unhashable = set(self._unhashable)
+        return index
+
+
+class SortedIndex(FieldIndex):
+    """
+    Упорядоченный индекс: список ключей (значение не None, значение, pk)
+    в порядке сортировки, совпадающем с порядком get_all(order_by=поле)
+    """
+
+    def __init__(self, field: str) -> None:
+        super().__init__(field)
+        self._keys: list[tuple[Any, ...]] = []
+        self._by_pk: dict[int, tuple[Any, ...]] = {}
+
+    def add(self, pk: int, value: Any) -> None:
+        key = (value is not None, value, pk)
+        insort(self._keys, key)
+        self._by_pk[pk] = key
+
+    def build(self, items: Iterable[tuple[int, Any]]) -> None:
+        by_pk = self._by_pk
+        for pk, value in items:
+            by_pk[pk] = (value is not None, value, pk)
+        self._keys = sorted(by_pk.values())
+
+    def remove(self, pk: int) -> None:
+        key = self._by_pk.pop(pk, None)
+        if key is not None:
+            del self._keys[bisect_left(self._keys, key)]
+
+    def copy(self) -> 'SortedIndex':
+        # pylint: disable=protected-access
+        index = SortedIndex(self.field)
+        index._keys = list(self._keys)
+        index._by_pk = dict(self._by_pk)
+        return index
+
+    def _lower(self, value: Any) -> int:
+        """ Позиция первого ключа со значением не меньше value """
+        return bisect_left(self._keys, (True, value, -inf))
+
+    def _upper(self, value: Any) -> int:
+        """ Позиция первого ключа со значением больше value """
+        return bisect_right(self._keys, (True, value, inf))
+
+    def _bounds(self, condition: Condition) -> tuple[int, int] | None:
+        """
+        Вернуть границы отрезка списка ключей, содержащего объекты,
+        удовлетворяющие условию, или None, если индекс неприменим
+        """
+        first = bisect_left(self._keys, (True,))
+        end = len(self._keys)
+        if isinstance(condition, Between):
+            return self._lower(condition.low), self._upper(condition.high)
+        if isinstance(condition, StartsWith):
+            prefix = condition.prefix
+            if not prefix:
+                return first, end
+            upper = prefix_upper(prefix)
+            return self._lower(prefix), end if upper is None else self._lower(upper)
+        if isinstance(condition, Eq) and condition.value is None:
+            return 0, first
+        if not isinstance(condition, (Eq, Lt, Le, Gt, Ge)):
+            return None
+        low, high = self._lower(condition.value), self._upper(condition.value)
+        ranges = ((Eq, (low, high)), (Lt, (first, low)), (Le, (first, high)),
+                  (Gt, (high, end)), (Ge, (low, end)))
+        return next(bounds for kind, bounds in ranges if isinstance(condition, kind))
+
+    def lookup(self, condition: Condition) -> Collection[int] | None:
+        try:
+            bounds = self._bounds(condition)
+        except TypeError:
+            return None
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return [key[2] for key in self._keys[start:stop]]
+
+    def ordered(self, desc: bool = False,
+                after: tuple[Any, ...] | None = None) -> Iterator[int]:
+        """
+        Перебрать первичные ключи в порядке сортировки по полю
+
+        Параметры
+        ----------
+        desc - по убыванию
+        after - ключ сортировки, после которого начинается перебор
+
+        """
+        keys = self._keys
+        if desc:
+            stop = len(keys) if after is None else bisect_left(keys, after)
+            return (keys[i][2] for i in range(stop - 1, -1, -1))
+        start = 0 if after is None else bisect_right(keys, after)
+        return (keys[i][2] for i in range(start, len(keys)))
@@ -2,42 +2,345 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
-from itertools import count
-from typing import Any
+import heapq
+import os
+from itertools import islice
+from typing import Any, Callable, Collection, Iterable, Iterator
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, parse_order_by)
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED
+from bookkeeper.repository.memory_index import (
+    INDEX_KINDS, FieldIndex, HashIndex, SortedIndex)
+from bookkeeper.repository.query import And, Condition, Or, Where, as_condition
+from bookkeeper.repository.snapshot import (
+    DELETE, PUT, ChangeLog, read_snapshot, write_snapshot)
+
+
+def _sort_key(field: str) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Ключ сортировки, совпадающий с порядком sqlite: None меньше любого
+    значения, при равенстве значений объекты упорядочиваются по pk
+    """
+    def key(obj: Any) -> tuple[Any, ...]:
+        value = getattr(obj, field)
+        return value is not None, value, obj.pk
+    return key
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+
+    hash_indexes - поля, по которым строятся хеш-индексы (ускоряют
+    условия Eq и In)
+    sorted_indexes - поля, по которым строятся упорядоченные индексы
+    (ускоряют сравнения, диапазоны и сортировку по полю)
+    Без индексов get_all перебирает все объекты. Объекты, измененные
+    на месте, нужно сохранять методом update, чтобы обновить индексы.
+
+    Репозиторий можно сохранить на диск: dump записывает снимок всех
+    объектов, а после load(снимок, журнал) каждое изменение дописывается
+    в журнал, который применяется к снимку при следующей загрузке.
+    Методы reset и load заменяют содержимое целиком и не публикуют
+    изменений подписчикам.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, hash_indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = ()) -> None:
         self._container: dict[int, T] = {}
-        self._counter = count(1)
+        self._next_pk = 1
+        self._log: ChangeLog | None = None
+        self._indexes: dict[str, list[FieldIndex]] = {}
+        self._sorted: dict[str, SortedIndex] = {}
+        for field in hash_indexes:
+            self.create_index(field, 'hash')
+        for field in sorted_indexes:
+            self.create_index(field, 'sorted')
+
+    def create_index(self, field: str, kind: str = 'hash') -> None:
+        """
+        Построить индекс по полю для уже хранящихся и новых объектов
+        kind - 'hash' (равенство) или 'sorted' (диапазоны и сортировка)
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError(f'unknown index kind {kind!r}')
+        index: FieldIndex = HashIndex(field) if kind == 'hash' else SortedIndex(field)
+        index.build((pk, getattr(obj, field)) for pk, obj in self._container.items())
+        if isinstance(index, SortedIndex):
+            self._sorted[field] = index
+        self._indexes.setdefault(field, []).append(index)
+        self._indexes[field].sort(key=lambda i: isinstance(i, SortedIndex))
+
+    def _index(self, pk: int, obj: T | None) -> None:
+        """
+        Заменить в индексах объект с первичным ключом pk на obj
+        (obj=None - удалить объект из индексов)
+        """
+        for indexes in self._indexes.values():
+            for index in indexes:
+                index.remove(pk)
+                if obj is not None:
+                    index.add(pk, getattr(obj, index.field))
+
+    def _store(self, pk: int, obj: T) -> None:
+        """ Сохранить объект в контейнере и индексах """
+        if self._indexes:
+            try:
+                self._index(pk, obj)
+            except Exception:
+                old = self._container.get(pk)
+                self._index(pk, old)
+                raise
+        self._container[pk] = obj
+
+    def _log_change(self, operation: str, data: list[Any]) -> None:
+        """ Записать изменение в журнал, если он открыт """
+        if self._log is not None and data:
+            self._log.append(operation, data)
+
+    def _publish_objs(self, kind: str, objs: list[T]) -> None:
+        """ Сообщить подписчикам об изменении объектов objs """
+        if objs and self.changes.listening:
+            self._publish(kind, type(objs[0]), [obj.pk for obj in objs])
+
+    def _add(self, obj: T) -> int:
+        """ Добавить объект без записи в журнал """
+        obj.pk = self._next_pk
+        try:
+            self._store(obj.pk, obj)
+        except Exception:
+            obj.pk = 0
+            raise
+        self._next_pk += 1
+        return obj.pk
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        pk = next(self._counter)
-        self._container[pk] = obj
-        obj.pk = pk
+        pk = self._add(obj)
+        self._log_change(PUT, [obj])
+        self._publish_objs(ADDED, [obj])
         return pk
 
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        container = self._container
+        return {pk: container[pk] for pk in pks if pk in container}
+
+    def _candidates(self, condition: Condition) -> Collection[int] | None:
+        """
+        Найти по индексам первичные ключи объектов, которые могут
+        удовлетворять условию, или вернуть None, если индексы неприменимы
+        """
+        if isinstance(condition, And):
+            best = None
+            for part in condition.conditions:
+                pks = self._candidates(part)
+                if pks is not None and (best is None or len(pks) < len(best)):
+                    best = pks
+            return best
+        if isinstance(condition, Or):
+            union: set[int] = set()
+            for part in condition.conditions:
+                pks = self._candidates(part)
+                if pks is None:
+                    return None
+                union.update(pks)
+            return union
+        fields = condition.fields()
+        if len(fields) != 1:
+            return None
+        for index in self._indexes.get(fields.pop(), ()):
+            pks = index.lookup(condition)
+            if pks is not None:
+                return pks
+        return None
+
+    def _filter(self, where: Where | None) -> Iterator[T]:
+        if where is None:
+            return iter(self._container.values())
+        condition = as_condition(where)
+        predicate = condition.to_predicate()
+        pks = self._candidates(condition) if self._indexes else None
+        if pks is None:
+            return filter(predicate, self._container.values())
+        container = self._container
+        return filter(predicate, (container[pk] for pk in sorted(pks)))
+
+    def _ordered(self, where: Where | None, field: str, desc: bool,
+                 after: T | None) -> Iterator[T] | None:
+        """
+        Перебрать объекты в порядке сортировки по полю с помощью
+        упорядоченного индекса или вернуть None, если индекса нет
+        """
+        index = self._sorted.get(field)
+        if index is None:
+            return None
+        bound = None if after is None else _sort_key(field)(after)
+        objs = map(self._container.__getitem__, index.ordered(desc, bound))
         if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+            return objs
+        return filter(as_condition(where).to_predicate(), objs)
+
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
+        if limit is not None and limit < 0:
+            raise ValueError('limit must not be negative')
+        if order_by is None and after is None:
+            return list(islice(self._filter(where), limit))
+        objs = self._filter(where)
+        field, desc = parse_order_by(order_by)
+        ordered = self._ordered(where, field, desc, after)
+        if ordered is not None:
+            return list(islice(ordered, limit))
+        key = _sort_key(field)
+        if after is not None:
+            bound = key(after)
+            if desc:
+                objs = (obj for obj in objs if key(obj) < bound)
+            else:
+                objs = (obj for obj in objs if key(obj) > bound)
+        if limit is None:
+            return sorted(objs, key=key, reverse=desc)
+        if desc:
+            return heapq.nlargest(limit, objs, key=key)
+        return heapq.nsmallest(limit, objs, key=key)
+
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        """
+        Перебирает объекты без копирования контейнера.
+        Репозиторий нельзя изменять до окончания перебора.
+        """
+        if order_by is None and after is None:
+            yield from islice(self._filter(where), limit)
+            return
+        field, desc = parse_order_by(order_by)
+        ordered = self._ordered(where, field, desc, after)
+        if ordered is not None:
+            if limit is not None and limit < 0:
+                raise ValueError('limit must not be negative')
+            yield from islice(ordered, limit)
+            return
+        yield from self.get_all(where, order_by, limit, after)
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        self._store(obj.pk, obj)
+        self._log_change(PUT, [obj])
+        self._publish_objs(UPDATED, [obj])
 
     def delete(self, pk: int) -> None:
-        self._container.pop(pk)
+        obj = self._container.pop(pk)
+        self._index(pk, None)
+        self._log_change(DELETE, [pk])
+        self._publish_objs(DELETED, [obj])
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        added: list[T] = []
+        try:
+            for obj in objs:
+                self._add(obj)
+                added.append(obj)
+        finally:
+            self._log_change(PUT, added)
+            self._publish_objs(ADDED, added)
+        return [obj.pk for obj in added]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        if not self._indexes:
+            self._container.update((obj.pk, obj) for obj in objs)
+        else:
+            for obj in objs:
+                self._store(obj.pk, obj)
+        self._log_change(PUT, objs)
+        self._publish_objs(UPDATED, objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for pk in pks:
+            if pk not in self._container:
+                raise KeyError(pk)
+        deleted = []
+        for pk in pks:
+            deleted.append(self._container.pop(pk))
+            self._index(pk, None)
+        self._log_change(DELETE, pks)
+        self._publish_objs(DELETED, deleted)
+
+    def dump(self, snapshot_file: str) -> None:
+        """
+        Сохранить все объекты в двоичный снимок. Открытый журнал
+        изменений после этого очищается
+        """
+        write_snapshot(snapshot_file, self._next_pk, list(self._container.values()))
+        if self._log is not None:
+            self._log.clear()
+
+    def load(self, snapshot_file: str, log_file: str | None = None) -> None:
+        """
+        Заменить содержимое репозитория объектами из снимка (если файл
+        снимка существует) и применить к ним журнал изменений log_file.
+        Дальнейшие изменения дописываются в этот журнал
+        """
+        self.close()
+        next_pk, objs = 1, list[T]()
+        if os.path.exists(snapshot_file):
+            next_pk, objs = read_snapshot(snapshot_file)
+        container = {obj.pk: obj for obj in objs}
+        if log_file is not None:
+            self._log = ChangeLog(log_file)
+            for operation, data in self._log.replay():
+                if operation == PUT:
+                    container.update((obj.pk, obj) for obj in data)
+                    next_pk = max(next_pk, max(obj.pk for obj in data) + 1)
+                else:
+                    for pk in data:
+                        container.pop(pk, None)
+        self.reset(container.values())
+        self._next_pk = max(self._next_pk, next_pk)
+
+    def reset(self, objs: Iterable[T] = ()) -> None:
+        """
+        Заменить содержимое репозитория объектами с заполненным pk
+        (например, прочитанными из другого репозитория)
+        """
+        self._container = {obj.pk: obj for obj in objs}
+        self._next_pk = max(self._container, default=0) + 1
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self) -> None:
+        """ Перестроить индексы по текущему содержимому репозитория """
+        items = self._container.items()
+        rebuilt: dict[str, list[FieldIndex]] = {}
+        for field, indexes in self._indexes.items():
+            rebuilt[field] = [type(index)(field) for index in indexes]
+            for index in rebuilt[field]:
+                index.build((pk, getattr(obj, index.field)) for pk, obj in items)
+        self._set_indexes(rebuilt)
+
+    def _set_indexes(self, indexes: dict[str, list[FieldIndex]]) -> None:
+        """ Заменить индексы репозитория """
+        self._indexes = indexes
+        self._sorted = {index.field: index for field_indexes in indexes.values()
+                        for index in field_indexes if isinstance(index, SortedIndex)}
+
+    def close(self) -> None:
+        """ Закрыть журнал изменений """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
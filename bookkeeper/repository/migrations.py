@@ -0,0 +1,367 @@
+"""
+Модуль описывает версионирование схемы базы данных sqlite и миграции
+
+Версия схемы хранится в PRAGMA user_version. Миграция переводит базу
+с версии version - 1 на version и состоит из операций: добавления
+столбца, создания индекса, пакетного преобразования данных или
+произвольного SQL-запроса:
+
+    MIGRATIONS = [
+        Migration(1, 'индекс по дате расхода',
+                  CreateIndex('expense', ('expense_date',))),
+        Migration(2, 'суммы расходов - целые числа',
+                  RewriteData('expense', ('amount',),
+                              lambda amount: (int(float(amount)),))),
+    ]
+    Migrator(connection, MIGRATIONS).migrate(progress=print)
+
+Каждая операция выполняется в своей транзакции, а RewriteData - порциями
+по batch_size строк, каждая в отдельной транзакции, так что другие
+соединения могут работать с базой между порциями. Версия базы
+увеличивается после выполнения всех операций миграции; если миграция
+прервана, при следующем запуске она выполняется заново, поэтому
+операции должны быть идемпотентными (встроенные операции таковы,
+функция преобразования RewriteData должна оставлять уже
+преобразованные значения без изменений). Если преобразованное значение
+нельзя отличить от исходного, миграция объявляется атомарной
+(atomic=True): все ее операции и смена версии выполняются в одной
+транзакции, и прерванная миграция не оставляет изменений.
+
+Миграции применяются до создания репозиториев. Новая база данных
+(без таблиц) сразу получает последнюю версию: ее таблицы создаются
+репозиториями по текущим моделям.
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, NamedTuple, Sequence
+
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+
+
+class Progress(NamedTuple):
+    """
+    Состояние выполнения миграции
+
+    version - версия, на которую переводится база
+    description - описание миграции
+    operation - номер операции в миграции (с нуля)
+    done - количество обработанных строк (или 1 для операций без строк)
+    total - общее количество строк (или 1 для операций без строк)
+    """
+    version: int
+    description: str
+    operation: int
+    done: int
+    total: int
+
+
+ProgressCallback = Callable[[Progress], None]
+
+Report = Callable[[int, int], None]
+
+
+def _check_identifier(name: str) -> str:
+    """
+    Проверяет имя таблицы, столбца или индекса
+
+    Параметры
+    ----------
+    name - имя
+
+    """
+    if not name.isidentifier():
+        raise ValueError(f'invalid identifier {name!r}')
+    return name
+
+
+class Operation(ABC):  # pylint: disable=too-few-public-methods
+    """
+    Операция миграции.
+    Абстрактные методы:
+    apply - выполнить операцию, сообщая о ходе выполнения
+    """
+
+    @abstractmethod
+    def apply(self, connection: ConnectionManager, report: Report) -> None:
+        """
+        Выполнить операцию
+
+        Параметры
+        ----------
+        connection - менеджер соединений с базой данных
+        report - функция report(done, total), сообщающая о ходе выполнения
+
+        """
+
+
+@dataclass(frozen=True)
+class AddColumn(Operation):
+    """
+    Добавить столбец в таблицу, если его еще нет
+
+    table - таблица
+    column - столбец
+    sql_type - тип столбца (пустая строка - без типа)
+    default - значение столбца в существующих строках
+    """
+    table: str
+    column: str
+    sql_type: str = ''
+    default: int | float | str | None = None
+
+    def apply(self, connection: ConnectionManager, report: Report) -> None:
+        table, column = _check_identifier(self.table), _check_identifier(self.column)
+        sql = f'ALTER TABLE {table} ADD COLUMN {column}'
+        if self.sql_type:
+            sql += f' {_check_identifier(self.sql_type)}'
+        if self.default is not None:
+            if isinstance(self.default, str):
+                escaped = self.default.replace("'", "''")
+                sql += f" DEFAULT '{escaped}'"
+            else:
+                sql += f' DEFAULT {self.default!r}'
+        with connection.transaction() as con:
+            columns = {row[1] for row in con.execute(f'PRAGMA table_info({table})')}
+            if column not in columns:
+                con.execute(sql)
+        report(1, 1)
+
+
+@dataclass(frozen=True)
+class CreateIndex(Operation):
+    """
+    Создать индекс по столбцам таблицы, если его еще нет. Индексы
+    с префиксом ix_ принадлежат SQLiteRepository, который удаляет
+    не объявленные в модели, поэтому имя по умолчанию имеет префикс idx_
+
+    table - таблица
+    columns - столбцы индекса
+    name - название индекса (по умолчанию idx_таблица_столбцы)
+    """
+    table: str
+    columns: tuple[str, ...]
+    name: str = ''
+
+    def apply(self, connection: ConnectionManager, report: Report) -> None:
+        table = _check_identifier(self.table)
+        columns = [_check_identifier(c) for c in self.columns]
+        name = _check_identifier(self.name or f'idx_{table}_{"_".join(columns)}')
+        with connection.transaction() as con:
+            con.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                        f'ON {table} ({", ".join(columns)})')
+        report(1, 1)
+
+
+@dataclass(frozen=True)
+class RewriteData(Operation):
+    """
+    Преобразовать значения столбцов во всех строках таблицы.
+    Строки обрабатываются по возрастанию pk порциями по batch_size,
+    каждая порция - в отдельной транзакции. Если таблицы нет,
+    преобразовывать нечего: ее создаст репозиторий
+
+    table - таблица
+    columns - преобразуемые столбцы
+    convert - функция, получающая значения столбцов строки и
+    возвращающая кортеж новых значений
+    batch_size - количество строк в одной транзакции
+    """
+    table: str
+    columns: tuple[str, ...]
+    convert: Callable[..., Sequence[Any]]
+    batch_size: int = 1000
+
+    def apply(self, connection: ConnectionManager, report: Report) -> None:
+        if self.batch_size <= 0:
+            raise ValueError('batch_size must be positive')
+        table = _check_identifier(self.table)
+        columns = [_check_identifier(c) for c in self.columns]
+        select = (f'SELECT pk, {", ".join(columns)} FROM {table} '
+                  'WHERE pk > ? ORDER BY pk LIMIT ?')
+        update = (f'UPDATE {table} SET {", ".join(f"{c} = ?" for c in columns)} '
+                  'WHERE pk = ?')
+        with connection.connect() as con:
+            exists = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                 'AND name = ?', (table,)).fetchone()
+            if exists is None:
+                report(0, 0)
+                return
+            total = con.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        done, last = 0, 0
+        while True:
+            with connection.transaction() as con:
+                rows = con.execute(select, (last, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                con.executemany(update, self._updates(rows))
+            done += len(rows)
+            last = rows[-1][0]
+            report(min(done, total), total)
+        if not done:
+            report(0, 0)
+
+    def _updates(self, rows: Iterable[Sequence[Any]]) -> Iterable[tuple[Any, ...]]:
+        """
+        Возвращает параметры запросов обновления строк
+
+        Параметры
+        ----------
+        rows - строки (pk, значения столбцов)
+
+        """
+        for pk, *values in rows:
+            new_values = tuple(self.convert(*values))
+            if len(new_values) != len(self.columns):
+                raise ValueError(f'convert returned {len(new_values)} values '
+                                 f'for {len(self.columns)} columns')
+            yield (*new_values, pk)
+
+
+@dataclass(frozen=True)
+class RunSQL(Operation):
+    """
+    Выполнить произвольный SQL-запрос. Запрос должен быть идемпотентным
+    (например, CREATE TABLE IF NOT EXISTS)
+
+    sql - запрос
+    """
+    sql: str
+
+    def apply(self, connection: ConnectionManager, report: Report) -> None:
+        with connection.transaction() as con:
+            con.execute(self.sql)
+        report(1, 1)
+
+
+@dataclass(frozen=True, init=False)
+class Migration:
+    """
+    Миграция схемы базы данных на версию version
+
+    version - версия схемы после миграции (положительное целое число)
+    description - описание миграции
+    operations - операции миграции в порядке выполнения
+    atomic - выполнить все операции и смену версии в одной транзакции
+    """
+    version: int
+    description: str
+    operations: tuple[Operation, ...]
+    atomic: bool
+
+    def __init__(self, version: int, description: str,
+                 *operations: Operation, atomic: bool = False) -> None:
+        if isinstance(version, bool) or not isinstance(version, int) or version <= 0:
+            raise ValueError(f'invalid migration version {version!r}')
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'description', description)
+        object.__setattr__(self, 'operations', operations)
+        object.__setattr__(self, 'atomic', atomic)
+
+
+class Migrator:
+    """
+    Применяет миграции к базе данных
+
+    connection - менеджер соединений с базой данных
+    migrations - миграции, упорядоченные по версиям. Версии должны
+    идти подряд, начиная с 1
+    """
+    def __init__(self, connection: ConnectionManager,
+                 migrations: Iterable[Migration]) -> None:
+        self.connection = connection
+        self.migrations = list(migrations)
+        for number, migration in enumerate(self.migrations, 1):
+            if migration.version != number:
+                raise ValueError(f'expected migration version {number}, '
+                                 f'got {migration.version}')
+
+    @property
+    def latest_version(self) -> int:
+        """ Версия схемы после применения всех миграций """
+        return len(self.migrations)
+
+    def current_version(self) -> int:
+        """
+        Возвращает текущую версию схемы базы данных
+
+        """
+        with self.connection.connect() as con:
+            version: int = con.execute('PRAGMA user_version').fetchone()[0]
+        return version
+
+    def pending(self, target: int | None = None) -> list[Migration]:
+        """
+        Возвращает миграции, которые нужно применить для перехода
+        на версию target (по умолчанию - на последнюю)
+
+        Параметры
+        ----------
+        target - версия схемы
+
+        """
+        if target is None:
+            target = self.latest_version
+        if not 0 <= target <= self.latest_version:
+            raise ValueError(f'unknown schema version {target}')
+        current = self.current_version()
+        if current > self.latest_version:
+            raise ValueError(f'database schema version {current} is newer than '
+                             f'supported version {self.latest_version}')
+        if target < current:
+            raise ValueError(f'cannot downgrade schema from version {current} '
+                             f'to {target}')
+        return self.migrations[current:target]
+
+    def migrate(self, target: int | None = None,
+                progress: ProgressCallback | None = None) -> int:
+        """
+        Применяет миграции до версии target (по умолчанию - до последней)
+        и возвращает версию схемы базы данных
+
+        Параметры
+        ----------
+        target - версия схемы
+        progress - функция, получающая Progress после каждого шага
+
+        """
+        pending = self.pending(target)
+        if pending and self._is_new():
+            self._set_version(pending[-1].version)
+            return self.current_version()
+        for migration in pending:
+            with self.connection.transaction() if migration.atomic else nullcontext():
+                for number, operation in enumerate(migration.operations):
+                    def report(done: int, total: int,
+                               migration: Migration = migration,
+                               number: int = number) -> None:
+                        if progress is not None:
+                            progress(Progress(migration.version, migration.description,
+                                              number, done, total))
+                    operation.apply(self.connection, report)
+                self._set_version(migration.version)
+        return self.current_version()
+
+    def _is_new(self) -> bool:
+        """
+        Возвращает, нет ли в базе данных ни одной таблицы
+
+        """
+        with self.connection.connect() as con:
+            count: int = con.execute("SELECT COUNT(*) FROM sqlite_master WHERE "
+                                     "type = 'table' AND name NOT LIKE 'sqlite%'"
+                                     ).fetchone()[0]
+        return count == 0
+
+    def _set_version(self, version: int) -> None:
+        """
+        Записывает версию схемы базы данных
+
+        Параметры
+        ----------
+        version - версия схемы
+
+        """
+        with self.connection.transaction() as con:
+            con.execute(f'PRAGMA user_version = {version}')
@@ -0,0 +1,255 @@
+"""
+Модуль описывает репозиторий sqlite для иерархий с материализованным путем
+
+Кроме полей модели, в таблице хранится столбец path - путь от объекта
+верхнего уровня, составленный из первичных ключей: '/1/7/42/' у объекта 42,
+родитель которого 7, а родитель 7 - объект верхнего уровня 1. Путь
+поддерживают триггеры sqlite, которые репозиторий создает вместе
+с таблицей: при добавлении объекта путь вычисляется по пути родителя,
+а при смене родителя пути всего поддерева переписываются одним
+запросом. Поэтому путь остается верным при любых изменениях таблицы,
+в том числе пакетными методами и другими процессами. Объект, родителя
+которого нет в таблице, получает путь объекта верхнего уровня; когда
+родитель будет добавлен, пути объекта и его потомков пересчитываются.
+
+Потомки объекта - это строки, путь которых начинается с пути объекта;
+по индексу на path они выбираются сравнением диапазона, без рекурсии,
+в том числе в соединении с другими таблицами:
+
+    cat_repo = PathRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense, cat_repo.connection)
+    expenses = cat_repo.get_in_subtree(food.pk, exp_repo, 'category')
+"""
+
+import sqlite3
+from typing import Any
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.sqlite_repository import INDEX_PREFIX, SQLiteRepository
+
+PATH_SEPARATOR = '/'
+
+
+def _upper(path: str) -> str:
+    """
+    SQL-выражение верхней границы (не включительно) путей,
+    начинающихся с пути path (SQL-выражения)
+    """
+    return f"substr({path}, 1, length({path}) - 1) || '0'"
+
+
+def path_bounds(path: str) -> tuple[str, str]:
+    """
+    Границы [нижняя, верхняя) путей поддерева с корнем с путем path
+    """
+    return path, path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+
+
+class PathRepository(SQLiteRepository[T]):
+    """
+    Репозиторий sqlite для иерархии объектов, ссылающихся на родителя
+    полем parent_field, с материализованным путем в столбце path_column.
+    Параметры конструктора такие же, как у SQLiteRepository.
+    Для существующей таблицы без путей столбец добавляется, а пути
+    вычисляются одним рекурсивным запросом при создании репозитория.
+    Перенос объекта к его собственному потомку отклоняется триггером
+    с ошибкой sqlite3.IntegrityError. Объекты, родителя которых нет
+    в таблице, считаются объектами верхнего уровня до его добавления.
+
+    parent_field - поле модели, хранящее pk родителя
+    path_column - столбец с путем
+    """
+    parent_field = 'parent'
+    path_column = 'path'
+
+    def _declared_indexes(self) -> dict[str, tuple[str, ...]]:
+        """
+        Читает индексы, объявленные в модели, и добавляет к ним индексы
+        по столбцу пути и по родителю (по нему триггер добавления ищет
+        потомков, добавленных раньше родителя)
+
+        """
+        indexes = super()._declared_indexes()
+        for column in (self.path_column, self.parent_field):
+            indexes[f'{INDEX_PREFIX}{self.table_name}_{column}'] = (column,)
+        return indexes
+
+    def _sync_indexes(self, con: sqlite3.Connection) -> None:
+        """
+        Добавляет в таблицу столбец пути, если его нет, и приводит индексы
+        в соответствие с объявленными
+
+        Параметры
+        ----------
+        con - соединение с базой данных
+
+        """
+        table, path = self.table_name, self.path_column
+        columns = {row[1] for row in con.execute(f'PRAGMA table_info({table})')}
+        if path not in columns:
+            con.execute(f'ALTER TABLE {table} ADD COLUMN {path} TEXT')
+        # индекс по пути, созданный прежними версиями под другим именем
+        con.execute(f'DROP INDEX IF EXISTS {table}_{path}')
+        super()._sync_indexes(con)
+
+    def create_table(self) -> None:
+        """
+        Создает таблицу, столбец пути, индекс по нему и триггеры,
+        поддерживающие путь, и вычисляет недостающие пути
+
+        """
+        if self.parent_field not in self.fields:
+            raise ValueError(f'unknown field {self.parent_field!r}')
+        super().create_table()
+        table, parent, path = self.table_name, self.parent_field, self.path_column
+        parent_path = (f'coalesce((SELECT {path} FROM {table} '
+                       f"WHERE pk = NEW.{parent}), '{PATH_SEPARATOR}')")
+        new_path = f"{parent_path} || NEW.pk || '{PATH_SEPARATOR}'"
+        in_subtree = f'BETWEEN OLD.{path} AND {_upper(f"OLD.{path}")}'
+        cycle_error = (f"SELECT RAISE(ABORT, 'cannot move {table} "
+                       f"under its own descendant')")
+        children = f'{parent} = NEW.pk AND pk <> NEW.pk'
+        with self.connection.transaction() as con:
+            for trigger in ('insert', 'move'):
+                con.execute(f'DROP TRIGGER IF EXISTS {table}_{path}_{trigger}')
+            # потомки, добавленные раньше родителя, переносятся к нему
+            # запросом SET parent = parent: триггер переноса пересчитывает
+            # пути поддерева, если путь не соответствует пути родителя
+            con.execute(f'CREATE TRIGGER {table}_{path}_insert '
+                        f'AFTER INSERT ON {table} BEGIN '
+                        f'UPDATE {table} SET {path} = {new_path} WHERE pk = NEW.pk; '
+                        f'{cycle_error} WHERE EXISTS (SELECT 1 FROM {table} '
+                        f'WHERE {children} AND instr({parent_path}, '
+                        f"'{PATH_SEPARATOR}' || pk || '{PATH_SEPARATOR}')); "
+                        f'UPDATE {table} SET {parent} = {parent} '
+                        f'WHERE {children}; END')
+            con.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_{path}_cycle '
+                        f'BEFORE UPDATE OF {parent} ON {table} '
+                        f'WHEN NEW.{parent} IS NOT OLD.{parent} AND '
+                        f'(SELECT {path} FROM {table} WHERE pk = NEW.{parent}) '
+                        f'{in_subtree} BEGIN {cycle_error}; END')
+            con.execute(f'CREATE TRIGGER {table}_{path}_move '
+                        f'AFTER UPDATE OF {parent} ON {table} '
+                        f'WHEN NEW.{parent} IS NOT OLD.{parent} '
+                        f'OR OLD.{path} IS NOT {new_path} BEGIN '
+                        f'UPDATE {table} SET {path} = {new_path} '
+                        f'|| substr({path}, length(OLD.{path}) + 1) '
+                        f'WHERE {path} >= OLD.{path} '
+                        f'AND {path} < {_upper(f"OLD.{path}")}; END')
+            self._fill_paths(con)
+
+    def _fill_paths(self, con: sqlite3.Connection) -> None:
+        """
+        Вычисляет пути строк, у которых их нет (таблица создана до
+        появления столбца пути), одним рекурсивным запросом: от строк,
+        путь родителя которых известен, вниз по иерархии
+
+        Параметры
+        ----------
+        con - соединение с базой данных
+
+        """
+        table, parent, path = self.table_name, self.parent_field, self.path_column
+        sep = PATH_SEPARATOR
+        con.execute(f'WITH RECURSIVE tree(pk, {path}) AS ('
+                    f"SELECT c.pk, coalesce(p.{path}, '{sep}') || c.pk || '{sep}' "
+                    f'FROM {table} c LEFT JOIN {table} p ON p.pk = c.{parent} '
+                    f'WHERE c.{path} IS NULL AND (p.pk IS NULL OR p.{path} IS NOT NULL) '
+                    f"UNION ALL SELECT c.pk, tree.{path} || c.pk || '{sep}' "
+                    f'FROM {table} c JOIN tree ON c.{parent} = tree.pk '
+                    f'WHERE c.{path} IS NULL) '
+                    f'UPDATE {table} SET {path} = tree.{path} FROM tree '
+                    f'WHERE {table}.pk = tree.pk')
+
+    def get_path(self, pk: int) -> str | None:
+        """
+        Получает путь объекта ('/1/7/42/') или None, если объекта нет
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+
+        """
+        with self.connection.connect() as con:
+            row = con.execute(f'SELECT {self.path_column} FROM {self.table_name} '
+                              'WHERE pk = ?', (pk,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_subtree(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получает всех потомков объекта сравнением диапазона путей
+        по индексу: по уровням, внутри уровня - по pk
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+        parent_field - поле, хранящее pk родителя
+
+        """
+        if parent_field != self.parent_field:
+            return super().get_subtree(pk, parent_field)
+        path = self.path_column
+        depth = f"length({path}) - length(replace({path}, '{PATH_SEPARATOR}', ''))"
+        with self.connection.connect() as con:
+            row = con.execute(f'SELECT {path} FROM {self.table_name} WHERE pk = ?',
+                              (pk,)).fetchone()
+            if row is None or row[0] is None:
+                return []
+            lower, upper = path_bounds(row[0])
+            rows = con.execute(f'{self._sql.select} WHERE {path} > ? AND {path} < ? '
+                               f'ORDER BY {depth}, pk', (lower, upper)).fetchall()
+        return list(map(self._sql.row_factory, rows))
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получает предков объекта по первичным ключам из его пути:
+        родителя, его родителя и т.д. до объекта верхнего уровня
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+        parent_field - поле, хранящее pk родителя
+
+        """
+        if parent_field != self.parent_field:
+            return super().get_ancestors(pk, parent_field)
+        path = self.get_path(pk)
+        if path is None:
+            return []
+        pks = [int(x) for x in path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR)]
+        return list(self.get_many(reversed(pks[:-1])).values())
+
+    def get_in_subtree(self, pk: int, repo: SQLiteRepository[Any],
+                       field: str, key: str = 'pk') -> list[Any]:
+        """
+        Получает объекты другой таблицы той же базы данных, поле field
+        которых ссылается на объект pk или любого его потомка, одним
+        запросом: диапазон путей по индексу, соединенный с таблицей repo.
+        Объекты упорядочены по pk
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+        repo - репозиторий ссылающихся объектов
+        field - поле ссылающихся объектов
+        key - поле объектов иерархии, на которое ссылается field
+
+        """
+        # pylint: disable=protected-access
+        if field not in repo.fields:
+            raise ValueError(f'unknown field {field!r}')
+        if key != 'pk' and key not in self.fields:
+            raise ValueError(f'unknown field {key!r}')
+        path = self.get_path(pk)
+        if path is None:
+            return []
+        table, other = self.table_name, repo.table_name
+        # унарный + снимает с ключа тип столбца: иначе sqlite приводит
+        # к нему значения field и не может искать их по индексу field
+        sql = (f'{repo._sql.select_qualified} JOIN {table} '
+               f'ON {other}.{field} = +{table}.{key} '
+               f'WHERE {table}.{self.path_column} >= ? '
+               f'AND {table}.{self.path_column} < ? ORDER BY {other}.pk')
+        with self.connection.connect() as con:
+            rows = con.execute(sql, path_bounds(path)).fetchall()
+        return list(map(repo._sql.row_factory, rows))
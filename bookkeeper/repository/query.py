@@ -0,0 +1,340 @@
+"""
+Модуль описывает условия выборки для метода get_all репозиториев
+
+Условие строится из сравнений полей и объединяется операторами & и |:
+
+    Between('expense_date', '2023-01-01', '2023-01-31') & In('category', [1, 2])
+
+Каждое условие умеет преобразовываться в параметризованный SQL-запрос
+(для SQLiteRepository) и в функцию-предикат (для MemoryRepository).
+Шаблоны StartsWith и Like применяются к хранимому значению как есть.
+Словарь {'поле': значение} по-прежнему означает равенство всех полей.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, ClassVar, Iterable
+
+Predicate = Callable[[Any], bool]
+
+Encoder = Callable[[str, Any], Any]
+
+
+def _no_encoding(field: str, value: Any) -> Any:  # pylint: disable=unused-argument
+    return value
+
+
+def prefix_upper(prefix: str) -> str | None:
+    """
+    Вернуть наименьшую строку, большую всех строк, начинающихся
+    с непустого префикса prefix, или None, если такой строки нет
+    (префикс состоит из символов U+10FFFF)
+    """
+    stem = prefix.rstrip(chr(0x10FFFF))
+    if not stem:
+        return None
+    return stem[:-1] + chr(ord(stem[-1]) + 1)
+
+
+class Condition(ABC):
+    """
+    Условие выборки.
+    Абстрактные методы:
+    to_sql - SQL-выражение с параметрами; encode(поле, значение)
+    преобразует значения параметров к формату хранения в базе данных
+    to_predicate - функция, проверяющая объект
+    fields - названия полей, участвующих в условии
+    """
+
+    @abstractmethod
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        """ Вернуть SQL-выражение и список его параметров """
+
+    @abstractmethod
+    def to_predicate(self) -> Predicate:
+        """ Вернуть функцию, проверяющую, удовлетворяет ли объект условию """
+
+    @abstractmethod
+    def fields(self) -> set[str]:
+        """ Вернуть названия полей, участвующих в условии """
+
+    def __and__(self, other: 'Condition') -> 'Condition':
+        return And(self, other)
+
+    def __or__(self, other: 'Condition') -> 'Condition':
+        return Or(self, other)
+
+
+Where = dict[str, Any] | Condition
+
+
+@dataclass(frozen=True)
+class _FieldCondition(Condition, ABC):
+    """
+    Условие на значение одного поля
+    """
+    field: str
+
+    def fields(self) -> set[str]:
+        return {self.field}
+
+
+@dataclass(frozen=True)
+class Compare(_FieldCondition):
+    """
+    Сравнение значения поля с заданным значением.
+    Сравнение с None означает проверку на NULL (только для Eq и Ne).
+    Для остальных сравнений объекты со значением None не подходят,
+    а сравнению с None не удовлетворяет ни один объект, как и в sqlite.
+    """
+    value: Any
+    op: ClassVar[str] = '='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left == right)
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        return f'{self.field} {self.op} ?', [encode(self.field, self.value)]
+
+    def to_predicate(self) -> Predicate:
+        field, value, compare = self.field, self.value, self._compare
+        if value is None:
+            return lambda obj: False
+
+        def predicate(obj: Any) -> bool:
+            x = getattr(obj, field)
+            return x is not None and compare(x, value)
+        return predicate
+
+
+@dataclass(frozen=True)
+class Eq(Compare):
+    """ Поле равно значению """
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        if self.value is None:
+            return f'{self.field} IS NULL', []
+        return super().to_sql(encode)
+
+    def to_predicate(self) -> Predicate:
+        field, value = self.field, self.value
+        return lambda obj: bool(getattr(obj, field) == value)
+
+
+@dataclass(frozen=True)
+class Ne(Compare):
+    """ Поле не равно значению """
+    op: ClassVar[str] = '!='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left != right)
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        if self.value is None:
+            return f'{self.field} IS NOT NULL', []
+        return super().to_sql(encode)
+
+    def to_predicate(self) -> Predicate:
+        if self.value is None:
+            field = self.field
+            return lambda obj: getattr(obj, field) is not None
+        return super().to_predicate()
+
+
+@dataclass(frozen=True)
+class Lt(Compare):
+    """ Поле меньше значения """
+    op: ClassVar[str] = '<'
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left < right)
+
+
+@dataclass(frozen=True)
+class Le(Compare):
+    """ Поле меньше или равно значению """
+    op: ClassVar[str] = '<='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left <= right)
+
+
+@dataclass(frozen=True)
+class Gt(Compare):
+    """ Поле больше значения """
+    op: ClassVar[str] = '>'
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left > right)
+
+
+@dataclass(frozen=True)
+class Ge(Compare):
+    """ Поле больше или равно значению """
+    op: ClassVar[str] = '>='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> bool:
+        return bool(left >= right)
+
+
+@dataclass(frozen=True)
+class Between(_FieldCondition):
+    """
+    Значение поля лежит в отрезке [low, high].
+    Если граница равна None, условию не удовлетворяет ни один объект,
+    как и в sqlite
+    """
+    low: Any
+    high: Any
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        return (f'{self.field} BETWEEN ? AND ?',
+                [encode(self.field, self.low), encode(self.field, self.high)])
+
+    def to_predicate(self) -> Predicate:
+        field, low, high = self.field, self.low, self.high
+        if low is None or high is None:
+            return lambda obj: False
+
+        def predicate(obj: Any) -> bool:
+            x = getattr(obj, field)
+            return x is not None and bool(low <= x <= high)
+        return predicate
+
+
+@dataclass(frozen=True)
+class In(_FieldCondition):
+    """
+    Значение поля входит в заданный набор значений. Как и в sqlite,
+    None в наборе не совпадает ни с одним значением, в том числе с None
+    """
+    values: Iterable[Any]
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'values', tuple(self.values))
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        values = [encode(self.field, value) for value in self.values]
+        if not values:
+            return '0', []
+        return f'{self.field} IN ({", ".join("?" * len(values))})', values
+
+    def to_predicate(self) -> Predicate:
+        field = self.field
+        try:
+            values: frozenset[Any] | tuple[Any, ...] = frozenset(self.values)
+        except TypeError:
+            values = tuple(self.values)
+        return lambda obj: (v := getattr(obj, field)) is not None and v in values
+
+
+@dataclass(frozen=True)
+class StartsWith(_FieldCondition):
+    """
+    Строковое значение поля начинается с префикса (с учетом регистра).
+    В sqlite выполняется как сравнение диапазона, что позволяет
+    использовать индекс по полю
+    """
+    prefix: str
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        if not self.prefix:
+            return f'{self.field} IS NOT NULL', []
+        upper = prefix_upper(self.prefix)
+        if upper is None:
+            return f'{self.field} >= ?', [self.prefix]
+        return f'({self.field} >= ? AND {self.field} < ?)', [self.prefix, upper]
+
+    def to_predicate(self) -> Predicate:
+        field, prefix = self.field, self.prefix
+
+        def predicate(obj: Any) -> bool:
+            x = getattr(obj, field)
+            return isinstance(x, str) and x.startswith(prefix)
+        return predicate
+
+
+@dataclass(frozen=True)
+class Like(_FieldCondition):
+    """
+    Значение поля соответствует шаблону LIKE: % - любая
+    последовательность символов, _ - один символ. Как и в sqlite,
+    сравнение выполняется без учета регистра
+    """
+    pattern: str
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        return f'{self.field} LIKE ?', [self.pattern]
+
+    def to_predicate(self) -> Predicate:
+        regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                        for c in self.pattern)
+        match = re.compile(regex, re.IGNORECASE | re.DOTALL).fullmatch
+        field = self.field
+
+        def predicate(obj: Any) -> bool:
+            x = getattr(obj, field)
+            return x is not None and match(str(x)) is not None
+        return predicate
+
+
+@dataclass(frozen=True, init=False)
+class _Compound(Condition, ABC):
+    """
+    Объединение нескольких условий
+    """
+    conditions: tuple[Condition, ...]
+    op: ClassVar[str] = 'AND'
+
+    def __init__(self, *conditions: Condition) -> None:
+        object.__setattr__(self, 'conditions', conditions)
+
+    def to_sql(self, encode: Encoder = _no_encoding) -> tuple[str, list[Any]]:
+        if not self.conditions:
+            return ('1' if self.op == 'AND' else '0'), []
+        parts = []
+        params: list[Any] = []
+        for condition in self.conditions:
+            sql, condition_params = condition.to_sql(encode)
+            parts.append(f'({sql})')
+            params.extend(condition_params)
+        return f' {self.op} '.join(parts), params
+
+    def fields(self) -> set[str]:
+        return set().union(*(c.fields() for c in self.conditions))
+
+
+class And(_Compound):
+    """ Выполнены все условия """
+
+    def to_predicate(self) -> Predicate:
+        predicates = [c.to_predicate() for c in self.conditions]
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda obj: all(p(obj) for p in predicates)
+
+
+class Or(_Compound):
+    """ Выполнено хотя бы одно условие """
+    op: ClassVar[str] = 'OR'
+
+    def to_predicate(self) -> Predicate:
+        predicates = [c.to_predicate() for c in self.conditions]
+        return lambda obj: any(p(obj) for p in predicates)
+
+
+def as_condition(where: Where) -> Condition:
+    """
+    Преобразовать условие get_all в объект Condition.
+    Словарь {'поле': значение} означает равенство всех полей.
+    """
+    if isinstance(where, Condition):
+        return where
+    return And(*(Eq(field, value) for field, value in where.items()))
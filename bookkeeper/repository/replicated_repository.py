@@ -0,0 +1,213 @@
+"""
+Модуль описывает репозиторий с копией данных в оперативной памяти
+
+Все чтения выполняются из копии (MemoryRepository с индексами), а все
+изменения сначала записываются в SQLiteRepository и затем переносятся
+в копию. Первичные ключи назначает sqlite, а в копию попадают объекты
+в том виде, в каком их возвращает база данных, поэтому чтения из копии
+совпадают с чтениями из базы.
+
+    exp_repo = ReplicatedRepository(SQLiteRepository(db_file, Expense),
+                                    sorted_indexes=['expense_date'])
+    with cat_repo.transaction(), exp_repo.transaction():
+        cat_repo.delete_many(cat_pks)
+        exp_repo.delete_many(exp_pks)
+
+Если запись завершилась исключением (в том числе при откате транзакции),
+копия помечается устаревшей и перечитывается из базы при следующем
+чтении. Изменения, сделанные в базе в обход репозитория, копия не видит,
+для них предназначены методы refresh (перечитать все) и sync (перечитать
+строки с заданными ключами, например полученные от ChangeWatcher).
+
+Подписчики репозитория получают изменения после того, как они перенесены
+в копию и зафиксированы в базе, поэтому могут сразу читать
+из репозитория новые данные. refresh и drop_table изменений не публикуют.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED, Change
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Where
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+class ReplicatedRepository(AbstractRepository[T]):
+    """
+    Репозиторий, читающий из копии в памяти и записывающий в sqlite
+
+    store - репозиторий sqlite, в котором хранятся данные
+    replica - копия данных в оперативной памяти
+    hash_indexes, sorted_indexes - индексы копии, как в MemoryRepository
+    """
+
+    def __init__(self, store: SQLiteRepository[T],
+                 hash_indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = ()) -> None:
+        self.store = store
+        self.replica: MemoryRepository[T] = MemoryRepository(hash_indexes,
+                                                             sorted_indexes)
+        self._stale = True
+
+    @property
+    def connection(self) -> ConnectionManager:
+        """ Менеджер соединений базы данных """
+        return self.store.connection
+
+    def refresh(self) -> None:
+        """ Перечитать копию из базы данных """
+        self.replica.reset(self.store.iter_all())
+        self._stale = False
+
+    def sync(self, pks: Iterable[int]) -> list[Change]:
+        """
+        Перечитать из базы данных записи с первичными ключами pks,
+        измененные в обход репозитория, сообщить подписчикам
+        о расхождениях с копией и вернуть их
+        """
+        pks = list(dict.fromkeys(pks))
+        replica = self._read()
+        fresh = self.store.get_many(pks)
+        old = replica.get_many(pks)
+        model = self.store.cls
+        changes = [Change(ADDED if pk not in old else UPDATED, model, pk)
+                   for pk, obj in fresh.items() if old.get(pk) != obj]
+        changes += [Change(DELETED, model, pk) for pk in old if pk not in fresh]
+        replica.update_many(fresh[c.pk] for c in changes if c.kind != DELETED)
+        replica.delete_many(c.pk for c in changes if c.kind == DELETED)
+        self.changes.publish(changes)
+        return changes
+
+    def _read(self) -> MemoryRepository[T]:
+        """ Вернуть копию, перечитав ее, если она устарела """
+        if self._stale:
+            self.refresh()
+        return self.replica
+
+    @contextmanager
+    def _write(self) -> Iterator[MemoryRepository[T]]:
+        """
+        Выполнить запись; при исключении пометить копию устаревшей
+        """
+        replica = self._read()
+        try:
+            yield replica
+        except BaseException:
+            self._stale = True
+            raise
+
+    def _sync(self, replica: MemoryRepository[T], pks: Iterable[int]) -> list[int]:
+        """
+        Перенести в копию записи базы данных с первичными ключами pks;
+        вернуть ключи найденных в базе записей
+        """
+        fresh = self.store.get_many(pks)
+        replica.update_many(fresh.values())
+        return list(fresh)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить изменения внутри блока with в одной транзакции sqlite.
+        Несколько репозиториев с общим менеджером соединений объединяются
+        вложенными блоками: with a.transaction(), b.transaction(): ...
+        """
+        with self.changes.batch(), self._write(), self.store.transaction() as con:
+            yield con
+
+    def _publish(self, kind: str, model: type, pks: Iterable[int]) -> None:
+        """
+        Сообщить подписчикам об изменении после фиксации транзакции;
+        при откате транзакции сообщение отменяется
+        """
+        if self.changes.listening:
+            self.store.connection.on_commit(super()._publish, kind, model, list(pks))
+
+    def add(self, obj: T) -> int:
+        with self._write() as replica:
+            pk = self.store.add(obj)
+            self._sync(replica, [pk])
+        self._publish(ADDED, self.store.cls, [pk])
+        return pk
+
+    def get(self, pk: int) -> T | None:
+        return self._read().get(pk)
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        return self._read().get_many(pks)
+
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
+        return self._read().get_all(where, order_by, limit, after)
+
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        return self._read().iter_all(where, batch_size, order_by, limit, after)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: Where | None = None, group_by: str | None = None,
+                  period: str | None = None) -> Any:
+        return self._read().aggregate(func, field, where, group_by, period)
+
+    def get_subtree(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        return self._read().get_subtree(pk, parent_field)
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        return self._read().get_ancestors(pk, parent_field)
+
+    def iter_tree(self, parent_field: str = 'parent',
+                  batch_size: int = 1000) -> Iterator[T]:
+        return self._read().iter_tree(parent_field, batch_size)
+
+    def update(self, obj: T) -> None:
+        with self._write() as replica:
+            self.store.update(obj)
+            updated = self._sync(replica, [obj.pk])
+        self._publish(UPDATED, self.store.cls, updated)
+
+    def delete(self, pk: int) -> None:
+        with self._write() as replica:
+            self.store.delete(pk)
+            if replica.get(pk) is None:
+                return
+            replica.delete(pk)
+        self._publish(DELETED, self.store.cls, [pk])
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        with self._write() as replica:
+            pks = self.store.add_many(objs)
+            self._sync(replica, pks)
+        self._publish(ADDED, self.store.cls, pks)
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        with self._write() as replica:
+            self.store.update_many(objs)
+            updated = self._sync(replica, [obj.pk for obj in objs])
+        self._publish(UPDATED, self.store.cls, updated)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        with self._write() as replica:
+            self.store.delete_many(pks)
+            deleted = list(replica.get_many(pks))
+            replica.delete_many(deleted)
+        self._publish(DELETED, self.store.cls, deleted)
+
+    def drop_table(self) -> None:
+        """ Уничтожить таблицу в базе данных и очистить копию """
+        self.store.drop_table()
+        self.replica.reset()
+        self._stale = False
+
+    def close(self) -> None:
+        """ Закрыть соединения с базой данных """
+        self.store.close()
@@ -0,0 +1,147 @@
+"""
+Модуль описывает сохранение MemoryRepository на диск: двоичный снимок
+всех объектов и журнал изменений, сделанных после снимка
+
+Снимок - файл с заголовком и сериализованными модулем pickle объектами,
+записывается целиком во временный файл, который затем атомарно заменяет
+прежний снимок. Датаклассы сохраняются кортежами значений полей
+и при загрузке создаются вызовом конструктора, что компактнее
+и быстрее сериализации каждого объекта целиком.
+
+Журнал - файл, в конец которого дописываются записи (операция, данные);
+каждая запись сбрасывается на диск до возврата из метода, изменившего
+репозиторий; при загрузке записи применяются к снимку по порядку.
+Запись, оборванная при аварийном завершении, отбрасывается.
+
+Формат основан на pickle, поэтому загружать можно только файлы,
+созданные самим приложением.
+"""
+
+import os
+import pickle
+from dataclasses import fields, is_dataclass
+from operator import attrgetter
+from typing import Any, BinaryIO, Iterator
+
+SNAPSHOT_HEADER = b'BOOKKEEPER-SNAPSHOT-1\n'
+
+PUT = 'put'
+
+DELETE = 'delete'
+
+
+def _pack(objs: list[Any]) -> list[tuple[type | None, Any]]:
+    """
+    Сгруппировать объекты по классам. Объекты датаклассов, все поля
+    которых задаются конструктором, заменяются кортежами значений полей
+    """
+    groups: dict[type, list[Any]] = {}
+    for obj in objs:
+        groups.setdefault(type(obj), []).append(obj)
+    packed: list[tuple[type | None, Any]] = []
+    for cls, group in groups.items():
+        names = [f.name for f in fields(cls)] if is_dataclass(cls) else []
+        if names and all(f.init for f in fields(cls)):
+            getter = attrgetter(*names)
+            rows = [getter(obj) for obj in group] if len(names) > 1 \
+                else [(getter(obj),) for obj in group]
+            packed.append((cls, rows))
+        else:
+            packed.append((None, group))
+    return packed
+
+
+def _unpack(packed: list[tuple[type | None, Any]]) -> list[Any]:
+    """
+    Восстановить объекты, сгруппированные функцией _pack,
+    в порядке первичных ключей
+    """
+    objs: list[Any] = []
+    for cls, group in packed:
+        objs.extend(group if cls is None else (cls(*row) for row in group))
+    if len(packed) > 1:
+        objs.sort(key=attrgetter('pk'))
+    return objs
+
+
+def write_snapshot(path: str, next_pk: int, objs: list[Any]) -> None:
+    """
+    Записать снимок объектов
+
+    Параметры
+    ----------
+    path - путь к файлу снимка
+    next_pk - первичный ключ, который получит следующий добавленный объект
+    objs - объекты
+
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(SNAPSHOT_HEADER)
+        pickle.dump((next_pk, _pack(objs)), file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> tuple[int, list[Any]]:
+    """
+    Прочитать снимок объектов и вернуть пару
+    (первичный ключ следующего объекта, объекты)
+
+    Параметры
+    ----------
+    path - путь к файлу снимка
+
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(SNAPSHOT_HEADER)) != SNAPSHOT_HEADER:
+            raise ValueError(f'{path} is not a repository snapshot')
+        next_pk, packed = pickle.load(file)
+    return next_pk, _unpack(packed)
+
+
+class ChangeLog:
+    """
+    Журнал изменений, открытый для дописывания
+
+    path - путь к файлу журнала
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: BinaryIO = open(path, 'ab')  # pylint: disable=consider-using-with
+
+    def replay(self) -> Iterator[tuple[str, Any]]:
+        """
+        Перебрать записи журнала по порядку. Оборванная последняя
+        запись отбрасывается и удаляется из файла
+        """
+        with open(self.path, 'rb') as file:
+            end = 0
+            while True:
+                try:
+                    record = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError, ValueError, IndexError):
+                    break
+                end = file.tell()
+                yield record
+        if end != os.path.getsize(self.path):
+            self._file.truncate(end)
+
+    def append(self, operation: str, data: Any) -> None:
+        """
+        Дописать запись (operation, data) в конец журнала и сбросить
+        ее на диск: после возврата запись переживает сбой питания
+        """
+        pickle.dump((operation, data), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def clear(self) -> None:
+        """ Удалить все записи журнала """
+        self._file.truncate(0)
+
+    def close(self) -> None:
+        """ Закрыть файл журнала """
+        self._file.close()
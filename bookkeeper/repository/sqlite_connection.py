@@ -0,0 +1,266 @@
+"""
+Модуль описывает менеджер соединений с базой данных sqlite
+
+Менеджер хранит долгоживущие соединения (по одному на поток), настраивает
+их с помощью PRAGMA и позволяет нескольким репозиториям работать через
+общее соединение вместо открытия нового соединения на каждый запрос.
+
+Менеджер можно использовать из нескольких потоков: каждый поток получает
+собственное соединение, а транзакции на запись выполняются по очереди.
+Соединения завершившихся потоков закрываются при открытии нового
+соединения, поэтому их число не растет вместе с числом потоков.
+С PERFORMANCE_PRAGMAS база работает в режиме WAL, в котором читатели
+не блокируют пишущий поток и не ждут его.
+
+Несколько процессов (графический и консольный клиенты, скрипты импорта)
+могут работать с одной базой: соединение ждет освобождения заблокированной
+базы до busy_timeout секунд, транзакции начинаются с BEGIN IMMEDIATE
+(блокировка на запись захватывается сразу, а не при первом изменении),
+а начало и фиксация транзакции, завершившиеся ошибкой SQLITE_BUSY,
+повторяются с нарастающей паузой согласно RetryPolicy.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, NamedTuple, TypeVar
+
+R = TypeVar('R')
+
+DEFAULT_PRAGMAS: dict[str, Any] = {'foreign_keys': 'ON'}
+
+PERFORMANCE_PRAGMAS: dict[str, Any] = {
+    'foreign_keys': 'ON',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+}
+
+
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+
+class RetryPolicy(NamedTuple):
+    """
+    Повтор операций, завершившихся ошибкой SQLITE_BUSY (база данных
+    заблокирована другим соединением)
+
+    attempts - число попыток (1 - без повторов)
+    delay - пауза перед первым повтором в секундах; после каждой попытки
+    пауза удваивается, но не превышает max_delay. Чтобы процессы,
+    ожидающие одну блокировку, не повторяли попытки одновременно,
+    пауза случайно уменьшается не более чем вдвое
+    """
+    attempts: int = 5
+    delay: float = 0.05
+    max_delay: float = 1.0
+
+    def delays(self) -> Iterator[float]:
+        """ Перебрать паузы перед повторами """
+        delay = self.delay
+        for _ in range(self.attempts - 1):
+            yield delay * random.uniform(0.5, 1.0)
+            delay = min(delay * 2, self.max_delay)
+
+
+def is_busy(error: Exception) -> bool:
+    """ Вызвана ли ошибка блокировкой базы данных другим соединением """
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return 'locked' in str(error)
+    return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def _pragma_sql(name: str, value: Any) -> str:
+    """
+    Формирует запрос PRAGMA, проверяя имя и значение
+
+    Параметры
+    ----------
+    name - название PRAGMA
+    value - значение PRAGMA (целое число или ключевое слово)
+
+    """
+    if not name.isidentifier():
+        raise ValueError(f'invalid pragma name {name!r}')
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'invalid value {value!r} for pragma {name}')
+    if isinstance(value, str) and not value.isalnum():
+        raise ValueError(f'invalid value {value!r} for pragma {name}')
+    return f'PRAGMA {name} = {value}'
+
+
+class ConnectionManager:  # pylint: disable=too-many-instance-attributes
+    """
+    Менеджер соединений с базой данных
+
+    db_file - путь к базе данных
+    pragmas - PRAGMA, применяемые к каждому новому соединению
+    persistent - хранить ли соединения между запросами. Если False,
+    соединение открывается на время одного запроса (или транзакции)
+    и закрывается после него
+    busy_timeout - сколько секунд запрос ждет освобождения базы данных,
+    заблокированной другим соединением
+    retry - повтор начала и фиксации транзакций при ошибке SQLITE_BUSY
+    """
+    def __init__(self, db_file: str, pragmas: dict[str, Any] | None = None,
+                 persistent: bool = True,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+                 retry: RetryPolicy = RetryPolicy()) -> None:
+        self.db_file = db_file
+        self.pragmas = DEFAULT_PRAGMAS | (pragmas or {})
+        self.persistent = persistent
+        self.busy_timeout = busy_timeout
+        self.retry = retry
+        for name, value in self.pragmas.items():
+            _pragma_sql(name, value)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._connections: list[tuple[threading.Thread, sqlite3.Connection]] = []
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        """
+        Открывает новое соединение и применяет к нему PRAGMA
+
+        """
+        con = sqlite3.connect(self.db_file, timeout=self.busy_timeout,
+                              isolation_level=None, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            self.retrying(con.execute, _pragma_sql(name, value))
+        return con
+
+    def retrying(self, action: Callable[..., R], *args: Any) -> R:
+        """
+        Выполняет action(*args), повторяя вызов согласно политике retry,
+        пока он завершается ошибкой SQLITE_BUSY
+
+        """
+        delays = self.retry.delays()
+        while True:
+            try:
+                return action(*args)
+            except sqlite3.OperationalError as error:
+                delay = next(delays, None)
+                if delay is None or not is_busy(error):
+                    raise
+                time.sleep(delay)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выдает соединение текущего потока. Вложенные вызовы в одном
+        потоке получают одно и то же соединение
+
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError('connection manager is closed')
+        local = self._local
+        con: sqlite3.Connection | None = getattr(local, 'con', None)
+        if con is None:
+            con = self._open()
+            local.con = con
+            local.depth = 0
+            if self.persistent:
+                self._register(con)
+        local.depth += 1
+        try:
+            yield con
+        finally:
+            local.depth -= 1
+            if local.depth == 0 and not self.persistent:
+                local.con = None
+                con.close()
+
+    def _register(self, con: sqlite3.Connection) -> None:
+        """
+        Запоминает соединение текущего потока и закрывает соединения
+        завершившихся потоков
+
+        Параметры
+        ----------
+        con - новое соединение текущего потока
+
+        """
+        with self._lock:
+            dead = [c for thread, c in self._connections if not thread.is_alive()]
+            self._connections = [(thread, c) for thread, c in self._connections
+                                 if thread.is_alive()]
+            self._connections.append((threading.current_thread(), con))
+        for old in dead:
+            old.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполняет запросы внутри одной транзакции: фиксирует изменения
+        при успешном завершении и откатывает их при исключении.
+        Вложенные транзакции присоединяются к внешней. Транзакции разных
+        потоков выполняются по очереди, поэтому не конкурируют за запись
+        в базу данных. Транзакция сразу захватывает блокировку на запись
+        (BEGIN IMMEDIATE), поэтому ошибка SQLITE_BUSY возможна только
+        при ее начале и фиксации, которые повторяются согласно retry
+
+        """
+        with self.connect() as con:
+            if con.in_transaction:
+                yield con
+                return
+            with self._write_lock:
+                self.retrying(con.execute, 'BEGIN IMMEDIATE')
+                callbacks: list[tuple[Callable[..., Any], tuple[Any, ...]]] = []
+                self._local.on_commit = callbacks
+                try:
+                    yield con
+                    self.retrying(con.commit)
+                except BaseException:
+                    con.rollback()
+                    raise
+                finally:
+                    self._local.on_commit = None
+            for callback, args in callbacks:
+                callback(*args)
+
+    def in_transaction(self) -> bool:
+        """
+        Выполняет ли текущий поток транзакцию (метод transaction)
+
+        """
+        return getattr(self._local, 'on_commit', None) is not None
+
+    def on_commit(self, callback: Callable[..., Any], *args: Any) -> None:
+        """
+        Вызывает callback(*args) после фиксации транзакции текущего потока
+        (при откате транзакции вызов отменяется) или сразу, если поток
+        не выполняет транзакцию
+
+        """
+        callbacks = getattr(self._local, 'on_commit', None)
+        if callbacks is None:
+            callback(*args)
+        else:
+            callbacks.append((callback, args))
+
+    def close(self) -> None:
+        """
+        Закрывает все открытые соединения
+
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._closed = True
+        for _, con in connections:
+            con.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> 'ConnectionManager':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
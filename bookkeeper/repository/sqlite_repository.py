@@ -3,9 +3,123 @@
 """
 
 import sqlite3
+from contextlib import ExitStack, contextmanager
+from dataclasses import fields as dataclass_fields, is_dataclass
 from inspect import get_annotations
-from typing import Any
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Sequence
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, parse_order_by)
+from bookkeeper.repository.aggregation import check_aggregate
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED
+from bookkeeper.repository.columns import Column, column_for
+from bookkeeper.repository.query import Where, as_condition
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+
+
+_PERIOD_SQL = {
+    'day': 'substr({}, 1, 10)',
+    'week': "strftime('%Y-%W', {})",
+    'month': 'substr({}, 1, 7)',
+    'year': 'substr({}, 1, 4)',
+}
+
+
+INDEX_PREFIX = 'ix_'
+
+# Количество ключей в одном запросе WHERE pk IN (...): не больше
+# минимального ограничения sqlite на число параметров запроса (999)
+GET_MANY_CHUNK = 500
+
+
+class _Compiled(NamedTuple):
+    """
+    Запросы и преобразователи модели, подготовленные один раз
+    при создании репозитория
+
+    select - выборка всех столбцов в порядке аргументов конструктора модели
+    select_qualified - то же с именами столбцов, уточненными именем таблицы
+    (для запросов с соединением таблиц)
+    get - выборка по первичному ключу
+    get_many - выборка первичного ключа и всех столбцов по набору ключей
+    (в конце запроса добавляются параметры вида (?, ?, ...))
+    insert - вставка без первичного ключа
+    insert_with_pk - вставка с явно заданным первичным ключом
+    update - обновление по первичному ключу
+    delete - удаление по первичному ключу
+    max_pk - получение максимального первичного ключа
+    tree - выборка всех столбцов записей, первичные ключи которых
+    перечислены в рекурсивном подзапросе tree(pk, depth), по возрастанию
+    depth и pk (в начале запроса добавляется WITH RECURSIVE tree ...)
+    values - функция, возвращающая кортеж значений полей объекта
+    в формате хранения в базе данных
+    row_factory - функция, создающая объект из строки выборки select
+    columns - столбцы полей модели {название поля: Column}
+    """
+    select: str
+    select_qualified: str
+    get: str
+    get_many: str
+    insert: str
+    insert_with_pk: str
+    update: str
+    delete: str
+    max_pk: str
+    tree: str
+    values: Callable[[Any], tuple[Any, ...]]
+    row_factory: Callable[[Sequence[Any]], Any]
+    columns: dict[str, Column]
+
+
+def _make_values(fields: list[str],
+                 columns: dict[str, Column]) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Создает функцию, возвращающую кортеж значений полей объекта.
+    Значения столбцов с преобразованием приводятся к формату хранения
+
+    Параметры
+    ----------
+    fields - названия полей
+    columns - столбцы полей
+
+    """
+    if not fields:
+        return lambda obj: ()
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        plain: Callable[[Any], tuple[Any, ...]] = lambda obj: (getter(obj),)
+    else:
+        plain = getter
+    if not any(columns[f].converts for f in fields):
+        return plain
+    encoders = [columns[f].to_db for f in fields]
+    return lambda obj: tuple(enc(v) for enc, v in zip(encoders, plain(obj)))
+
+
+def _make_row_factory(cls: type, columns: list[str],
+                      decoders: list[Callable[[Any], Any]] | None = None
+                      ) -> Callable[[Sequence[Any]], Any]:
+    """
+    Создает функцию, преобразующую строку выборки в объект модели.
+    Если столбцы совпадают с аргументами конструктора датакласса,
+    объект создается позиционными аргументами без промежуточного словаря
+
+    Параметры
+    ----------
+    cls - класс модели
+    columns - названия столбцов в порядке выборки
+    decoders - функции преобразования значений столбцов из формата
+    хранения (None - значения не преобразуются)
+
+    """
+    if decoders is not None:
+        make = _make_row_factory(cls, columns)
+        return lambda row: make([dec(v) for dec, v in zip(decoders, row)])
+    if is_dataclass(cls):
+        init_args = [f.name for f in dataclass_fields(cls) if f.init]
+        if init_args == columns:
+            return lambda row: cls(*row)
+    return lambda row: cls(**dict(zip(columns, row)))
 
 
 class SQLiteRepository(AbstractRepository[T]):
@@ -14,53 +128,205 @@ class SQLiteRepository(AbstractRepository[T]):
 
     db_file - путь к базе данных
     table_name - название таблицы
-    fields - поля
+    fields - поля. Тип столбца определяется аннотацией поля (см. модуль
+    columns); Annotated[Decimal, Money()] и Annotated[datetime, Timestamp()]
+    хранят суммы и даты целыми числами
     cls - класс таблицы
+    indexes - индексы, объявленные в модели атрибутом __indexes__
+    (последовательность полей или кортежей полей для составных индексов),
+    в виде словаря {название индекса: поля}
+    connection - менеджер соединений. Если не задан, репозиторий создает
+    собственный: с долгоживущими соединениями, если persistent=True,
+    иначе с открытием соединения на каждый запрос
+    pragmas - PRAGMA для соединений собственного менеджера
+    Ожидание и повторы при блокировке базы данных другим процессом
+    настраиваются в менеджере соединений: ConnectionManager(db_file,
+    busy_timeout=..., retry=RetryPolicy(...))
+    Репозиторий можно использовать из нескольких потоков (см. модуль
+    sqlite_connection); чтобы читатели не ждали пишущий поток, нужен
+    режим WAL: persistent=True, pragmas=PERFORMANCE_PRAGMAS
     """
-    def __init__(self, db_file: str, cls: type) -> None:
+    def __init__(self, db_file: str, cls: type,
+                 connection: ConnectionManager | None = None,
+                 persistent: bool = False,
+                 pragmas: dict[str, Any] | None = None) -> None:
         self.db_file = db_file
         self.table_name = cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
         self.fields.pop('pk')
         self.cls = cls
+        self.indexes = self._declared_indexes()
+        self._sql = self._compile()
+        if connection is None:
+            connection = ConnectionManager(db_file, pragmas, persistent)
+        self.connection = connection
         self.create_table()
 
-    def _row_to_obj(self, row: tuple[Any] | None) -> Any:
+    def close(self) -> None:
+        """
+        Закрывает соединения с базой данных. Если менеджер соединений
+        общий, соединения закрываются у всех репозиториев, использующих его
+
+        """
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Объединяет все запросы внутри блока with в одну транзакцию.
+        Транзакция распространяется на все репозитории, использующие
+        тот же менеджер соединений. Подписчики получают изменения
+        репозитория одним списком после фиксации транзакции
+
+        """
+        with self.changes.batch(), self.connection.transaction() as con:
+            yield con
+
+    def _publish(self, kind: str, model: type, pks: Iterable[int]) -> None:
+        """
+        Сообщает подписчикам об изменении после фиксации транзакции;
+        при откате транзакции сообщение отменяется
+
+        """
+        if self.changes.listening:
+            self.connection.on_commit(super()._publish, kind, model, list(pks))
+
+    def __enter__(self) -> 'SQLiteRepository[T]':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _compile(self) -> _Compiled:
+        """
+        Подготавливает запросы и преобразователи строк для модели
+
+        """
+        table = self.table_name
+        fields = list(self.fields)
+        columns = list(get_annotations(self.cls))
+        types = {name: column_for(t) for name, t in self.fields.items()}
+        decoders: list[Callable[[Any], Any]] = [types.get(c, Column()).from_db
+                                                for c in columns]
+        converts = any(column.converts for column in types.values())
+        names = ', '.join(fields)
+        p = ', '.join('?' * len(fields))
+        select = f'SELECT {", ".join(columns)} FROM {table}'
+        select_qualified = (f'SELECT {", ".join(f"{table}.{c}" for c in columns)} '
+                            f'FROM {table}')
+        return _Compiled(
+            select=select,
+            select_qualified=select_qualified,
+            get=f'{select} WHERE pk = ?',
+            get_many=f'SELECT pk, {", ".join(columns)} FROM {table} WHERE pk IN ',
+            insert=f'INSERT INTO {table} ({names}) VALUES ({p})',
+            insert_with_pk=f'INSERT INTO {table} (pk, {names}) VALUES (?, {p})',
+            update=f'UPDATE {table} SET {", ".join(f"{x}=?" for x in fields)} '
+                   'WHERE pk = ?',
+            delete=f'DELETE FROM {table} WHERE pk = ?',
+            max_pk=f'SELECT COALESCE(MAX(pk), 0) FROM {table}',
+            tree=f'{select_qualified} JOIN tree ON {table}.pk = tree.pk '
+                 f'ORDER BY tree.depth, {table}.pk',
+            values=_make_values(fields, types),
+            row_factory=_make_row_factory(self.cls, columns,
+                                          decoders if converts else None),
+            columns=types,
+        )
+
+    def _encode(self, field: str, value: Any) -> Any:
+        """
+        Преобразует значение поля к формату хранения в базе данных
+
+        Параметры
+        ----------
+        field - название поля
+        value - значение поля
+
+        """
+        column = self._sql.columns.get(field)
+        return value if column is None else column.to_db(value)
+
+    def _row_to_obj(self, row: Sequence[Any] | None) -> Any:
         """
         Преобразовывает строку в объект
 
         Параметры
         ----------
-        row - строка
+        row - строка, столбцы которой идут в порядке полей модели
 
         """
         if row is None:
             return None
-        obj = self.cls(**dict(zip({'pk': int} | self.fields, row)))
-
-        return obj
+        return self._sql.row_factory(row)
 
     def create_table(self) -> None:
         """
         Создает таблицу в базе данных
 
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name}('
-                        + 'pk INTEGER PRIMARY KEY, '
-                        + ', '.join(self.fields.keys()) + ')')
-        con.close()
+        columns = ', '.join(f'{name} {column.sql_type}'.rstrip()
+                            for name, column in self._sql.columns.items())
+        with self.connection.transaction() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name}('
+                        f'pk INTEGER PRIMARY KEY, {columns})')
+            self._sync_indexes(con)
+
+    def _declared_indexes(self) -> dict[str, tuple[str, ...]]:
+        """
+        Читает индексы, объявленные в модели атрибутом __indexes__
+
+        """
+        indexes = {}
+        for columns in getattr(self.cls, '__indexes__', ()):
+            columns = (columns,) if isinstance(columns, str) else tuple(columns)
+            unknown = set(columns) - self.fields.keys() - {'pk'}
+            if not columns or unknown:
+                raise ValueError(f'invalid index {columns} for {self.table_name}')
+            indexes[f'{INDEX_PREFIX}{self.table_name}_{"_".join(columns)}'] = columns
+        return indexes
+
+    def _sync_indexes(self, con: sqlite3.Connection) -> None:
+        """
+        Приводит индексы таблицы в соответствие с объявленными в модели:
+        создает недостающие и удаляет созданные репозиторием ранее,
+        но больше не объявленные
+
+        Параметры
+        ----------
+        con - соединение с базой данных
+
+        """
+        rows = con.execute("SELECT name FROM sqlite_master "
+                           "WHERE type = 'index' AND tbl_name = ?",
+                           (self.table_name,)).fetchall()
+        prefix = f'{INDEX_PREFIX}{self.table_name}_'
+        for (name,) in rows:
+            if name.startswith(prefix) and name not in self.indexes:
+                con.execute(f'DROP INDEX {name}')
+        for name, columns in self.indexes.items():
+            con.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                        f'ON {self.table_name} ({", ".join(columns)})')
+
+    def list_indexes(self) -> dict[str, tuple[str, ...]]:
+        """
+        Возвращает все индексы таблицы в базе данных в виде словаря
+        {название индекса: поля}
+
+        """
+        with self.connection.connect() as con:
+            names = [row[1] for row in
+                     con.execute(f'PRAGMA index_list({self.table_name})')]
+            return {name: tuple(row[2] for row in
+                                con.execute(f'PRAGMA index_info({name})'))
+                    for name in names}
 
     def drop_table(self) -> None:
         """
         Уничтожает таблицу в базе данных
 
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute(f'DROP TABLE IF EXISTS {self.table_name}')
-        con.close()
+        with self.connection.transaction() as con:
+            con.execute(f'DROP TABLE IF EXISTS {self.table_name}')
 
     def add(self, obj: T) -> int:
         """
@@ -74,16 +340,11 @@ class SQLiteRepository(AbstractRepository[T]):
         """
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled ''pk'' attribute')
-        names = ', '.join(self.fields.keys())
-        p = ', '.join("?" * len(self.fields))
-        values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'INSERT INTO {self.table_name} ({names}) VALUES ({p})', values)
+        with self.connection.transaction() as con:
+            cur = con.execute(self._sql.insert, self._sql.values(obj))
             assert cur.lastrowid is not None
             obj.pk = cur.lastrowid
-        con.close()
+            self._publish(ADDED, self.cls, [obj.pk])
 
         return obj.pk
 
@@ -97,43 +358,351 @@ class SQLiteRepository(AbstractRepository[T]):
 
 
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            row = cur.execute(f'SELECT * FROM {self.table_name} WHERE pk={pk}').fetchone()
-        con.close()
+        with self.connection.connect() as con:
+            row = con.execute(self._sql.get, (pk,)).fetchone()
         obj = self._row_to_obj(row)
 
         return obj
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        """
+        Получает несколько объектов по первичным ключам запросами
+        WHERE pk IN (...) порциями по GET_MANY_CHUNK ключей
+
+        Параметры
+        ----------
+        pks - первичные ключи объектов
+
+        """
+        pks = list(dict.fromkeys(pks))
+        found = {}
+        row_factory = self._sql.row_factory
+        with self.connection.connect() as con:
+            for start in range(0, len(pks), GET_MANY_CHUNK):
+                chunk = pks[start:start + GET_MANY_CHUNK]
+                sql = f'{self._sql.get_many}({", ".join("?" * len(chunk))})'
+                for pk, *row in con.execute(sql, chunk):
+                    found[pk] = row_factory(row)
+        return {pk: found[pk] for pk in pks if pk in found}
+
+    def _parent_field(self, parent_field: str) -> str:
+        """
+        Проверяет поле ссылки на родителя
+
+        Параметры
+        ----------
+        parent_field - поле, хранящее pk родителя
+
+        """
+        if parent_field not in self.fields:
+            raise ValueError(f'unknown field {parent_field!r}')
+        return parent_field
+
+    def get_subtree(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получает всех потомков объекта одним рекурсивным запросом
+        WITH RECURSIVE: детей, их детей и т.д. по уровням, внутри
+        уровня - по pk. Сам объект в результат не входит
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+        parent_field - поле, хранящее pk родителя
+
+        """
+        parent = self._parent_field(parent_field)
+        table = self.table_name
+        sql = (f'WITH RECURSIVE tree(pk, depth) AS ('
+               f'SELECT pk, 1 FROM {table} WHERE {parent} = ?1 AND pk != ?1 '
+               f'UNION ALL SELECT {table}.pk, tree.depth + 1 FROM {table} '
+               f'JOIN tree ON {table}.{parent} = tree.pk WHERE {table}.pk != ?1) '
+               + self._sql.tree)
+        with self.connection.connect() as con:
+            rows = con.execute(sql, (pk,)).fetchall()
+        return list(map(self._sql.row_factory, rows))
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получает предков объекта одним рекурсивным запросом
+        WITH RECURSIVE: родителя, его родителя и т.д. до объекта верхнего
+        уровня. Сам объект в результат не входит. Если ссылки на родителя
+        образуют цикл, обход останавливается, пройдя все записи таблицы
+
+        Параметры
+        ----------
+        pk - первичный ключ объекта
+        parent_field - поле, хранящее pk родителя
+
+        """
+        parent = self._parent_field(parent_field)
+        table = self.table_name
+        sql = (f'WITH RECURSIVE tree(pk, depth) AS ('
+               f'SELECT {parent}, 1 FROM {table} WHERE pk = ? '
+               f'UNION ALL SELECT {table}.{parent}, tree.depth + 1 FROM {table} '
+               f'JOIN tree ON {table}.pk = tree.pk '
+               f'WHERE tree.depth < (SELECT count(*) FROM {table})) '
+               + self._sql.tree)
+        with self.connection.connect() as con:
+            rows = con.execute(sql, (pk,)).fetchall()
+        ancestors: dict[int, T] = {}
+        for obj in map(self._sql.row_factory, rows):
+            ancestors.setdefault(obj.pk, obj)
+        ancestors.pop(pk, None)
+        return list(ancestors.values())
+
+    def iter_tree(self, parent_field: str = 'parent',
+                  batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебирает объекты иерархии в порядке обхода в глубину одним
+        рекурсивным запросом: ключ сортировки объекта - первичные ключи
+        его предков и его собственный, дополненные нулями до одной длины.
+        Строки читаются порциями по batch_size
+
+        Параметры
+        ----------
+        parent_field - поле, хранящее pk родителя
+        batch_size - количество строк, читаемых за один раз
+
+        """
+        if batch_size <= 0:
+            raise ValueError('batch_size must be positive')
+        parent = self._parent_field(parent_field)
+        table = self.table_name
+        sql = (f'WITH RECURSIVE tree(pk, key) AS ('
+               f"SELECT pk, printf('%020d', pk) FROM {table} WHERE {parent} IS NULL "
+               f"UNION ALL SELECT {table}.pk, tree.key || printf('%020d', {table}.pk) "
+               f'FROM {table} JOIN tree ON {table}.{parent} = tree.pk) '
+               f'{self._sql.select_qualified} JOIN tree ON {table}.pk = tree.pk '
+               f'ORDER BY tree.key')
+        row_factory = self._sql.row_factory
+        with self.connection.connect() as con:
+            cur = con.execute(sql)
+            try:
+                while rows := cur.fetchmany(batch_size):
+                    yield from map(row_factory, rows)
+            finally:
+                cur.close()
+
+    def _order_field(self, order_by: str | None) -> tuple[str, bool]:
+        """
+        Разбирает и проверяет параметр сортировки
+
+        Параметры
+        ----------
+        order_by - поле для сортировки, '-поле' - по убыванию
+
+        """
+        field, desc = parse_order_by(order_by)
+        if field != 'pk' and field not in self.fields:
+            raise ValueError(f'unknown field {field!r} in order_by')
+        return field, desc
+
+    @staticmethod
+    def _keyset(field: str, desc: bool, value: Any,
+                pk: int) -> tuple[str, list[Any]]:
+        """
+        Формирует условие выборки записей, следующих за записью
+        (value, pk) в порядке сортировки по полю field. В sqlite NULL
+        меньше любого значения, поэтому при сортировке по возрастанию
+        NULL идут первыми, а по убыванию - последними
+
+        Параметры
+        ----------
+        field - поле сортировки
+        desc - сортировка по убыванию
+        value - значение поля у последней записи предыдущей страницы
+        pk - первичный ключ последней записи предыдущей страницы
+
+        """
+        op = '<' if desc else '>'
+        if field == 'pk':
+            return f'pk {op} ?', [pk]
+        if value is None:
+            if desc:
+                return f'({field} IS NULL AND pk < ?)', [pk]
+            return f'({field} IS NOT NULL OR pk > ?)', [pk]
+        sql = f'({field} {op} ? OR ({field} = ? AND pk {op} ?)'
+        if desc:
+            sql += f' OR {field} IS NULL'
+        return sql + ')', [value, value, pk]
+
+    def _where(self, where: Where) -> tuple[str, list[Any]]:
+        """
+        Преобразует условие в SQL-выражение, проверяя названия полей
+
+        Параметры
+        ----------
+        where - условие в виде словаря {'название_поля': значение}
+        или объекта Condition
+
+        """
+        condition = as_condition(where)
+        unknown = condition.fields() - self.fields.keys() - {'pk'}
+        if unknown:
+            raise ValueError(f'unknown fields {sorted(unknown)} in condition')
+        return condition.to_sql(self._encode)
+
+    def _select(self, where: Where | None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> tuple[str, list[Any]]:
+        """
+        Формирует запрос выборки по условию и его параметры
+
+        Параметры
+        ----------
+        where - условие в виде словаря {'название_поля': значение}
+        или объекта Condition
+        order_by - поле для сортировки, '-поле' - по убыванию
+        limit - максимальное количество записей
+        after - последняя запись предыдущей страницы
+
+        """
+        sql = self._sql.select
+        params: list[Any] = []
+        conditions = []
+        if where is not None:
+            condition, params = self._where(where)
+            conditions.append(condition)
+        ordered = order_by is not None or after is not None
+        field, desc = self._order_field(order_by)
+        if after is not None:
+            condition, keyset_params = self._keyset(
+                field, desc, self._encode(field, getattr(after, field)), after.pk)
+            conditions.append(condition)
+            params.extend(keyset_params)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(f'({c})' for c in conditions)
+        if ordered:
+            direction = ' DESC' if desc else ''
+            if field == 'pk':
+                sql += f' ORDER BY pk{direction}'
+            else:
+                sql += f' ORDER BY {field}{direction}, pk{direction}'
+        if limit is not None:
+            if limit < 0:
+                raise ValueError('limit must not be negative')
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return sql, params
+
+    def get_all(self, where: Where | None = None,
+                order_by: str | None = None, limit: int | None = None,
+                after: T | None = None) -> list[T]:
         """
         Получает все объекты таблицы базы данных. Есть возможность
         получить по условию. Для этого необходимо передать
-        словарь, где ключ - название поля, значение - значение поля
+        словарь, где ключ - название поля, значение - значение поля,
+        или объект Condition. Фильтрация, сортировка и постраничная
+        выборка выполняются в sqlite
 
         Параметры
         ----------
         where - условие
+        order_by - поле для сортировки, '-поле' - по убыванию
+        limit - максимальное количество объектов
+        after - последний объект предыдущей страницы
 
 
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            sql = f'SELECT * FROM {self.table_name}'
-            params = []
-            if where is not None:
-                for key, value in where.items():
-                    params.append(value)
-                fields = ' AND '.join([f'{key}=?' for key, value in where.items()])
-                sql += " WHERE " + fields
-            if where is not None:
-                rows = cur.execute(sql, params).fetchall()
-            else:
-                rows = cur.execute(sql).fetchall()
-        con.close()
-        objs = [self._row_to_obj(rows[pk]) for pk in range(len(rows))]
+        sql, params = self._select(where, order_by, limit, after)
+        with self.connection.connect() as con:
+            rows = con.execute(sql, params).fetchall()
+        return list(map(self._sql.row_factory, rows))
+
+    def iter_all(self, where: Where | None = None,
+                 batch_size: int = 1000,
+                 order_by: str | None = None, limit: int | None = None,
+                 after: T | None = None) -> Iterator[T]:
+        """
+        Перебирает объекты таблицы, читая их из базы данных порциями,
+        так что в памяти одновременно находится не более batch_size строк
+
+        Параметры
+        ----------
+        where - условие, как в get_all
+        batch_size - количество строк, читаемых за один раз
+        order_by, limit, after - сортировка и пагинация, как в get_all
+
+        """
+        if batch_size <= 0:
+            raise ValueError('batch_size must be positive')
+        sql, params = self._select(where, order_by, limit, after)
+        row_factory = self._sql.row_factory
+        with self.connection.connect() as con:
+            cur = con.execute(sql, params)
+            try:
+                while rows := cur.fetchmany(batch_size):
+                    yield from map(row_factory, rows)
+            finally:
+                cur.close()
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: Where | None = None, group_by: str | None = None,
+                  period: str | None = None) -> Any:
+        """
+        Вычисляет агрегирующую функцию в sqlite одним запросом
+        SELECT func(field) ... GROUP BY, не загружая записи в память
+
+        Параметры
+        ----------
+        func - функция: 'sum', 'count', 'avg', 'min' или 'max'
+        field - поле, по которому вычисляется функция
+        where - условие, как в get_all
+        group_by - поле группировки
+        period - период группировки даты: 'day', 'week', 'month', 'year'
 
-        return objs
+        """
+        check_aggregate(func, period, group_by)
+        unknown = {field, group_by or 'pk'} - self.fields.keys() - {'pk'}
+        if unknown:
+            raise ValueError(f'unknown fields {sorted(unknown)} in aggregate')
+        params: list[Any] = []
+        columns = f'{func.upper()}({field})'
+        decode = self._decoder(func, field)
+        if group_by is not None:
+            columns = f'{self._group_key(group_by, period)}, {columns}'
+        sql = f'SELECT {columns} FROM {self.table_name}'
+        if where is not None:
+            condition, params = self._where(where)
+            sql += f' WHERE {condition}'
+        with self.connection.connect() as con:
+            if group_by is None:
+                return decode(con.execute(sql, params).fetchone()[0])
+            sql += ' GROUP BY 1'
+            rows = con.execute(sql, params).fetchall()
+        decode_key = self._decoder('min', group_by if period is None else 'pk')
+        return {decode_key(k): decode(v) for k, v in rows}
+
+    def _group_key(self, group_by: str, period: str | None) -> str:
+        """
+        Возвращает SQL-выражение ключа группировки
+
+        Параметры
+        ----------
+        group_by - поле группировки
+        period - период группировки даты
+
+        """
+        if period is None or group_by == 'pk':
+            return group_by
+        column = self._sql.columns[group_by]
+        return _PERIOD_SQL[period].format(column.sql_datetime(group_by))
+
+    def _decoder(self, func: str, field: str) -> Callable[[Any], Any]:
+        """
+        Возвращает функцию преобразования результата агрегирующей
+        функции из формата хранения. Количество не преобразуется
+
+        Параметры
+        ----------
+        func - агрегирующая функция
+        field - поле, по которому вычисляется функция
+
+        """
+        column = self._sql.columns.get(field)
+        if func == 'count' or column is None or not column.converts:
+            return lambda value: value
+        return column.from_db
 
     def update(self, obj: T) -> None:
         """
@@ -148,13 +717,10 @@ class SQLiteRepository(AbstractRepository[T]):
             raise ValueError('attempt to update object with unknown primary key')
         if obj.pk < 0:
             raise ValueError('attempt to update unexistent object')
-        fields = ', '.join([f'{x}=?' for x in self.fields.keys()])
-        values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute(f'UPDATE {self.table_name} SET {fields} '
-                        + f'WHERE pk={obj.pk}', values)
-        con.close()
+        with self.connection.transaction() as con:
+            cur = con.execute(self._sql.update, (*self._sql.values(obj), obj.pk))
+            if cur.rowcount:
+                self._publish(UPDATED, self.cls, [obj.pk])
 
     def delete(self, pk: int) -> None:
         """
@@ -170,20 +736,164 @@ class SQLiteRepository(AbstractRepository[T]):
             raise ValueError('attempt to delete object with unknown primary key')
         if pk < 0:
             raise ValueError('attempt to delete unexistent object')
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute(f'DELETE FROM {self.table_name} WHERE pk={pk}')
-        con.close()
+        with self.connection.transaction() as con:
+            cur = con.execute(self._sql.delete, (pk,))
+            if cur.rowcount:
+                self._publish(DELETED, self.cls, [pk])
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавляет несколько объектов в базу данных одним запросом
+        внутри одной транзакции и записывает первичные ключи в объекты
+
+        Параметры
+        ----------
+        objs - объекты для добавления
+
+        """
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled '
+                                 'pk attribute')
+        if not objs:
+            return []
+        values = self._sql.values
+        with self.connection.transaction() as con:
+            start = con.execute(self._sql.max_pk).fetchone()[0] + 1
+            pks = list(range(start, start + len(objs)))
+            con.executemany(self._sql.insert_with_pk,
+                            ((pk, *values(obj)) for pk, obj in zip(pks, objs)))
+            self._publish(ADDED, self.cls, pks)
+        for pk, obj in zip(pks, objs):
+            obj.pk = pk
+
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Обновляет несколько объектов одним запросом внутри одной транзакции
+
+        Параметры
+        ----------
+        objs - объекты для обновления
+
+        """
+        objs = list(objs)
+        for obj in objs:
+            if obj.pk == 0:
+                raise ValueError('attempt to update object with unknown primary key')
+            if obj.pk < 0:
+                raise ValueError('attempt to update unexistent object')
+        values = self._sql.values
+        with self.connection.transaction() as con:
+            existing = self._existing(con, [obj.pk for obj in objs])
+            con.executemany(self._sql.update,
+                            ((*values(obj), obj.pk) for obj in objs))
+            self._publish(UPDATED, self.cls, existing)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Удаляет несколько объектов одним запросом внутри одной транзакции
+
+        Параметры
+        ----------
+        pks - первичные ключи объектов для удаления
+
+        """
+        pks = list(pks)
+        for pk in pks:
+            if pk == 0:
+                raise ValueError('attempt to delete object with unknown primary key')
+            if pk < 0:
+                raise ValueError('attempt to delete unexistent object')
+        with self.connection.transaction() as con:
+            existing = self._existing(con, pks)
+            con.executemany(self._sql.delete, ((pk,) for pk in pks))
+            self._publish(DELETED, self.cls, existing)
+
+    def _existing(self, con: sqlite3.Connection, pks: list[int]) -> list[int]:
+        """
+        Возвращает первичные ключи из pks (без повторов, в порядке pks),
+        которые есть в таблице. Если подписчиков на изменения нет,
+        ключи не нужны и запрос не выполняется
+
+        Параметры
+        ----------
+        con - соединение с базой данных
+        pks - первичные ключи
+
+        """
+        if not self.changes.listening:
+            return []
+        pks = list(dict.fromkeys(pks))
+        found: set[int] = set()
+        for start in range(0, len(pks), GET_MANY_CHUNK):
+            chunk = pks[start:start + GET_MANY_CHUNK]
+            found.update(row[0] for row in con.execute(
+                f'SELECT pk FROM {self.table_name} '
+                f'WHERE pk IN ({", ".join("?" * len(chunk))})', chunk))
+        return [pk for pk in pks if pk in found]
 
     @classmethod
-    def repo_factory(cls: type, models: list[type], db_file: str) -> dict[type, type]:
+    def repo_factory(cls: type, models: list[type], db_file: str,
+                     pragmas: dict[str, Any] | None = None) -> 'UnitOfWork':
         """
-        Возвращает репозитории нескольких моделей
+        Возвращает репозитории нескольких моделей, использующие одно
+        общее долгоживущее соединение с базой данных
 
         Параметры
         ----------
         models - модели для создания таблиц
         db_file - путь к базе данных
+        pragmas - PRAGMA для общего соединения
+
+        """
+        connection = ConnectionManager(db_file, pragmas)
+        return UnitOfWork(connection,
+                          {m: cls(db_file, m, connection) for m in models})
+
+
+class UnitOfWork(dict[type, Any]):
+    """
+    Словарь репозиториев {модель: репозиторий} с общим менеджером
+    соединений. Позволяет выполнить операции над несколькими
+    репозиториями в одной транзакции:
 
+    with repos.transaction():
+        repos[Category].delete_many(cat_pks)
+        repos[Expense].delete_many(exp_pks)
+
+    connection - общий менеджер соединений
+    """
+    def __init__(self, connection: ConnectionManager,
+                 repos: dict[type, Any]) -> None:
+        super().__init__(repos)
+        self.connection = connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
         """
-        return {m: cls(db_file, m) for m in models}
+        Выполняет все запросы репозиториев внутри блока with в одной
+        транзакции с одной фиксацией; при исключении изменения откатываются.
+        Подписчики каждого репозитория получают его изменения одним
+        списком после фиксации
+
+        """
+        with ExitStack() as stack:
+            for repo in self.values():
+                stack.enter_context(repo.changes.batch())
+            yield stack.enter_context(self.connection.transaction())
+
+    def close(self) -> None:
+        """
+        Закрывает общее соединение с базой данных
+
+        """
+        self.connection.close()
+
+    def __enter__(self) -> 'UnitOfWork':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
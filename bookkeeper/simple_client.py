@@ -2,8 +2,12 @@
 Простой тестовый скрипт для терминала
 """
 import os
+from decimal import Decimal
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.models.migrations import MIGRATIONS
+from bookkeeper.repository.migrations import Migrator
+from bookkeeper.repository.sqlite_connection import ConnectionManager
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
 from bookkeeper.utils import read_tree
 
@@ -13,8 +17,10 @@ from bookkeeper.utils import read_tree
 
 DB_FILE = os.path.join(os.getcwd(), 'databases', 'simple.db')
 
-cat_repo: SQLiteRepository[Category] = SQLiteRepository(DB_FILE, Category)
-exp_repo: SQLiteRepository[Expense] = SQLiteRepository(DB_FILE, Expense)
+connection = ConnectionManager(DB_FILE)
+Migrator(connection, MIGRATIONS).migrate()
+cat_repo: SQLiteRepository[Category] = SQLiteRepository(DB_FILE, Category, connection)
+exp_repo: SQLiteRepository[Expense] = SQLiteRepository(DB_FILE, Expense, connection)
 
 cats = '''
 продукты
@@ -47,6 +53,6 @@ while True:
         except IndexError:
             print(f'категория {name} не найдена')
             continue
-        exp = Expense(int(amount), cat.pk)
+        exp = Expense(Decimal(amount), cat.pk)
         exp_repo.add(exp)
         print(exp)
@@ -2,7 +2,11 @@
 Вспомогательные функции
 """
 
-from typing import Iterable, Iterator
+import csv
+import json
+from typing import Iterable, Iterator, TextIO
+
+TREE_FORMATS = ('text', 'json', 'csv')
 
 
 def _get_indent(line: str) -> int:
@@ -16,11 +20,13 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
-def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
+def read_tree(lines: Iterable[str]) -> Iterator[tuple[str, str | None]]:
     """
-    Прочитать структуру дерева из текста на основе отступов. Вернуть список
-    пар "потомок-родитель" в порядке топологической сортировки. Родитель
-    элемента верхнего уровня - None.
+    Прочитать структуру дерева из текста на основе отступов. Вернуть
+    пары "потомок-родитель" в порядке топологической сортировки (обхода
+    в глубину). Родитель элемента верхнего уровня - None.
+    Пары возвращаются по мере чтения строк, в памяти хранятся только
+    предки текущего элемента, так что файл может быть сколь угодно большим.
 
     Пример. Следующий текст:
     parent
@@ -38,14 +44,13 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     ----------
     lines - Итерируемый объект, содержащий строки текста (файл или список строк)
 
-    Returns
+    Yields
     -------
-    Список пар "потомок-родитель"
+    Пары "потомок-родитель"
     """
     parents: list[tuple[str | None, int]] = []
     last_indent = -1
     last_name = None
-    result: list[tuple[str, str | None]] = []
     for i, (indent, name) in enumerate(_lines_with_indent(lines)):
         if indent > last_indent:
             parents.append((last_name, last_indent))
@@ -57,7 +62,71 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
                     f'unindent does not match any outer indentation '
                     f'level in line {i}:\n'
                 )
-        result.append((name, parents[-1][0]))
+        yield name, parents[-1][0]
         last_name = name
         last_indent = indent
-    return result
+
+
+def _pop_to_parent(path: list[str], parent: str | None) -> None:
+    """
+    Оставить в path (предках предыдущего элемента и нем самом) только
+    элементы до parent включительно
+    """
+    if parent is None:
+        path.clear()
+        return
+    while path and path[-1] != parent:
+        path.pop()
+    if not path:
+        raise ValueError(f'parent {parent!r} is not an ancestor of the previous '
+                         'element: pairs must be in depth-first order')
+
+
+def write_tree(pairs: Iterable[tuple[str, str | None]], out: TextIO,
+               fmt: str = 'text', indent: int = 4) -> None:
+    """
+    Записать дерево из пар "потомок-родитель" (обратное к read_tree).
+    Пары записываются по мере получения, в памяти хранятся только
+    предки текущего элемента.
+
+    Форматы:
+    'text' - текст с отступами, который читает read_tree
+    'json' - вложенный список [{"name": ..., "children": [...]}, ...]
+    'csv' - строки name,parent с заголовком (у элементов верхнего
+    уровня parent пустой)
+
+    Для форматов 'text' и 'json' пары должны идти в порядке обхода
+    в глубину (как их возвращают read_tree и Category.export_tree),
+    для 'csv' достаточно топологической сортировки.
+
+    Parameters
+    ----------
+    pairs - пары "потомок-родитель"
+    out - текстовый файл для записи
+    fmt - формат: 'text', 'json' или 'csv'
+    indent - ширина отступа одного уровня в формате 'text'
+    """
+    if fmt not in TREE_FORMATS:
+        raise ValueError(f'unknown tree format {fmt!r}')
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(('name', 'parent'))
+        writer.writerows((name, '' if parent is None else parent)
+                         for name, parent in pairs)
+        return
+    path: list[str] = []
+    if fmt == 'text':
+        for name, parent in pairs:
+            _pop_to_parent(path, parent)
+            out.write(f'{" " * indent * len(path)}{name}\n')
+            path.append(name)
+        return
+    out.write('[')
+    for name, parent in pairs:
+        depth = len(path)
+        _pop_to_parent(path, parent)
+        if depth > len(path):
+            out.write(']}' * (depth - len(path)) + ', ')
+        out.write(f'{{"name": {json.dumps(name, ensure_ascii=False)}, "children": [')
+        path.append(name)
+    out.write(']}' * len(path) + ']\n')
@@ -2,10 +2,13 @@
 Модуль, описывающий вкладку бюджета
 """
 from datetime import datetime
+from decimal import Decimal
 from typing import Callable, Tuple
 from PySide6 import QtWidgets, QtGui, QtCore
 from bookkeeper.models.budget import Budget
-from bookkeeper.models.expense import ExpenseWithStringDate
+from bookkeeper.models.expense import Expense
+
+AmountsGetter = Callable[[datetime], Tuple[float, float, float]]
 
 
 class BudgetTab(QtWidgets.QWidget):
@@ -33,13 +36,16 @@ class BudgetTable(QtWidgets.QWidget):
     now - текущее время
     update_menu - меню обновления
     budget_updater - обертка функция обновления бюджета
+    amounts_getter - функция, возвращающая суммы расходов за день, неделю
+    и месяц; если не задана, суммы считаются по списку расходов expenses
     """
     def __init__(self) -> None:
         super().__init__()
-        self.expenses = []          # type: list[ExpenseWithStringDate]
+        self.expenses = []          # type: list[Expense]
         self.now = None             # type: datetime | None
         self.update_menu = None     # type: UpdateMenu | None
         self.budget_updater: Callable[[str, str, str, list[str]], None] | None = None
+        self.amounts_getter: AmountsGetter | None = None
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
 
@@ -71,7 +77,7 @@ class BudgetTable(QtWidgets.QWidget):
 
         self.addAction(self.update_budget)
 
-    def set_expenses(self, expenses: list[ExpenseWithStringDate]) -> None:
+    def set_expenses(self, expenses: list[Expense]) -> None:
         """
         Записывает расходы из базы данных в массив
 
@@ -93,43 +99,61 @@ class BudgetTable(QtWidgets.QWidget):
         """
         self.now = datetime.now()
         assert self.now is not None
-        day_amount = 0.0
-        week_amount = 0.0
-        month_amount = 0.0
-        for expense in self.expenses:
-            expense_datetime = datetime.fromisoformat(expense.expense_date)
-            if expense_datetime.year == self.now.year:
-                if expense_datetime.month == self.now.month:
-                    month_amount += float(expense.amount)
-                    if expense_datetime.isocalendar().week == self.now.isocalendar().week:
-                        week_amount += float(expense.amount)
-                        if expense_datetime.day == self.now.day:
-                            day_amount += float(expense.amount)
+        if self.amounts_getter is not None:
+            day_amount, week_amount, month_amount = self.amounts_getter(self.now)
+        else:
+            day_amount, week_amount, month_amount = self._count_amounts(self.now)
 
         self.budget_table.setItem(0, 0, QtWidgets.QTableWidgetItem(
-            str(round(day_amount, 2))))
+            f'{day_amount:.2f}'))
         self.budget_table.setItem(1, 0, QtWidgets.QTableWidgetItem(
-            str(round(week_amount, 2))))
+            f'{week_amount:.2f}'))
         self.budget_table.setItem(2, 0, QtWidgets.QTableWidgetItem(
-            str(round(month_amount, 2))))
+            f'{month_amount:.2f}'))
 
         for i in range(len(budget_data)):
             self.budget_table.setItem(i, 1,
                                       QtWidgets.QTableWidgetItem(
                                           str(budget_data[i].budget)))
 
+    def _count_amounts(self, now: datetime) -> Tuple[float, float, float]:
+        """
+        Считает суммы расходов за день, неделю и месяц по списку расходов
+
+        Параметры
+        ----------
+        now - текущее время
+
+        """
+        day_amount = 0.0
+        week_amount = 0.0
+        month_amount = 0.0
+        for expense in self.expenses:
+            expense_datetime = expense.expense_date
+            if expense_datetime.year == now.year:
+                if expense_datetime.month == now.month:
+                    month_amount += float(expense.amount)
+                    if expense_datetime.isocalendar().week == now.isocalendar().week:
+                        week_amount += float(expense.amount)
+                        if expense_datetime.day == now.day:
+                            day_amount += float(expense.amount)
+        return day_amount, week_amount, month_amount
+
     def get_data_from_table(self) -> Tuple[Budget, Budget, Budget]:
         """
         Получает данные из таблицы для записи в базу данных
 
 
         """
-        day_budget_data = Budget(pk=1, budget=self.budget_table.item(0, 1).text(),
-                                 amount=self.budget_table.item(0, 0).text())
-        week_budget_data = Budget(pk=1, budget=self.budget_table.item(1, 1).text(),
-                                  amount=self.budget_table.item(1, 0).text())
-        month_budget_data = Budget(pk=1, budget=self.budget_table.item(2, 1).text(),
-                                   amount=self.budget_table.item(2, 0).text())
+        day_budget_data = Budget(pk=1,
+                                 budget=Decimal(self.budget_table.item(0, 1).text()),
+                                 amount=Decimal(self.budget_table.item(0, 0).text()))
+        week_budget_data = Budget(pk=1,
+                                  budget=Decimal(self.budget_table.item(1, 1).text()),
+                                  amount=Decimal(self.budget_table.item(1, 0).text()))
+        month_budget_data = Budget(pk=1,
+                                   budget=Decimal(self.budget_table.item(2, 1).text()),
+                                   amount=Decimal(self.budget_table.item(2, 0).text()))
 
         return day_budget_data, week_budget_data, month_budget_data
 
@@ -166,6 +190,17 @@ class BudgetTable(QtWidgets.QWidget):
         assert self.budget_updater is not None
         self.budget_updater(day_budget, week_budget, month_budget, amounts)
 
+    def register_amounts_getter(self, handler: AmountsGetter) -> None:
+        """
+        Инициализирует функцию подсчета сумм расходов за день, неделю и месяц
+
+        Параметры
+        ----------
+        handler - функция, принимающая текущее время и возвращающая суммы
+
+        """
+        self.amounts_getter = handler
+
     def register_budget_updater(self,
                                 handler: Callable[[str, str, str, list[str]], None]) \
             -> None:
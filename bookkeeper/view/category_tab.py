@@ -93,16 +93,12 @@ class CategoryTable(QtWidgets.QWidget):
         """
         self.cat_table.setRowCount(len(categories))
         self.categories = categories
-        for i in range(len(categories)):
-            self.cat_table.setItem(i, 0, QtWidgets.QTableWidgetItem(categories[i].name))
-            if categories[i].parent is None:
-                self.cat_table.setItem(i, 1, QtWidgets.QTableWidgetItem(''))
-            else:
-                for j in range(len(categories)):
-                    if str(categories[i].parent) == str(categories[j].pk):
-                        self.cat_table.setItem(i, 1,
-                                               QtWidgets.QTableWidgetItem(
-                                                   categories[j].name))
+        names = {cat.pk: cat.name for cat in categories}
+        for i, cat in enumerate(categories):
+            self.cat_table.setItem(i, 0, QtWidgets.QTableWidgetItem(cat.name))
+            parent_name = '' if cat.parent is None else names.get(cat.parent)
+            if parent_name is not None:
+                self.cat_table.setItem(i, 1, QtWidgets.QTableWidgetItem(parent_name))
 
     def _add_row(self) -> None:
         """
@@ -2,12 +2,13 @@
 Модуль, описывающий вкладку расходов
 """
 
-import operator
 from datetime import datetime
 from typing import Callable
 from PySide6 import QtWidgets, QtGui, QtCore
 from bookkeeper.models.category import Category
-from bookkeeper.models.expense import ExpenseWithStringDate
+from bookkeeper.models.expense import Expense
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 class ExpenseTab(QtWidgets.QWidget):
@@ -44,12 +45,12 @@ class ExpenseTable(QtWidgets.QWidget):
     def __init__(self) -> None:
         super().__init__()
         self.categories = []            # type: list[Category]
-        self.expenses = None            # type: list[ExpenseWithStringDate] | None
+        self.expenses = None            # type: list[Expense] | None
         self.update_menu = None         # type: UpdateMenu | None
         self.add_menu = None            # type: AddMenu | None
         self.delete_warning = None      # type: DeleteWarning | None
         self.expense_adder: Callable[[str, str, str, str], None] | None = None
-        self.expense_deleter: Callable[[ExpenseWithStringDate], None] | None = None
+        self.expense_deleter: Callable[[Expense], None] | None = None
         self.expense_updater: Callable[[int, str, str, str, str], None] | None = None
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
@@ -102,25 +103,25 @@ class ExpenseTable(QtWidgets.QWidget):
         """
         self.categories = categories
 
-    def set_data(self, expenses: list[ExpenseWithStringDate]) -> None:
+    def set_data(self, expenses: list[Expense]) -> None:
         """
         Получает данные по расходам и записывает их в таблицу
 
         Параметры
         ----------
-        expenses - расходы их базы данных
+        expenses - расходы из базы данных в порядке убывания даты
+        (таблица их не сортирует)
 
         """
-        self.expenses = sorted(expenses, key=operator.attrgetter('expense_date'),
-                               reverse=True)
+        self.expenses = expenses
         self.expenses_table.setRowCount(len(self.expenses))
         for i in range(len(self.expenses)):
-            date = self.expenses[i].expense_date
+            date = self.expenses[i].expense_date.strftime(DATE_FORMAT)
             self.expenses_table.setItem(i, 0,
                                         QtWidgets.QTableWidgetItem(date))
             self.expenses_table.setItem(i, 1,
                                         QtWidgets.QTableWidgetItem(
-                                            self.expenses[i].amount))
+                                            str(self.expenses[i].amount)))
             self.expenses_table.setItem(i, 2,
                                         QtWidgets.QTableWidgetItem(
                                             self.expenses[i].category))
@@ -144,7 +145,8 @@ class ExpenseTable(QtWidgets.QWidget):
                                                          self.expenses_table.
                                                          currentRow()].comment)
         date = QtCore.QDateTime.fromString(self.expenses[
-                                           self.expenses_table.currentRow()].expense_date,
+                                           self.expenses_table.currentRow()].expense_date
+                                           .strftime(DATE_FORMAT),
                                            'yyyy-MM-dd HH:mm:ss')
         self.update_menu.date_widget.date_box.setDateTime(date)
         placeholder_cat = self.expenses[self.expenses_table.currentRow()].category
@@ -223,7 +225,7 @@ class ExpenseTable(QtWidgets.QWidget):
         assert self.expense_adder is not None
 
     def register_expense_deleter(self,
-                                 handler: Callable[[ExpenseWithStringDate], None]) \
+                                 handler: Callable[[Expense], None]) \
             -> None:
         """
         Инициализирует обертку функции удаления расхода
@@ -3,7 +3,8 @@
 """
 
 import os
-from PySide6 import QtWidgets, QtGui
+from typing import Callable
+from PySide6 import QtWidgets, QtGui, QtCore
 from bookkeeper.view.expense_tab import ExpenseTab
 from bookkeeper.view.category_tab import CategoryTab
 from bookkeeper.view.budget_tab import BudgetTab
@@ -17,6 +18,7 @@ class View(QtWidgets.QWidget):  # pylint: disable=too-few-public-methods
     expense_tab - вкладка с расходами
     category_tab - вкладка с категориями
     budget_tab - вкладка бюджета
+    change_timer - таймер проверки изменений базы данных другими процессами
     """
     def __init__(self) -> None:
         super().__init__()
@@ -38,3 +40,19 @@ class View(QtWidgets.QWidget):  # pylint: disable=too-few-public-methods
         self.tabs.addTab(self.budget_tab, 'Бюджет')
 
         layout.addWidget(self.tabs)
+        self.change_timer = QtCore.QTimer(self)
+
+    def register_change_poller(self, handler: Callable[[], None],
+                               interval: int = 1000) -> None:
+        """
+        Инициализирует функцию проверки изменений базы данных, вызываемую
+        по таймеру
+
+        Параметры
+        ----------
+        handler - функция проверки изменений
+        interval - период вызова в миллисекундах
+
+        """
+        self.change_timer.timeout.connect(handler)
+        self.change_timer.start(interval)
@@ -1,7 +1,9 @@
 from pytestqt.qt_compat import qt_api
 import pytest
 from datetime import datetime, timedelta
+from decimal import Decimal
 
+from bookkeeper import client as client_module
 from bookkeeper.client import Bookkeeper
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
@@ -100,12 +102,12 @@ def test_add_exp(qtbot, main_client):
     qtbot.mouseClick(exp_table.add_menu.submit_button, qt_api.QtCore.Qt.MouseButton.LeftButton)
 
     expenses = main_client.exp_repo.get_all()
-    assert expenses[0].expense_date == date
-    assert expenses[0].amount == summ
+    assert expenses[0].expense_date == datetime.fromisoformat(date)
+    assert expenses[0].amount == Decimal(summ)
     assert expenses[0].comment == comment
     assert expenses[0].category == cats[0].name
     assert exp_table.expenses_table.item(0, 0).text() == date
-    assert exp_table.expenses_table.item(0, 1).text() == summ
+    assert exp_table.expenses_table.item(0, 1).text() == '12345.00'
     assert exp_table.expenses_table.item(0, 2).text() == cats[0].name
     assert exp_table.expenses_table.item(0, 3).text() == comment
 
@@ -150,17 +152,17 @@ def test_delete_cat(qtbot, main_client):
     assert cat_table.cat_table.item(0, 0).text() == cats[0].name
     assert cat_table.cat_table.item(0, 1).text() == ''
     assert len(expenses) == 1
-    assert expenses[0].amount == exp_summ
-    assert expenses[0].expense_date == exp_date
+    assert expenses[0].amount == Decimal(exp_summ)
+    assert expenses[0].expense_date == datetime.fromisoformat(exp_date)
     assert expenses[0].category == cats[0].name
     assert expenses[0].comment == exp_comment
     assert exp_table.expenses_table.item(0, 0).text() == exp_date
-    assert exp_table.expenses_table.item(0, 1).text() == exp_summ
+    assert exp_table.expenses_table.item(0, 1).text() == '12345.00'
     assert exp_table.expenses_table.item(0, 2).text() == cats[0].name
     assert exp_table.expenses_table.item(0, 3).text() == exp_comment
-    assert budgets_in_repo[0].amount == budget_table.budget_table.item(0, 0).text()
-    assert budgets_in_repo[1].amount == budget_table.budget_table.item(1, 0).text()
-    assert budgets_in_repo[2].amount == budget_table.budget_table.item(2, 0).text()
+    assert str(budgets_in_repo[0].amount) == budget_table.budget_table.item(0, 0).text()
+    assert str(budgets_in_repo[1].amount) == budget_table.budget_table.item(1, 0).text()
+    assert str(budgets_in_repo[2].amount) == budget_table.budget_table.item(2, 0).text()
     assert str(int(float(budgets_in_repo[0].amount))) == '12345'
     assert str(int(float(budgets_in_repo[1].amount))) == '12345'
     assert str(int(float(budgets_in_repo[2].amount))) == '12345'
@@ -180,7 +182,7 @@ def test_delete_exp(qtbot, main_client):
     for expense in expenses:
         main_client.add_exp(expense.expense_date.strftime('%Y-%m-%d %H:%M:%S'), str(expense.amount),
                             cats[0].name, expense.comment)
-    main_client.expenses = main_client.exp_repo.get_all()
+    main_client.expenses = main_client.exp_repo.get_all(order_by='-expense_date')
     exp_table = main_client.view.expense_tab.expense_table
     budget_table = main_client.view.budget_tab.budget_table
     exp_table.set_data(main_client.expenses)
@@ -202,25 +204,27 @@ def test_delete_exp(qtbot, main_client):
     budgets_in_repo = main_client.budget_repo.get_all()
 
     assert len(expenses_in_repo) == 2
-    assert expenses_in_repo[0].expense_date == expenses[0].expense_date.strftime('%Y-%m-%d %H:%M:%S')
-    assert expenses_in_repo[0].amount == str(expenses[0].amount)
+    assert expenses_in_repo[0].expense_date == \
+        expenses[0].expense_date.replace(microsecond=0)
+    assert expenses_in_repo[0].amount == expenses[0].amount
     assert expenses_in_repo[0].category == cats[0].name
     assert expenses_in_repo[0].comment == expenses[0].comment
-    assert expenses_in_repo[1].expense_date == expenses[2].expense_date.strftime('%Y-%m-%d %H:%M:%S')
-    assert expenses_in_repo[1].amount == str(expenses[2].amount)
+    assert expenses_in_repo[1].expense_date == \
+        expenses[2].expense_date.replace(microsecond=0)
+    assert expenses_in_repo[1].amount == expenses[2].amount
     assert expenses_in_repo[1].category == cats[0].name
     assert expenses_in_repo[1].comment == expenses[2].comment
     assert exp_table.expenses_table.item(1, 0).text() == expenses[0].expense_date.strftime('%Y-%m-%d %H:%M:%S')
-    assert exp_table.expenses_table.item(1, 1).text() == str(expenses[0].amount)
+    assert exp_table.expenses_table.item(1, 1).text() == f'{expenses[0].amount:.2f}'
     assert exp_table.expenses_table.item(1, 2).text() == cats[0].name
     assert exp_table.expenses_table.item(1, 3).text() == expenses[0].comment
     assert exp_table.expenses_table.item(0, 0).text() == expenses[2].expense_date.strftime('%Y-%m-%d %H:%M:%S')
-    assert exp_table.expenses_table.item(0, 1).text() == str(expenses[2].amount)
+    assert exp_table.expenses_table.item(0, 1).text() == f'{expenses[2].amount:.2f}'
     assert exp_table.expenses_table.item(0, 2).text() == cats[0].name
     assert exp_table.expenses_table.item(0, 3).text() == expenses[2].comment
-    assert budgets_in_repo[0].amount == budget_table.budget_table.item(0, 0).text()
-    assert budgets_in_repo[1].amount == budget_table.budget_table.item(1, 0).text()
-    assert budgets_in_repo[2].amount == budget_table.budget_table.item(2, 0).text()
+    assert str(budgets_in_repo[0].amount) == budget_table.budget_table.item(0, 0).text()
+    assert str(budgets_in_repo[1].amount) == budget_table.budget_table.item(1, 0).text()
+    assert str(budgets_in_repo[2].amount) == budget_table.budget_table.item(2, 0).text()
     assert int(float(budgets_in_repo[0].amount)) == expenses[0].amount
     assert int(float(budgets_in_repo[1].amount)) == expenses[0].amount
     assert int(float(budgets_in_repo[2].amount)) == int(expenses[2].amount + expenses[0].amount)
@@ -305,9 +309,9 @@ def test_update_budget(qtbot, main_client):
                             expense.category, expense.comment)
 
     budget_table = main_client.view.budget_tab.budget_table
-    assert budget_table.budget_table.item(0, 1).text() == '1000'
-    assert budget_table.budget_table.item(1, 1).text() == '7000'
-    assert budget_table.budget_table.item(2, 1).text() == '30000'
+    assert budget_table.budget_table.item(0, 1).text() == '1000.00'
+    assert budget_table.budget_table.item(1, 1).text() == '7000.00'
+    assert budget_table.budget_table.item(2, 1).text() == '30000.00'
     budget_table.set_expenses(main_client.expenses)
     budget_table.set_data(main_client.budget_data)
     budget_table.update_budget.trigger()
@@ -321,21 +325,19 @@ def test_update_budget(qtbot, main_client):
     qtbot.mouseClick(budget_table.update_menu.submit_button, qt_api.QtCore.Qt.MouseButton.LeftButton)
 
     budgets_in_repo = main_client.budget_repo.get_all()
-    assert budgets_in_repo[0].budget == budgets[0]
-    assert budgets_in_repo[1].budget == budgets[1]
-    assert budgets_in_repo[2].budget == budgets[2]
-    assert budget_table.budget_table.item(0, 1).text() == budgets[0]
-    assert budget_table.budget_table.item(1, 1).text() == budgets[1]
-    assert budget_table.budget_table.item(2, 1).text() == budgets[2]
-    assert budgets_in_repo[0].amount == str(float(expenses[0].amount))
-    assert budgets_in_repo[1].amount == str(float(expenses[1].amount)
-                                                              + float(expenses[0].amount))
-    assert budgets_in_repo[2].amount == str(float(expenses[2].amount)
-                                                              + float(expenses[0].amount)
-                                                              + float(expenses[1].amount))
-    assert budget_table.budget_table.item(0, 0).text() == budgets_in_repo[0].amount
-    assert budget_table.budget_table.item(1, 0).text() == budgets_in_repo[1].amount
-    assert budget_table.budget_table.item(2, 0).text() == budgets_in_repo[2].amount
+    assert budgets_in_repo[0].budget == Decimal(budgets[0])
+    assert budgets_in_repo[1].budget == Decimal(budgets[1])
+    assert budgets_in_repo[2].budget == Decimal(budgets[2])
+    assert budget_table.budget_table.item(0, 1).text() == budgets[0] + '.00'
+    assert budget_table.budget_table.item(1, 1).text() == budgets[1] + '.00'
+    assert budget_table.budget_table.item(2, 1).text() == budgets[2] + '.00'
+    assert budgets_in_repo[0].amount == expenses[0].amount
+    assert budgets_in_repo[1].amount == expenses[1].amount + expenses[0].amount
+    assert budgets_in_repo[2].amount == expenses[2].amount + expenses[0].amount \
+        + expenses[1].amount
+    assert budget_table.budget_table.item(0, 0).text() == str(budgets_in_repo[0].amount)
+    assert budget_table.budget_table.item(1, 0).text() == str(budgets_in_repo[1].amount)
+    assert budget_table.budget_table.item(2, 0).text() == str(budgets_in_repo[2].amount)
 
 
 @freeze_time('2023-03-06 12:00:00')
@@ -359,7 +361,7 @@ def test_update_exp(qtbot, main_client):
     for expense in expenses:
         main_client.add_exp(expense.expense_date.strftime('%Y-%m-%d %H:%M:%S'), str(expense.amount),
                             cats[0].name, expense.comment)
-    main_client.expenses = main_client.exp_repo.get_all()
+    main_client.expenses = main_client.exp_repo.get_all(order_by='-expense_date')
     exp_table = main_client.view.expense_tab.expense_table
     exp_table.set_categories(cats)
     budget_table = main_client.view.budget_tab.budget_table
@@ -386,21 +388,40 @@ def test_update_exp(qtbot, main_client):
     expense_in_repo = main_client.exp_repo.get_all({'pk': new_expense.pk})
 
     assert expense_in_repo[0].pk == new_expense.pk
-    assert expense_in_repo[0].expense_date == new_expense.expense_date.strftime('%Y-%m-%d %H:%M:%S')
-    assert expense_in_repo[0].amount == str(new_expense.amount)
+    assert expense_in_repo[0].expense_date == new_expense.expense_date
+    assert expense_in_repo[0].amount == new_expense.amount
     assert expense_in_repo[0].category == cats[new_expense.category-1].name
     assert expense_in_repo[0].comment == new_expense.comment
-    assert exp_table.expenses_table.item(1, 0).text() == expense_in_repo[0].expense_date
-    assert exp_table.expenses_table.item(1, 1).text() == expense_in_repo[0].amount
+    assert exp_table.expenses_table.item(1, 0).text() == \
+        expense_in_repo[0].expense_date.strftime('%Y-%m-%d %H:%M:%S')
+    assert exp_table.expenses_table.item(1, 1).text() == str(expense_in_repo[0].amount)
     assert exp_table.expenses_table.item(1, 2).text() == expense_in_repo[0].category
     assert exp_table.expenses_table.item(1, 3).text() == expense_in_repo[0].comment
 
     budgets_in_repo = main_client.budget_repo.get_all()
-    assert budgets_in_repo[0].amount == '0.0'
-    assert budgets_in_repo[1].amount == str(float(expenses[1].amount) + float(new_expense.amount))
-    assert budgets_in_repo[2].amount == str(float(expenses[2].amount)
-                                                + float(new_expense.amount)
-                                                + float(expenses[1].amount))
-    assert budget_table.budget_table.item(0, 0).text() == budgets_in_repo[0].amount
-    assert budget_table.budget_table.item(1, 0).text() == budgets_in_repo[1].amount
-    assert budget_table.budget_table.item(2, 0).text() == budgets_in_repo[2].amount
+    assert budgets_in_repo[0].amount == 0
+    assert budgets_in_repo[1].amount == expenses[1].amount + new_expense.amount
+    assert budgets_in_repo[2].amount == expenses[2].amount + new_expense.amount \
+        + expenses[1].amount
+    assert budget_table.budget_table.item(0, 0).text() == str(budgets_in_repo[0].amount)
+    assert budget_table.budget_table.item(1, 0).text() == str(budgets_in_repo[1].amount)
+    assert budget_table.budget_table.item(2, 0).text() == str(budgets_in_repo[2].amount)
+
+
+def test_own_changes_are_not_synced(qtbot, main_client, monkeypatch):
+    synced = []
+    monkeypatch.setattr(main_client.exp_repo, 'sync', synced.append)
+    main_client.sync_external_changes()
+    main_client.add_cat('тест', None)
+    main_client.add_exp('2023-03-06 12:00:00', '100', 'тест', '')
+    main_client.sync_external_changes()
+    assert synced == []
+
+
+def test_change_log_is_pruned(qtbot, main_client, monkeypatch):
+    pruned = []
+    monkeypatch.setattr(client_module, 'PRUNE_INTERVAL', 2)
+    monkeypatch.setattr(main_client.watcher, 'prune', lambda: pruned.append(True))
+    for _ in range(5):
+        main_client.sync_external_changes()
+    assert len(pruned) == 2
@@ -1,12 +1,16 @@
 """
 Тесты для категорий расходов
 """
+import io
 from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryTree
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.path_repository import PathRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import read_tree, write_tree
 
 
 @pytest.fixture
@@ -106,3 +110,175 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+def test_create_from_tree_uses_bulk_insert(repo):
+    tree = [('a', None), ('b', 'a'), ('c', 'b'), ('d', 'a'), ('e', None)]
+    calls = []
+    add_many = repo.add_many
+    repo.add_many = lambda objs: calls.append(len(objs)) or add_many(objs)
+    cats = Category.create_from_tree(tree, repo)
+    assert calls == [2, 2, 1]
+    assert [c.name for c in cats] == ['a', 'b', 'c', 'd', 'e']
+    by_name = {c.name: c for c in repo.get_all()}
+    assert by_name['c'].parent == by_name['b'].pk
+    assert by_name['d'].parent == by_name['a'].pk
+    assert by_name['e'].parent is None
+
+
+def test_sqlite_indexes(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'test.db'), Category) as repo:
+        assert set(repo.list_indexes().values()) == {('parent',), ('name',)}
+
+
+def test_hierarchy_in_sqlite(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'test.db'), Category) as repo:
+        cats = Category.create_from_tree(
+            [('0', None), ('1', '0'), ('2', '0'), ('3', '2'), ('4', None)], repo)
+        root, leaf = cats[0], cats[3]
+        assert [c.name for c in root.get_subcategories(repo)] == ['1', '2', '3']
+        assert [c.name for c in leaf.get_all_parents(repo)] == ['2', '0']
+
+
+@pytest.fixture
+def tree(repo):
+    Category.create_from_tree([('food', None), ('fruit', 'food'), ('apple', 'fruit'),
+                               ('meat', 'food'), ('car', None), ('fuel', 'car')], repo)
+    return CategoryTree.from_repo(repo)
+
+
+def pks(tree, *names):
+    by_name = {tree[pk].name: pk for pk in range(1, 100) if pk in tree}
+    return [by_name[name] for name in names]
+
+
+def test_tree_structure(tree):
+    food, fruit, apple, meat, car = pks(tree, 'food', 'fruit', 'apple', 'meat', 'car')
+    assert len(tree) == 6
+    assert [c.name for c in tree.roots()] == ['food', 'car']
+    assert [c.name for c in tree.get_children(food)] == ['fruit', 'meat']
+    assert tree.depth(food) == 0 and tree.depth(apple) == 2
+    assert tree.full_path(apple) == 'food / fruit / apple'
+    assert [c.name for c in tree.get_ancestors(apple)] == ['fruit', 'food']
+    assert [c.name for c in tree.get_subtree(food)] == ['fruit', 'apple', 'meat']
+    assert tree.is_descendant(apple, food)
+    assert not tree.is_descendant(food, apple)
+    assert not tree.is_descendant(food, food)
+    assert not tree.is_descendant(meat, fruit)
+    assert not tree.is_descendant(apple, car)
+
+
+def test_tree_is_built_in_any_order():
+    cats = [Category('c', 2, 3), Category('a', None, 1), Category('b', 1, 2)]
+    assert CategoryTree(cats).full_path(3) == 'a / b / c'
+    with pytest.raises(ValueError):
+        CategoryTree([Category('a', 2, 1), Category('b', 1, 2)])
+
+
+def test_tree_with_unknown_parents():
+    tree = CategoryTree([Category('orphan', 5, 1), Category('child', 1, 2)])
+    assert [c.name for c in tree.roots()] == ['orphan']
+    assert tree.full_path(2) == 'orphan / child' and tree.get_ancestors(1) == []
+    tree.add(Category('parent', None, 5))
+    assert [c.name for c in tree.roots()] == ['parent']
+    assert tree.full_path(2) == 'parent / orphan / child'
+    assert tree.is_descendant(2, 5)
+    tree.move(1, 7)
+    assert tree.depth(2) == 1 and not tree.is_descendant(2, 5)
+    with pytest.raises(ValueError):
+        tree.add(Category('loop', 2, 7))
+
+
+def test_tree_updates(tree):
+    food, fruit, apple, car = pks(tree, 'food', 'fruit', 'apple', 'car')
+    tree.move(fruit, car)
+    assert tree.full_path(apple) == 'car / fruit / apple'
+    assert tree.depth(apple) == 2
+    assert tree.is_descendant(apple, car) and not tree.is_descendant(apple, food)
+    tree.update(Category('auto', None, car))
+    assert tree.full_path(apple) == 'auto / fruit / apple'
+    tree.add(Category('pear', fruit, 10))
+    assert [c.name for c in tree.get_subtree(car)] == ['fuel', 'fruit', 'apple', 'pear']
+    assert [c.name for c in tree.delete(fruit)] == ['fruit', 'apple', 'pear']
+    assert apple not in tree and len(tree) == 4
+    assert [c.name for c in tree.get_subtree(car)] == ['fuel']
+
+
+def test_tree_updates_labels_locally(tree, monkeypatch):
+    food, fruit, apple = pks(tree, 'food', 'fruit', 'apple')
+    monkeypatch.setattr(tree, '_relabel', lambda: pytest.fail('relabeled'))
+    for pk in range(10, 310):
+        tree.add(Category(str(pk), apple if pk % 2 else fruit, pk))
+    tree.delete(11)
+    tree.move(fruit, None)
+    assert tree.is_descendant(309, fruit) and not tree.is_descendant(309, food)
+    assert tree.is_descendant(apple, fruit) and not tree.is_descendant(10, apple)
+    assert len(tree.get_subtree(fruit)) == 300
+
+
+def test_tree_relabels_when_labels_run_out():
+    class DenseTree(CategoryTree):
+        label_gap = 2
+
+    tree = DenseTree([Category('root', None, 1)])
+    for pk in range(2, 50):
+        tree.add(Category(str(pk), pk // 2, pk))
+    assert all(tree.is_descendant(pk, pk // 2) for pk in range(2, 50))
+    assert tree.is_descendant(49, 1) and not tree.is_descendant(49, 2)
+    assert len(tree.get_subtree(3)) == 16
+
+
+def test_tree_rejects_invalid_changes(tree):
+    food, fruit, apple = pks(tree, 'food', 'fruit', 'apple')
+    with pytest.raises(ValueError):
+        tree.move(food, apple)
+    with pytest.raises(ValueError):
+        tree.move(fruit, fruit)
+    with pytest.raises(ValueError):
+        tree.add(Category('x', 50, 50))
+    with pytest.raises(ValueError):
+        tree.add(Category('x', None, food))
+    assert tree.full_path(apple) == 'food / fruit / apple'
+
+
+def test_create_from_tree_streams_in_batches(repo):
+    calls = []
+    add_many = repo.add_many
+    repo.add_many = lambda objs: calls.append([c.name for c in objs]) or add_many(objs)
+    tree = iter([('a', None), ('b', 'a'), ('c', 'b'), ('d', 'a'),
+                 ('e', None), ('f', 'e')])
+    Category.create_from_tree(tree, repo, batch_size=4)
+    assert calls == [['a'], ['b', 'd'], ['c'], ['e'], ['f']]
+    by_name = {c.name: c for c in repo.get_all()}
+    assert by_name['d'].parent == by_name['a'].pk
+    assert by_name['f'].parent == by_name['e'].pk
+
+
+def test_create_from_tree_finds_parents_outside_path(repo):
+    existing = repo.add(Category('existing'))
+    tree = [('a', None), ('b', None), ('c', 'a'), ('d', 'existing')]
+    cats = Category.create_from_tree(tree, repo)
+    assert [c.parent for c in cats] == [None, None, cats[0].pk, existing]
+
+
+def test_create_from_tree_is_atomic(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'test.db'), Category) as repo:
+        tree = [('a', None), ('b', 'a'), ('c', 'missing')]
+        with pytest.raises(KeyError):
+            Category.create_from_tree(tree, repo, batch_size=1)
+        assert repo.get_all() == []
+
+
+@pytest.mark.parametrize('make_repo', [
+    lambda tmp_path: MemoryRepository(),
+    lambda tmp_path: SQLiteRepository(str(tmp_path / 'test.db'), Category),
+    lambda tmp_path: PathRepository(str(tmp_path / 'test.db'), Category),
+], ids=['memory', 'sqlite', 'path'])
+def test_export_tree_round_trip(tmp_path, make_repo):
+    text = ['food', '    fruit', '        apple', '    meat', 'car', '    fuel']
+    repo = make_repo(tmp_path)
+    Category.create_from_tree(read_tree(text), repo)
+    repo.add(Category('pear', repo.get_all({'name': 'fruit'})[0].pk))
+    out = io.StringIO()
+    write_tree(Category.export_tree(repo), out)
+    assert out.getvalue().splitlines() == text[:3] + ['        pear'] + text[3:]
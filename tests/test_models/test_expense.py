@@ -3,6 +3,7 @@ from datetime import datetime
 import pytest
 
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
 from bookkeeper.models.expense import Expense, ExpenseWithStringDate
 
 
@@ -40,4 +41,10 @@ def test_create_with_full_args_list_and_string_date():
 def test_create_brief_with_string_date():
     e = ExpenseWithStringDate(100, 1)
     assert e.amount == 100
-    assert e.category == 1
\ No newline at end of file
+    assert e.category == 1
+
+
+def test_sqlite_indexes(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'test.db'), Expense) as repo:
+        assert set(repo.list_indexes().values()) == {('expense_date',),
+                                                     ('category', 'expense_date')}
@@ -0,0 +1,63 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.migrations import MIGRATIONS
+from bookkeeper.repository.migrations import Migrator
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def connection(tmp_path):
+    """ база данных прежнего формата: суммы и даты без типов """
+    connection = ConnectionManager(str(tmp_path / 'test.db'))
+    with connection.transaction() as con:
+        con.execute('CREATE TABLE expense(pk INTEGER PRIMARY KEY, amount, category, '
+                    'expense_date, added_date, comment)')
+        con.execute('CREATE TABLE budget(pk INTEGER PRIMARY KEY, amount, budget)')
+        con.executemany('INSERT INTO expense (amount, category, expense_date, '
+                        'added_date, comment) VALUES (?, ?, ?, ?, ?)',
+                        [('101.30', 'food', '2023-03-01 12:30:00',
+                          '2023-03-01 12:31:05.250000', ''),
+                         (600, 1, '2023-03-02 00:00:00', '2023-03-02 08:00:00', 'x')])
+        con.executemany('INSERT INTO budget (amount, budget) VALUES (?, ?)',
+                        [('0.0', '1000'), (600, 7000.5)])
+    yield connection
+    connection.close()
+
+
+def test_migrate_legacy_data(connection):
+    assert Migrator(connection, MIGRATIONS).migrate() == 1
+    expenses = SQLiteRepository(connection.db_file, Expense, connection).get_all()
+    assert [(e.amount, e.category, e.expense_date, e.added_date, e.comment)
+            for e in expenses] == [
+        (Decimal('101.30'), 'food', datetime(2023, 3, 1, 12, 30),
+         datetime(2023, 3, 1, 12, 31, 5, 250000), ''),
+        (Decimal('600.00'), 1, datetime(2023, 3, 2), datetime(2023, 3, 2, 8), 'x')]
+    budgets = SQLiteRepository(connection.db_file, Budget, connection).get_all()
+    assert [(b.amount, b.budget) for b in budgets] == [
+        (Decimal('0.00'), Decimal('1000.00')), (Decimal('600.00'), Decimal('7000.50'))]
+
+
+def test_migration_is_atomic(connection):
+    with connection.transaction() as con:
+        con.execute("INSERT INTO budget (amount, budget) VALUES ('много', 0)")
+    with pytest.raises(ArithmeticError):
+        Migrator(connection, MIGRATIONS).migrate()
+    assert Migrator(connection, MIGRATIONS).current_version() == 0
+    with connection.connect() as con:
+        assert con.execute('SELECT amount FROM expense ORDER BY pk').fetchall() == [
+            ('101.30',), (600,)]
+
+
+def test_new_database(tmp_path):
+    connection = ConnectionManager(str(tmp_path / 'new.db'))
+    assert Migrator(connection, MIGRATIONS).migrate() == 1
+    repo = SQLiteRepository(connection.db_file, Expense, connection)
+    pk = repo.add(Expense(Decimal('1.50'), 1, datetime(2023, 1, 1)))
+    assert repo.get(pk).amount == Decimal('1.50')
+    connection.close()
@@ -18,3 +18,36 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_default_bulk_methods():
+    class Test(AbstractRepository):
+        def __init__(self):
+            self.calls = []
+
+        def add(self, obj):
+            self.calls.append(('add', obj))
+            return obj
+
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): self.calls.append(('update', obj))
+        def delete(self, pk): self.calls.append(('delete', pk))
+
+    t = Test()
+    assert t.add_many([1, 2]) == [1, 2]
+    t.update_many([3])
+    t.delete_many(iter([4, 5]))
+    assert t.calls == [('add', 1), ('add', 2), ('update', 3),
+                       ('delete', 4), ('delete', 5)]
+
+
+def test_default_get_many():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): return str(pk) if pk > 0 else None
+        def get_all(self, where=None): pass
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    assert Test().get_many([3, -1, 1, 3]) == {3: '3', 1: '1'}
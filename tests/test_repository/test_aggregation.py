@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.repository.aggregation import aggregate_objects, period_key
+
+
+@dataclass
+class Obj:
+    amount: int | str | None
+    group: str = 'a'
+
+
+@pytest.fixture
+def objs():
+    return [Obj(1), Obj('2.5', 'b'), Obj(None, 'b'), Obj(4)]
+
+
+@pytest.mark.parametrize('func, expected', [
+    ('sum', 7.5), ('count', 3), ('avg', 2.5),
+])
+def test_aggregate(objs, func, expected):
+    assert aggregate_objects(objs, func, 'amount') == expected
+
+
+def test_min_max():
+    objs = [Obj(3), Obj(None), Obj(1), Obj(2)]
+    assert aggregate_objects(objs, 'min', 'amount') == 1
+    assert aggregate_objects(objs, 'max', 'amount') == 3
+
+
+def test_aggregate_empty():
+    assert aggregate_objects([], 'sum', 'amount') is None
+    assert aggregate_objects([], 'count', 'amount') == 0
+
+
+def test_aggregate_group_by(objs):
+    assert aggregate_objects(objs, 'sum', 'amount', group_by='group') == \
+        {'a': 5, 'b': 2.5}
+    assert aggregate_objects(objs, 'count', 'amount', group_by='group') == \
+        {'a': 2, 'b': 1}
+
+
+def test_invalid_arguments(objs):
+    with pytest.raises(ValueError):
+        aggregate_objects(objs, 'median', 'amount')
+    with pytest.raises(ValueError):
+        aggregate_objects(objs, 'sum', 'amount', period='day')
+    with pytest.raises(ValueError):
+        aggregate_objects(objs, 'sum', 'amount', group_by='group', period='hour')
+
+
+@pytest.mark.parametrize('value', ['2023-03-06 12:00:00', datetime(2023, 3, 6, 12)])
+def test_period_key(value):
+    assert period_key(value, 'day') == '2023-03-06'
+    assert period_key(value, 'week') == '2023-10'
+    assert period_key(value, 'month') == '2023-03'
+    assert period_key(value, 'year') == '2023'
+    assert period_key(None, 'day') is None
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.cached_repository import CacheInfo, CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.replicated_repository import ReplicatedRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    def get(self, pk):
+        self.gets += 1
+        return super().get(pk)
+
+
+@dataclass
+class Custom:
+    value: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def inner():
+    return CountingRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, maxsize=2)
+
+
+def test_get_is_cached(repo, inner):
+    obj = Custom(1)
+    pk = repo.add(obj)
+    assert repo.get(pk) is obj
+    assert repo.get(pk) is obj
+    assert inner.gets == 1
+    assert repo.get(pk + 1) is None
+    assert repo.get(pk + 1) is None
+    assert inner.gets == 3
+    assert repo.cache_info() == CacheInfo(hits=1, misses=3, maxsize=2, currsize=1)
+
+
+def test_lru_eviction(repo, inner):
+    pks = repo.add_many([Custom(i) for i in range(3)])
+    repo.get(pks[0])
+    repo.get(pks[1])
+    repo.get(pks[0])
+    repo.get(pks[2])
+    assert inner.gets == 3
+    repo.get(pks[0])
+    assert inner.gets == 3
+    repo.get(pks[1])
+    assert inner.gets == 4
+
+
+def test_get_many(repo, inner):
+    objects = [Custom(i) for i in range(3)]
+    pks = inner.add_many(objects)
+    repo.get(pks[0])
+    assert repo.get_many([pks[2], pks[0], 100]) == {pks[2]: objects[2],
+                                                    pks[0]: objects[0]}
+    assert repo.cache_info() == CacheInfo(hits=1, misses=3, maxsize=2, currsize=2)
+    assert repo.get_many([pks[0], pks[2]]) == {pks[0]: objects[0],
+                                               pks[2]: objects[2]}
+    assert repo.hits == 3
+
+
+def test_invalidation(repo, inner):
+    pks = repo.add_many([Custom(i) for i in range(2)])
+    repo.get(pks[0])
+    repo.update(Custom(10, pks[0]))
+    assert repo.get(pks[0]).value == 10
+    repo.update_many([Custom(20, pks[0])])
+    assert repo.get(pks[0]).value == 20
+    repo.delete(pks[0])
+    assert repo.get(pks[0]) is None
+    repo.get(pks[1])
+    repo.delete_many([pks[1]])
+    assert repo.get(pks[1]) is None
+    assert repo.cache_info().currsize == 0
+
+
+def test_explicit_invalidate(repo, inner):
+    obj = Custom(1)
+    repo.add(obj)
+    repo.get(obj.pk)
+    inner.reset([Custom(2, obj.pk)])
+    assert repo.get(obj.pk).value == 1
+    repo.invalidate(obj.pk)
+    assert repo.get(obj.pk).value == 2
+    repo.invalidate()
+    assert repo.cache_info().currsize == 0
+
+
+def test_delegation(repo):
+    repo.add_many([Custom(i) for i in range(3)])
+    assert [o.value for o in repo.get_all(order_by='-value', limit=2)] == [2, 1]
+    assert list(repo.iter_all({'value': 1})) == repo.get_all({'value': 1})
+    assert repo.aggregate('sum', 'value') == 3
+
+
+def test_parents_lookup(inner):
+    Category.create_from_tree([('a', None), ('b', 'a'), ('c', 'b')], inner)
+    repo = CachedRepository(inner)
+    leaf = inner.get_all({'name': 'c'})[0]
+    for _ in range(10):
+        assert [c.name for c in leaf.get_all_parents(repo)] == ['b', 'a']
+    assert inner.gets == 2
+    assert repo.hits == 28
+
+
+def test_invalid_maxsize(inner):
+    with pytest.raises(ValueError):
+        CachedRepository(inner, maxsize=0)
+
+
+def test_changes_of_inner_repository_invalidate_cache(repo, inner):
+    received = []
+    repo.subscribe(received.append)
+    pk = repo.add(Custom(1))
+    repo.get(pk)
+    inner.update(Custom(2, pk))
+    assert repo.get(pk) == Custom(2, pk)
+    inner.delete(pk)
+    assert repo.get(pk) is None
+    assert [change.kind for changes in received for change in changes] == [
+        'added', 'updated', 'deleted']
+
+
+@pytest.mark.parametrize('replicated', [False, True])
+def test_rolled_back_reads_are_not_cached(tmp_path, replicated):
+    inner = SQLiteRepository(str(tmp_path / 'test.db'), Custom, persistent=True)
+    if replicated:
+        inner = ReplicatedRepository(inner)
+    repo = CachedRepository(inner)
+    pk = repo.add(Custom(1))
+    assert repo.get(pk) == Custom(1, pk)
+    with pytest.raises(RuntimeError):
+        with inner.transaction():
+            inner.update(Custom(2, pk))
+            assert repo.get(pk) == Custom(2, pk)
+            assert repo.get_many([pk]) == {pk: Custom(2, pk)}
+            raise RuntimeError
+    assert repo.get(pk) == Custom(1, pk)
+    assert repo.get_many([pk]) == {pk: Custom(1, pk)}
+    inner.close()
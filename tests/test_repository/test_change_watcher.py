@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.change_watcher import CHANGE_LOG_TABLE, ChangeWatcher
+from bookkeeper.models.category import Category
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED, Change
+from bookkeeper.repository.path_repository import PathRepository
+from bookkeeper.repository.replicated_repository import ReplicatedRepository
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Item:
+    name: str = ''
+    pk: int = 0
+
+
+@dataclass
+class Other:
+    value: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def writer(db_file):
+    """ Репозиторий другого процесса: собственное соединение с базой """
+    repo = SQLiteRepository(db_file, Item)
+    yield repo
+    repo.close()
+
+
+@pytest.fixture
+def watcher(db_file, writer):
+    SQLiteRepository(db_file, Other).close()
+    watcher = ChangeWatcher(db_file, [Item, Other])
+    yield watcher
+    watcher.close()
+
+
+def test_poll(watcher, writer, db_file):
+    assert watcher.poll() == []
+    pk = writer.add(Item('a'))
+    assert watcher.poll() == [Change(ADDED, Item, pk)]
+    assert watcher.poll() == []
+    writer.update(Item('b', pk))
+    other = SQLiteRepository(db_file, Other)
+    other_pk = other.add(Other(1))
+    writer.delete(pk)
+    assert watcher.poll() == [Change(DELETED, Item, pk), Change(ADDED, Other, other_pk)]
+
+
+def test_changes_are_coalesced(watcher, writer):
+    pk = writer.add(Item('a'))
+    writer.update(Item('b', pk))
+    gone = writer.add(Item('c'))
+    writer.update(Item('d', gone))
+    writer.delete(gone)
+    kept = writer.add(Item('e'))
+    assert watcher.poll() == [Change(ADDED, Item, pk), Change(ADDED, Item, kept)]
+    writer.update_many([Item('f', pk), Item('g', pk)])
+    assert watcher.poll() == [Change(UPDATED, Item, pk)]
+
+
+def test_changes_before_watcher_are_skipped(db_file, writer):
+    ChangeWatcher(db_file, [Item]).close()
+    writer.add(Item('a'))
+    watcher = ChangeWatcher(db_file, [Item])
+    pk = writer.add(Item('b'))
+    assert watcher.poll() == [Change(ADDED, Item, pk)]
+    watcher.close()
+
+
+def test_own_changes_are_skipped(db_file, writer):
+    own = SQLiteRepository(db_file, Item, ConnectionManager(db_file))
+    watcher = ChangeWatcher(db_file, [Item], own.connection)
+    own.add(Item('a'))
+    assert watcher.poll() == []
+    other_pk = writer.add(Item('b'))
+    own_pk = own.add(Item('c'))
+    assert watcher.poll() == [Change(ADDED, Item, other_pk), Change(ADDED, Item, own_pk)]
+    own.update(Item('d', own_pk))
+    assert watcher.poll() == []
+    writer.delete(other_pk)
+    assert watcher.poll() == [Change(DELETED, Item, other_pk)]
+    watcher.close()
+
+
+def test_prune(watcher, writer):
+    writer.add_many([Item(str(i)) for i in range(5)])
+    watcher.prune(keep=2)
+    with watcher.connection.connect() as con:
+        seqs = [row[0] for row in con.execute(f'SELECT seq FROM {CHANGE_LOG_TABLE}')]
+    assert seqs == [4, 5]
+    assert [change.pk for change in watcher.poll()] == [4, 5]
+
+
+def test_replicated_sync(watcher, writer, db_file):
+    repo = ReplicatedRepository(SQLiteRepository(db_file, Item))
+    first = repo.add(Item('a'))
+    second = repo.add(Item('b'))
+    received = []
+    repo.subscribe(received.append)
+    watcher.poll()
+    writer.update(Item('x', first))
+    third = writer.add(Item('c'))
+    writer.delete(second)
+    changes = watcher.poll()
+    repo.update(Item('y', first))
+    assert repo.sync(change.pk for change in changes) == [
+        Change(ADDED, Item, third), Change(DELETED, Item, second)]
+    assert received[-1] == [Change(ADDED, Item, third), Change(DELETED, Item, second)]
+    assert repo.get_all() == [Item('y', first), Item('c', third)]
+    assert repo.sync([first]) == []
+    repo.close()
+
+
+def test_path_maintenance_is_not_logged(db_file):
+    repo = PathRepository(db_file, Category)
+    watcher = ChangeWatcher(db_file, [Category])
+    food = repo.add(Category('food'))
+    fruit = repo.add(Category('fruit', food))
+    apple = repo.add(Category('apple', fruit))
+    car = repo.add(Category('car'))
+    assert watcher.poll() == [Change(ADDED, Category, pk)
+                              for pk in (food, fruit, apple, car)]
+    with watcher.connection.connect() as con:
+        kinds = [row[0] for row in con.execute(f'SELECT kind FROM {CHANGE_LOG_TABLE}')]
+    assert kinds == [ADDED] * 4
+    repo.update(Category('fruit', car, fruit))
+    assert watcher.poll() == [Change(UPDATED, Category, fruit)]
+    watcher.close()
+    repo.close()
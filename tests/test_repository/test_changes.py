@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from bookkeeper.repository.changes import (
+    ADDED, DELETED, UPDATED, Change, ChangeFeed, apply_changes)
+
+
+def test_subscribe_and_unsubscribe():
+    feed = ChangeFeed()
+    assert not feed.listening
+    first, second = [], []
+    unsubscribe = feed.subscribe(first.append)
+    feed.subscribe(second.append)
+    assert feed.listening
+    feed.publish([Change(ADDED, int, 1)])
+    feed.publish([])
+    unsubscribe()
+    feed.publish([Change(DELETED, int, 1)])
+    assert first == [[Change(ADDED, int, 1)]]
+    assert second == [[Change(ADDED, int, 1)], [Change(DELETED, int, 1)]]
+
+
+def test_batch():
+    feed = ChangeFeed()
+    received = []
+    feed.subscribe(received.append)
+    with feed.batch():
+        feed.publish([Change(ADDED, int, 1)])
+        with feed.batch():
+            feed.publish([Change(UPDATED, int, 1)])
+        assert not received
+    assert received == [[Change(ADDED, int, 1), Change(UPDATED, int, 1)]]
+
+
+def test_batch_delivers_on_exception():
+    feed = ChangeFeed()
+    received = []
+    feed.subscribe(received.append)
+    with pytest.raises(RuntimeError):
+        with feed.batch():
+            feed.publish([Change(ADDED, int, 1)])
+            raise RuntimeError
+    assert received == [[Change(ADDED, int, 1)]]
+
+
+def test_batch_is_per_thread():
+    feed = ChangeFeed()
+    received = []
+    feed.subscribe(received.append)
+    with feed.batch():
+        thread = threading.Thread(target=feed.publish, args=([Change(ADDED, int, 2)],))
+        thread.start()
+        thread.join()
+        assert received == [[Change(ADDED, int, 2)]]
+        feed.publish([Change(ADDED, int, 1)])
+    assert received == [[Change(ADDED, int, 2)], [Change(ADDED, int, 1)]]
+
+
+def test_apply_changes():
+    class Obj:
+        def __init__(self, pk, value):
+            self.pk, self.value = pk, value
+
+    store = {pk: Obj(pk, 'old') for pk in range(1, 5)}
+    objs = list(store.values())
+    store[2] = Obj(2, 'new')
+    store[5] = Obj(5, 'added')
+    del store[3]
+    apply_changes(objs, [Change(UPDATED, Obj, 2), Change(ADDED, Obj, 5),
+                         Change(DELETED, Obj, 3)],
+                  lambda pks: {pk: store[pk] for pk in pks if pk in store})
+    assert [(obj.pk, obj.value) for obj in objs] == [
+        (1, 'old'), (2, 'new'), (4, 'old'), (5, 'added')]
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Annotated
+
+import pytest
+
+from bookkeeper.repository.columns import Column, Money, Timestamp, column_for
+
+
+@pytest.mark.parametrize('annotation, sql_type', [
+    (int, 'INTEGER'), (bool, 'INTEGER'), (float, 'REAL'), (str, 'TEXT'),
+    (bytes, 'BLOB'), (int | None, 'INTEGER'), (int | str, ''), (datetime, ''),
+])
+def test_column_for(annotation, sql_type):
+    column = column_for(annotation)
+    assert column.sql_type == sql_type
+    assert not column.converts
+
+
+def test_column_for_annotated():
+    assert column_for(Annotated[Decimal, Money(3)]) == Money(3)
+    assert column_for(Annotated[datetime, Timestamp()]) == Timestamp()
+    assert column_for(Annotated[str, 'meta']) == Column('TEXT')
+
+
+def test_money():
+    money = Money()
+    assert money.sql_type == 'INTEGER'
+    assert money.to_db(Decimal('12.34')) == 1234
+    assert money.to_db('0.125') == 12
+    assert money.to_db(0.1) == 10
+    assert money.from_db(1234) == Decimal('12.34')
+    assert str(money.from_db(1234.5)) == '12.34'
+    assert str(money.from_db(1234.6666666666667)) == '12.35'
+    assert money.to_db(None) is None
+    assert money.from_db(None) is None
+
+
+def test_timestamp():
+    timestamp = Timestamp()
+    date = datetime(2023, 5, 17, 12, 30, 15, 250)
+    stored = timestamp.to_db(date)
+    assert isinstance(stored, int)
+    assert timestamp.from_db(stored) == date
+    assert timestamp.to_db('2023-05-17 12:30:15.000250') == stored
+    assert timestamp.to_db(date.replace(microsecond=0)) < stored
+    assert timestamp.from_db(None) is None
+    aware = date.replace(tzinfo=timezone(timedelta(hours=3)))
+    assert timestamp.from_db(timestamp.to_db(aware)) == date - timedelta(hours=3)
+    assert timestamp.to_db(date.replace(tzinfo=timezone.utc)) == stored
+    assert timestamp.to_db('2023-05-17T15:30:15.000250+03:00') == stored
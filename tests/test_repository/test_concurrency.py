@@ -0,0 +1,178 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+import pytest
+
+from bookkeeper.repository.concurrent_repository import (
+    ConcurrentMemoryRepository, RWLock)
+from bookkeeper.repository.query import Eq
+from bookkeeper.repository.sqlite_connection import (
+    ConnectionManager, PERFORMANCE_PRAGMAS)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+WRITERS = 4
+READERS = 8
+OBJECTS = 150
+
+
+@dataclass
+class Item:
+    owner: int
+    value: int = 0
+    pk: int = 0
+
+
+def hammer(repo, check):
+    """
+    Запустить WRITERS потоков, каждый из которых добавляет, изменяет
+    и удаляет объекты со своим значением owner, и READERS потоков, которые во время
+    записи читают репозиторий и вызывают check
+    """
+    done = threading.Event()
+
+    def write(owner):
+        for i in range(OBJECTS):
+            pk = repo.add(Item(owner, i))
+            repo.update(replace(repo.get(pk), value=i + 1))
+            if i % 3 == 0:
+                repo.delete(pk)
+        pks = repo.add_many(Item(owner, -1) for _ in range(10))
+        repo.delete_many(pks)
+
+    def read():
+        while not done.is_set():
+            check(repo)
+
+    with ThreadPoolExecutor(WRITERS + READERS) as pool:
+        readers = [pool.submit(read) for _ in range(READERS)]
+        writers = [pool.submit(write, owner) for owner in range(WRITERS)]
+        try:
+            for future in writers:
+                future.result()
+        finally:
+            done.set()
+        for future in readers:
+            future.result()
+    for owner in range(WRITERS):
+        items = repo.get_all(Eq('owner', owner), order_by='value')
+        assert [item.value for item in items] == [
+            i + 1 for i in range(OBJECTS) if i % 3]
+    assert len({item.pk for item in repo.get_all()}) == WRITERS * OBJECTS * 2 // 3
+
+
+def check_reads(repo):
+    values = [item.value for item in repo.iter_all(order_by='value')]
+    assert values == sorted(values)
+    assert all(item.owner == 1 for item in repo.get_all(Eq('owner', 1)))
+    assert repo.aggregate('count', where=Eq('owner', 2)) >= 0
+
+
+def test_rwlock_is_reentrant_for_writer():
+    lock = RWLock()
+    events = []
+    with lock.read(), lock.read():
+        events.append('readers')
+    with lock.write():
+        with lock.write(), lock.read():
+            events.append('nested')
+    with lock.write():
+        events.append('released')
+    assert events == ['readers', 'nested', 'released']
+
+
+def test_rwlock_writer_excludes_readers():
+    lock = RWLock()
+    inside = []
+    entered = threading.Event()
+
+    def reader():
+        with lock.read():
+            inside.append('reader')
+        entered.set()
+
+    with lock.write():
+        thread = threading.Thread(target=reader)
+        thread.start()
+        assert not entered.wait(0.1)
+        assert not inside
+    thread.join()
+    assert inside == ['reader']
+
+
+def test_memory_snapshot_is_isolated():
+    repo = ConcurrentMemoryRepository(hash_indexes=['owner'], sorted_indexes=['value'])
+    pks = repo.add_many(Item(i % 2, i) for i in range(10))
+    snapshot = repo.snapshot()
+    repo.delete(pks[0])
+    repo.update(Item(5, 100, pks[1]))
+    assert len(snapshot.get_all()) == 10
+    assert snapshot.get(pks[1]) == Item(1, 1, pks[1])
+    assert snapshot.get_all(Eq('owner', 5)) == []
+    snapshot.add(Item(7))
+    assert repo.get_all(Eq('owner', 7)) == []
+    assert [i.value for i in repo.get_all(order_by='-value', limit=2)] == [100, 9]
+    assert [i.value for i in snapshot.get_all(order_by='-value', limit=2)] == [9, 8]
+
+
+def test_memory_iteration_while_writing():
+    repo = ConcurrentMemoryRepository()
+    repo.add_many(Item(0, i) for i in range(5))
+    seen = []
+    for item in repo.iter_all():
+        seen.append(item.value)
+        repo.add(Item(0, 100))
+    assert seen == list(range(5))
+    assert len(repo.get_all()) == 10
+
+
+def test_memory_reads_do_not_copy_on_write():
+    repo = ConcurrentMemoryRepository(sorted_indexes=['value'])
+    repo.add_many(Item(0, i) for i in range(5))
+    container = repo._container
+    assert [i.value for i in repo.iter_all(order_by='-value', limit=2)] == [4, 3]
+    assert repo.aggregate('sum', 'value') == 10
+    repo.add(Item(0, 5))
+    assert repo._container is container
+    repo.snapshot()
+    repo.add(Item(0, 6))
+    assert repo._container is not container
+
+
+def test_memory_stress():
+    repo = ConcurrentMemoryRepository(hash_indexes=['owner'], sorted_indexes=['value'])
+    hammer(repo, check_reads)
+
+
+@pytest.fixture
+def wal_repo(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'), PERFORMANCE_PRAGMAS)
+    yield SQLiteRepository(manager.db_file, Item, manager)
+    manager.close()
+
+
+def test_sqlite_stress(wal_repo):
+    hammer(wal_repo, check_reads)
+
+
+def test_sqlite_readers_do_not_wait_for_writer(wal_repo):
+    wal_repo.add(Item(0, 1))
+    started, finish = threading.Event(), threading.Event()
+
+    def write():
+        with wal_repo.transaction():
+            wal_repo.add(Item(0, 2))
+            started.set()
+            finish.wait(5)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert started.wait(5)
+        with ThreadPoolExecutor(4) as pool:
+            counts = list(pool.map(lambda _: len(wal_repo.get_all()), range(8)))
+        assert counts == [1] * 8
+    finally:
+        finish.set()
+        writer.join()
+    assert len(wal_repo.get_all()) == 2
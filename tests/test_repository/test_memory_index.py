@@ -0,0 +1,129 @@
+import random
+from dataclasses import dataclass, replace
+
+import pytest
+
+from bookkeeper.repository.memory_index import HashIndex, SortedIndex
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import (
+    Between, Eq, Ge, Gt, In, Le, Like, Lt, Ne, StartsWith)
+
+
+@dataclass
+class Item:
+    group: str | None
+    amount: int | None
+    pk: int = 0
+
+
+def test_hash_index():
+    index = HashIndex('group')
+    index.add(1, 'a')
+    index.add(2, 'b')
+    index.add(3, 'a')
+    index.add(4, ['unhashable'])
+    assert index.lookup(Eq('group', 'a')) == {1, 3, 4}
+    assert index.lookup(In('group', ['b', 'c'])) == {2, 4}
+    index.add(5, None)
+    assert index.lookup(In('group', ['b', None])) == {2, 4}
+    assert index.lookup(Eq('group', None)) == {4, 5}
+    index.remove(5)
+    assert index.lookup(Lt('group', 'b')) is None
+    index.remove(1)
+    index.remove(4)
+    index.remove(5)
+    assert index.lookup(Eq('group', 'a')) == {3}
+
+
+def test_sorted_index():
+    index = SortedIndex('amount')
+    for pk, value in enumerate([5, None, 1, 5, 3], 1):
+        index.add(pk, value)
+    assert index.lookup(Eq('amount', 5)) == [1, 4]
+    assert index.lookup(Eq('amount', None)) == [2]
+    assert index.lookup(Lt('amount', 5)) == [3, 5]
+    assert index.lookup(Ge('amount', 3)) == [5, 1, 4]
+    assert index.lookup(Between('amount', 2, 4)) == [5]
+    assert index.lookup(Lt('amount', 'x')) is None
+    assert index.lookup(Ne('amount', 1)) is None
+    assert list(index.ordered()) == [2, 3, 5, 1, 4]
+    assert list(index.ordered(desc=True)) == [4, 1, 5, 3, 2]
+    assert list(index.ordered(after=(True, 3, 5))) == [1, 4]
+    assert list(index.ordered(desc=True, after=(True, 5, 1))) == [5, 3, 2]
+    index.remove(1)
+    assert list(index.ordered()) == [2, 3, 5, 4]
+
+
+def test_index_copy_is_independent():
+    hash_index, sorted_index = HashIndex('amount'), SortedIndex('amount')
+    for index in hash_index, sorted_index:
+        index.build([(1, 5), (2, 7)])
+        copy = index.copy()
+        copy.remove(1)
+        copy.add(3, 5)
+        assert sorted(index.lookup(Eq('amount', 5))) == [1]
+        assert sorted(copy.lookup(Eq('amount', 5))) == [3]
+
+
+@pytest.fixture
+def items():
+    rnd = random.Random(0)
+    return [Item(rnd.choice(['a', 'ab', 'b', None]), rnd.choice([None, *range(20)]))
+            for _ in range(300)]
+
+
+@pytest.fixture
+def repos(items):
+    plain = MemoryRepository()
+    indexed = MemoryRepository(hash_indexes=['group', 'amount'],
+                               sorted_indexes=['amount', 'group'])
+    plain.add_many([replace(i) for i in items])
+    indexed.add_many([replace(i) for i in items[:100]])
+    indexed.create_index('pk', 'sorted')
+    indexed.add_many([replace(i) for i in items[100:]])
+    for repo in (plain, indexed):
+        repo.update(Item('b', 7, pk=1))
+        repo.update_many([Item(None, None, pk=2), Item('a', 19, pk=3)])
+        repo.delete(4)
+        repo.delete_many([5, 6])
+    return plain, indexed
+
+
+@pytest.mark.parametrize('where', [
+    None, {'group': 'a'}, Eq('amount', None), In('group', ['a', 'b']),
+    Lt('amount', 5), Le('amount', 5), Gt('amount', 15), Ge('amount', 15),
+    Between('amount', 3, 6), StartsWith('group', 'a'), Like('group', 'a%'),
+    Eq('group', 'a') & Between('amount', 2, 10), Eq('group', 'b') | Gt('amount', 17),
+    Eq('group', 'b') | Ne('amount', 17), Ne('group', 'a'), Eq('pk', 10),
+    Lt('amount', None), Ge('group', None), StartsWith('group', '\U0010ffff'),
+    In('group', ['a', None]), In('amount', [None]),
+])
+@pytest.mark.parametrize('order_by', [None, 'amount', '-amount', 'group', '-pk'])
+def test_indexed_matches_scan(repos, where, order_by):
+    plain, indexed = repos
+    assert indexed.get_all(where, order_by) == plain.get_all(where, order_by)
+    assert indexed.get_all(where, order_by, limit=7) == \
+        plain.get_all(where, order_by, limit=7)
+    after = plain.get_all(where, order_by or 'pk', limit=20)[-1:]
+    if after:
+        assert list(indexed.iter_all(where, order_by=order_by or 'pk',
+                                     after=after[0], limit=10)) == \
+            plain.get_all(where, order_by or 'pk', limit=10, after=after[0])
+
+
+def test_incomparable_value_keeps_repository_consistent():
+    repo = MemoryRepository(sorted_indexes=['amount'])
+    repo.add_many([Item('a', 1), Item('b', 2)])
+    item = Item('c', 'x')
+    with pytest.raises(TypeError):
+        repo.add(item)
+    assert item.pk == 0
+    with pytest.raises(TypeError):
+        repo.update(Item('a', 'x', pk=1))
+    assert repo.get_all(order_by='amount') == [Item('a', 1, pk=1), Item('b', 2, pk=2)]
+    assert repo.get_all(Eq('amount', 1)) == [Item('a', 1, pk=1)]
+
+
+def test_invalid_index_kind():
+    with pytest.raises(ValueError):
+        MemoryRepository().create_index('amount', 'btree')
@@ -1,4 +1,8 @@
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Gt, In, Lt
+
+from inspect import isgenerator
 
 import pytest
 
@@ -59,6 +63,15 @@ def test_get_all(repo, custom_class):
     assert repo.get_all() == objects
 
 
+def test_get_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    repo.add_many(objects)
+    result = repo.get_many([3, 10, 1])
+    assert result == {3: objects[2], 1: objects[0]}
+    assert list(result) == [3, 1]
+    assert repo.get_many([]) == {}
+
+
 def test_get_all_with_condition(repo, custom_class):
     objects = []
     for i in range(5):
@@ -69,3 +82,119 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    objects[1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    new_objects = []
+    for pk in pks:
+        o = custom_class()
+        o.pk = pk
+        new_objects.append(o)
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == [objects[2]]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[2], pks[0]])
+    assert repo.get_all() == [objects[2]]
+
+
+def test_iter_all(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.name = str(i % 2)
+        objects.append(o)
+    repo.add_many(objects)
+    gen = repo.iter_all()
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'name': '1'})) == [objects[1], objects[3]]
+
+
+@pytest.fixture
+def dated_objects(repo, custom_class):
+    objects = []
+    for date in ['2023-01-02', None, '2023-01-01', '2023-01-02', None, '2023-01-03']:
+        o = custom_class()
+        o.date = date
+        objects.append(o)
+    repo.add_many(objects)
+    return objects
+
+
+def test_get_all_order_by(repo, dated_objects):
+    o = dated_objects
+    assert repo.get_all(order_by='date') == [o[1], o[4], o[2], o[0], o[3], o[5]]
+    assert repo.get_all(order_by='-date') == [o[5], o[3], o[0], o[2], o[4], o[1]]
+    assert repo.get_all(order_by='-date', limit=2) == [o[5], o[3]]
+    assert repo.get_all(limit=2) == [o[0], o[1]]
+    with pytest.raises(ValueError):
+        repo.get_all(limit=-1)
+
+
+@pytest.mark.parametrize('order_by', [None, 'date', '-date', '-pk'])
+def test_get_all_keyset_pagination(repo, dated_objects, order_by):
+    expected = repo.get_all(order_by=order_by)
+    pages = []
+    page = repo.get_all(order_by=order_by, limit=2)
+    while page:
+        pages.extend(page)
+        page = repo.get_all(order_by=order_by, limit=2, after=page[-1])
+    assert pages == expected
+    assert list(repo.iter_all(order_by=order_by, after=expected[0])) == expected[1:]
+
+
+def test_get_all_with_query(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.value = i
+        objects.append(o)
+    repo.add_many(objects)
+    assert repo.get_all(Between('value', 1, 2)) == objects[1:3]
+    assert repo.get_all(In('value', [0, 4]) | Gt('value', 2)) == \
+        [objects[0]] + objects[3:]
+    assert list(repo.iter_all(Lt('value', 2))) == objects[:2]
+
+
+def test_subscribe(repo, custom_class):
+    received = []
+    unsubscribe = repo.subscribe(received.append)
+    pk = repo.add(custom_class())
+    pks = repo.add_many([custom_class(), custom_class()])
+    repo.update(repo.get(pk))
+    repo.delete_many(pks)
+    with repo.changes.batch():
+        repo.delete(pk)
+        repo.add(custom_class())
+    unsubscribe()
+    repo.add(custom_class())
+    assert [[(c.kind, c.model, c.pk) for c in changes] for changes in received] == [
+        [(ADDED, custom_class, pk)],
+        [(ADDED, custom_class, pks[0]), (ADDED, custom_class, pks[1])],
+        [(UPDATED, custom_class, pk)],
+        [(DELETED, custom_class, pks[0]), (DELETED, custom_class, pks[1])],
+        [(DELETED, custom_class, pk), (ADDED, custom_class, pks[1] + 1)],
+    ]
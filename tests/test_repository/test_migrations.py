@@ -0,0 +1,133 @@
+import pytest
+
+from bookkeeper.repository.migrations import (
+    AddColumn, CreateIndex, Migration, Migrator, RewriteData, RunSQL)
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = ConnectionManager(str(tmp_path / 'test.db'))
+    with connection.transaction() as con:
+        con.execute('CREATE TABLE expense(pk INTEGER PRIMARY KEY, amount)')
+        con.executemany('INSERT INTO expense (amount) VALUES (?)',
+                        [('10',), ('2.5',), (3,), ('7',), ('1',)])
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def migrations():
+    return [
+        Migration(1, 'comment column', AddColumn('expense', 'comment', 'TEXT', '')),
+        Migration(2, 'integer amounts',
+                  RewriteData('expense', ('amount',),
+                              lambda amount: (int(float(amount) * 100),),
+                              batch_size=2),
+                  CreateIndex('expense', ('amount',))),
+    ]
+
+
+def rows(connection, columns='amount, comment'):
+    with connection.connect() as con:
+        return con.execute(f'SELECT {columns} FROM expense ORDER BY pk').fetchall()
+
+
+def test_migrate(connection, migrations):
+    migrator = Migrator(connection, migrations)
+    assert migrator.current_version() == 0
+    assert migrator.pending() == migrations
+    progress = []
+    assert migrator.migrate(progress=progress.append) == 2
+    assert rows(connection) == [(1000, ''), (250, ''), (300, ''), (700, ''), (100, '')]
+    with connection.connect() as con:
+        indexes = [row[1] for row in con.execute('PRAGMA index_list(expense)')]
+    assert indexes == ['idx_expense_amount']
+    assert [(p.version, p.operation, p.done, p.total) for p in progress] == [
+        (1, 0, 1, 1), (2, 0, 2, 5), (2, 0, 4, 5), (2, 0, 5, 5), (2, 1, 1, 1)]
+    assert migrator.pending() == []
+    assert migrator.migrate() == 2
+
+
+def test_migrate_step_by_step(connection, migrations):
+    migrator = Migrator(connection, migrations)
+    assert migrator.migrate(target=1) == 1
+    assert rows(connection)[0] == ('10', '')
+    assert migrator.pending() == migrations[1:]
+    with pytest.raises(ValueError):
+        migrator.migrate(target=0)
+    assert migrator.migrate() == 2
+
+
+def test_interrupted_migration_is_repeated(connection):
+    def convert(amount):
+        if amount == '7':
+            raise RuntimeError('interrupted')
+        return (int(float(amount)),)
+    migrator = Migrator(connection, [
+        Migration(1, 'integer amounts', RewriteData('expense', ('amount',), convert,
+                                                    batch_size=2))])
+    with pytest.raises(RuntimeError):
+        migrator.migrate()
+    assert migrator.current_version() == 0
+    assert [r[0] for r in rows(connection, 'amount')[:4]] == [10, 2, 3, '7']
+    migrator = Migrator(connection, [
+        Migration(1, 'integer amounts', RewriteData('expense', ('amount',),
+                                                    lambda a: (int(float(a)),)))])
+    assert migrator.migrate() == 1
+    assert [r[0] for r in rows(connection, 'amount')] == [10, 2, 3, 7, 1]
+
+
+def test_add_column_is_idempotent(connection):
+    migration = Migration(1, 'comment', AddColumn('expense', 'comment'),
+                          AddColumn('expense', 'comment'),
+                          RunSQL('CREATE TABLE IF NOT EXISTS log(pk INTEGER)'))
+    assert Migrator(connection, [migration]).migrate() == 1
+
+
+def test_newer_database(connection, migrations):
+    Migrator(connection, migrations).migrate()
+    with pytest.raises(ValueError):
+        Migrator(connection, migrations[:1]).migrate()
+
+
+@pytest.mark.parametrize('versions', [[2], [1, 1], [1, 3]])
+def test_invalid_versions(connection, versions):
+    with pytest.raises(ValueError):
+        Migrator(connection, [Migration(v, '') for v in versions])
+
+
+def test_invalid_migrations(connection):
+    with pytest.raises(ValueError):
+        Migration(0, '')
+    with pytest.raises(ValueError):
+        Migrator(connection,
+                 [Migration(1, '', AddColumn('expense', 'x; DROP'))]).migrate()
+    with pytest.raises(ValueError):
+        Migrator(connection, [Migration(1, '', RewriteData(
+            'expense', ('amount',), lambda a: (a, a)))]).migrate()
+
+
+def test_new_database_gets_latest_version(tmp_path, migrations):
+    with ConnectionManager(str(tmp_path / 'new.db')) as connection:
+        progress = []
+        assert Migrator(connection, migrations).migrate(progress=progress.append) == 2
+        assert progress == []
+
+
+def test_atomic_migration_is_rolled_back(connection):
+    def convert(amount):
+        if amount == '7':
+            raise RuntimeError('interrupted')
+        return (int(float(amount)),)
+    migrator = Migrator(connection, [
+        Migration(1, 'integer amounts', AddColumn('expense', 'comment'),
+                  RewriteData('expense', ('amount',), convert, batch_size=2),
+                  atomic=True)])
+    with pytest.raises(RuntimeError):
+        migrator.migrate()
+    assert migrator.current_version() == 0
+    assert rows(connection, 'amount') == [('10',), ('2.5',), (3,), ('7',), ('1',)]
+    with connection.connect() as con:
+        columns = [row[1] for row in con.execute('PRAGMA table_info(expense)')]
+    assert 'comment' not in columns
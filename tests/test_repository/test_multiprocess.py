@@ -0,0 +1,71 @@
+import multiprocessing
+import time
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.sqlite_connection import ConnectionManager, PERFORMANCE_PRAGMAS
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+WRITERS = 4
+TRANSACTIONS = 50
+BATCH = 10
+
+
+@dataclass
+class Record:
+    worker: int
+    seq: int
+    pk: int = 0
+
+
+def write_records(db_file, pragmas, worker):
+    """
+    Записать TRANSACTIONS транзакций по BATCH объектов и одиночные объекты
+    между ними; вернуть число записанных объектов
+    """
+    with ConnectionManager(db_file, pragmas) as manager:
+        repo = SQLiteRepository(db_file, Record, manager)
+        seq = 0
+        for _ in range(TRANSACTIONS):
+            with repo.transaction():
+                repo.add_many(Record(worker, seq + i) for i in range(BATCH))
+            repo.add(Record(worker, seq + BATCH))
+            seq += BATCH + 1
+    return seq
+
+
+def read_records(db_file, pragmas, stop):
+    """ Читать базу данных, пока не установлено событие stop """
+    reads = 0
+    with ConnectionManager(db_file, pragmas) as manager:
+        repo = SQLiteRepository(db_file, Record, manager)
+        while reads == 0 or not stop.is_set():
+            repo.aggregate('count')
+            reads += 1
+    return reads
+
+
+@pytest.mark.parametrize('pragmas', [{}, PERFORMANCE_PRAGMAS], ids=['delete', 'wal'])
+def test_concurrent_writers(tmp_path, pragmas, record_property):
+    db_file = str(tmp_path / 'test.db')
+    with ConnectionManager(db_file, pragmas) as manager:
+        SQLiteRepository(db_file, Record, manager)
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as sync, context.Pool(WRITERS + 1) as pool:
+        stop = sync.Event()
+        reader = pool.apply_async(read_records, (db_file, pragmas, stop))
+        start = time.perf_counter()
+        written = pool.starmap(write_records,
+                               [(db_file, pragmas, worker) for worker in range(WRITERS)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        assert reader.get(30) > 0
+    with ConnectionManager(db_file) as manager:
+        records = SQLiteRepository(db_file, Record, manager).get_all()
+    record_property('objects_per_second', round(sum(written) / elapsed))
+    record_property('transactions_per_second',
+                    round(WRITERS * TRANSACTIONS * 2 / elapsed))
+    for worker, count in enumerate(written):
+        assert sorted(r.seq for r in records if r.worker == worker) == list(range(count))
+    assert len(records) == sum(written)
@@ -0,0 +1,123 @@
+import sqlite3
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.path_repository import PathRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def repo(db_file):
+    """ food(1) -> (fruit(3) -> apple(5), meat(4)), car(2) """
+    repo = PathRepository(db_file, Category)
+    Category.create_from_tree([('food', None), ('car', None), ('fruit', 'food'),
+                               ('meat', 'food'), ('apple', 'fruit')], repo)
+    yield repo
+    repo.close()
+
+
+def paths(repo):
+    return {cat.name: repo.get_path(cat.pk) for cat in repo.get_all()}
+
+
+def test_paths_on_add(repo):
+    assert paths(repo) == {'food': '/1/', 'car': '/2/', 'fruit': '/1/3/',
+                           'meat': '/1/4/', 'apple': '/1/3/5/'}
+    pk = repo.add(Category('pear', 3))
+    assert repo.get_path(pk) == '/1/3/6/'
+    assert repo.get_path(100) is None
+
+
+def test_move_subtree(repo):
+    repo.update(Category('fruit', 2, 3))
+    assert paths(repo) == {'food': '/1/', 'car': '/2/', 'fruit': '/2/3/',
+                           'meat': '/1/4/', 'apple': '/2/3/5/'}
+    repo.update_many([Category('fruit', None, 3), Category('car', 4, 2)])
+    assert paths(repo) == {'food': '/1/', 'car': '/1/4/2/', 'fruit': '/3/',
+                           'meat': '/1/4/', 'apple': '/3/5/'}
+
+
+def test_move_under_descendant_is_rejected(repo):
+    with pytest.raises(sqlite3.IntegrityError):
+        repo.update(Category('food', 5, 1))
+    with pytest.raises(sqlite3.IntegrityError):
+        repo.update(Category('food', 1, 1))
+    assert repo.get(1).parent is None and repo.get_path(5) == '/1/3/5/'
+
+
+def test_parent_added_after_children(repo):
+    orphan = repo.add(Category('orphan', 8))
+    child = repo.add(Category('child', orphan))
+    assert repo.get_path(child) == '/6/7/'
+    assert repo.add(Category('parent', 1)) == 8
+    assert repo.get_path(orphan) == '/1/8/6/' and repo.get_path(child) == '/1/8/6/7/'
+    assert [c.name for c in repo.get_subtree(8)] == ['orphan', 'child']
+    repo.delete(8)
+    repo.update(Category('orphan', 8, orphan))
+    assert repo.get_path(child) == '/6/7/'
+    assert repo.add(Category('new parent', 2)) == 8
+    assert repo.get_path(orphan) == '/2/8/6/' and repo.get_path(child) == '/2/8/6/7/'
+
+
+def test_parent_added_under_its_child_is_rejected(repo):
+    orphan = repo.add(Category('orphan', 20))
+    with pytest.raises(sqlite3.IntegrityError):
+        with repo.connection.transaction() as con:
+            con.execute("INSERT INTO category (pk, name, parent) VALUES (20, 'x', ?)",
+                        (orphan,))
+    assert repo.get(20) is None and repo.get_path(orphan) == f'/{orphan}/'
+
+
+def test_path_index(repo, db_file):
+    for indexes in (repo.list_indexes(),
+                    PathRepository(db_file, Category, repo.connection).list_indexes()):
+        assert indexes['ix_category_path'] == ('path',)
+        assert 'category_path' not in indexes
+
+
+def test_subtree_and_ancestors(repo):
+    assert [c.name for c in repo.get_subtree(1)] == ['fruit', 'meat', 'apple']
+    assert repo.get_subtree(2) == [] and repo.get_subtree(100) == []
+    assert [c.name for c in repo.get_ancestors(5)] == ['fruit', 'food']
+    assert repo.get_ancestors(1) == [] and repo.get_ancestors(100) == []
+
+
+def test_paths_of_existing_table(db_file):
+    with SQLiteRepository(db_file, Category) as plain:
+        Category.create_from_tree([('a', None), ('b', 'a'), ('c', 'b'), ('d', None)],
+                                  plain)
+        plain.add(Category('orphan', 100))
+    with PathRepository(db_file, Category) as repo:
+        assert paths(repo) == {'a': '/1/', 'd': '/2/', 'b': '/1/3/', 'c': '/1/3/4/',
+                               'orphan': '/5/'}
+
+
+def test_get_in_subtree(repo):
+    expenses = SQLiteRepository(repo.db_file, Expense, repo.connection)
+    for amount, category in [(1, 5), (2, 4), (3, 2), (4, 3), (5, 1)]:
+        expenses.add(Expense(amount, category))
+    assert [e.amount for e in repo.get_in_subtree(3, expenses, 'category')] == [1, 4]
+    assert len(repo.get_in_subtree(1, expenses, 'category')) == 4
+    assert repo.get_in_subtree(100, expenses, 'category') == []
+    with pytest.raises(ValueError):
+        repo.get_in_subtree(1, expenses, 'unknown')
+
+
+def test_get_in_subtree_by_name(repo):
+    @dataclass
+    class Purchase:
+        category: str
+        pk: int = 0
+
+    purchases = SQLiteRepository(repo.db_file, Purchase, repo.connection)
+    purchases.add_many([Purchase('apple'), Purchase('car'), Purchase('food')])
+    found = repo.get_in_subtree(1, purchases, 'category', key='name')
+    assert [p.category for p in found] == ['apple', 'food']
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.query import (
+    And, Between, Eq, Ge, Gt, In, Le, Like, Lt, Ne, Or, StartsWith, as_condition)
+
+
+@dataclass
+class Obj:
+    name: str | None = 'name'
+    value: int | None = 0
+
+
+@pytest.mark.parametrize('condition, sql, params', [
+    (Eq('value', 1), 'value = ?', [1]),
+    (Eq('value', None), 'value IS NULL', []),
+    (Ne('value', None), 'value IS NOT NULL', []),
+    (Lt('value', 1), 'value < ?', [1]),
+    (Ge('value', 1), 'value >= ?', [1]),
+    (Between('value', 1, 3), 'value BETWEEN ? AND ?', [1, 3]),
+    (In('value', [1, 2]), 'value IN (?, ?)', [1, 2]),
+    (In('value', []), '0', []),
+    (StartsWith('name', 'ab'), '(name >= ? AND name < ?)', ['ab', 'ac']),
+    (StartsWith('name', 'a\U0010ffff'), '(name >= ? AND name < ?)',
+     ['a\U0010ffff', 'b']),
+    (StartsWith('name', '\U0010ffff'), 'name >= ?', ['\U0010ffff']),
+    (Like('name', 'a%'), 'name LIKE ?', ['a%']),
+    (Eq('value', 1) | Gt('value', 5) & Lt('value', 7),
+     '(value = ?) OR ((value > ?) AND (value < ?))', [1, 5, 7]),
+])
+def test_to_sql(condition, sql, params):
+    assert condition.to_sql() == (sql, params)
+
+
+@pytest.mark.parametrize('condition, expected', [
+    (Eq('value', 1), [False, True, False, False]),
+    (Eq('value', None), [False, False, False, True]),
+    (Ne('value', 1), [True, False, True, False]),
+    (Lt('value', 2), [True, True, False, False]),
+    (Le('value', 1), [True, True, False, False]),
+    (Gt('value', 0), [False, True, True, False]),
+    (Lt('value', None), [False, False, False, False]),
+    (Between('value', None, 2), [False, False, False, False]),
+    (Between('value', 1, 2), [False, True, True, False]),
+    (In('value', [0, 2]), [True, False, True, False]),
+    (In('value', [[0]]), [False, False, False, False]),
+    (In('value', [2, None]), [False, False, True, False]),
+    (StartsWith('name', 'ab'), [True, True, False, False]),
+    (Like('name', 'A_%'), [True, True, False, False]),
+    (Like('name', '%C'), [False, True, False, False]),
+    (Like('name', 'a.'), [False, False, False, False]),
+    (Gt('value', 0) & StartsWith('name', 'ab'), [False, True, False, False]),
+    (Eq('value', 0) | Eq('name', None), [True, False, False, True]),
+    (as_condition({'value': 2, 'name': 'a'}), [False, False, True, False]),
+    (as_condition({}), [True, True, True, True]),
+])
+def test_to_predicate(condition, expected):
+    objs = [Obj('ab', 0), Obj('abc', 1), Obj('a', 2), Obj(None, None)]
+    predicate = condition.to_predicate()
+    assert [predicate(o) for o in objs] == expected
+
+
+def test_fields():
+    condition = Eq('a', 1) & (In('b', [1]) | Like('c', '%'))
+    assert condition.fields() == {'a', 'b', 'c'}
+    assert And().to_sql() == ('1', [])
+    assert Or().to_sql() == ('0', [])
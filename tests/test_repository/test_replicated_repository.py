@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED, Change
+from bookkeeper.repository.query import Between
+from bookkeeper.repository.replicated_repository import ReplicatedRepository
+from bookkeeper.repository.sqlite_connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Item:
+    name: str
+    amount: int = 0
+    pk: int = 0
+
+
+@dataclass
+class Other:
+    value: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = ConnectionManager(str(tmp_path / 'test.db'))
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def store(tmp_path, connection):
+    return SQLiteRepository(connection.db_file, Item, connection)
+
+
+@pytest.fixture
+def repo(store):
+    return ReplicatedRepository(store, hash_indexes=['name'], sorted_indexes=['amount'])
+
+
+def test_writes_go_to_store(repo, store):
+    obj = Item('a', 1)
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    assert store.get(pk) == obj == repo.get(pk)
+    pks = repo.add_many([Item('b', 2), Item('c', 3)])
+    repo.update(Item('a', 10, pk=pk))
+    repo.update_many([Item('b', 20, pk=pks[0])])
+    repo.delete(pks[1])
+    assert repo.get_all() == store.get_all() == [Item('a', 10, pk), Item('b', 20, pks[0])]
+    repo.delete_many([pk])
+    repo.delete(100)
+    assert repo.get_all() == store.get_all() == [Item('b', 20, pks[0])]
+
+
+def test_reads_come_from_replica(repo, store):
+    store.add_many([Item('a', 1), Item('b', 2), Item('a', 3)])
+    assert repo.get_all({'name': 'a'}) == store.get_all({'name': 'a'})
+    store.add(Item('d', 4))
+    assert len(repo.get_all()) == 3
+    assert repo.get(4) is None
+    repo.refresh()
+    assert repo.get(4) == Item('d', 4, 4)
+    assert repo.get_many([4, 1]) == store.get_many([4, 1])
+    assert repo.get_all(Between('amount', 2, 3), order_by='-amount') == \
+        store.get_all(Between('amount', 2, 3), order_by='-amount')
+    assert list(repo.iter_all(order_by='amount', limit=2)) == store.get_all(limit=2)
+    assert repo.aggregate('sum', 'amount', group_by='name') == \
+        store.aggregate('sum', 'amount', group_by='name')
+
+
+def test_replica_stores_database_values(repo):
+    pk = repo.add(Item('a', '5'))
+    assert repo.get(pk).amount == 5
+
+
+def test_rollback_resyncs_replica(repo, store, connection):
+    other = ReplicatedRepository(SQLiteRepository(connection.db_file, Other, connection))
+    repo.add(Item('a', 1))
+    with pytest.raises(RuntimeError):
+        with repo.transaction(), other.transaction():
+            repo.add(Item('b', 2))
+            other.add(Other(1))
+            repo.delete(1)
+            raise RuntimeError
+    assert repo.get_all() == store.get_all() == [Item('a', 1, 1)]
+    assert other.get_all() == []
+
+
+def test_drop_table(repo, store):
+    repo.add(Item('a'))
+    repo.drop_table()
+    assert repo.get_all() == []
+
+
+def test_changes_are_published_after_sync(repo, connection):
+    received = []
+
+    def listener(changes):
+        received.extend(changes)
+        last = {change.pk: change.kind for change in changes}
+        for pk, kind in last.items():
+            assert (repo.get(pk) is None) == (kind == DELETED)
+
+    repo.subscribe(listener)
+    pk = repo.add(Item('a'))
+    repo.update(Item('b', 1, pk))
+    pks = repo.add_many([Item('c'), Item('d')])
+    repo.delete(pks[0])
+    repo.delete(pks[0])
+    repo.update(Item('x', 0, 100))
+    repo.update_many([Item('x', 0, 100)])
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.delete_many(pks)
+            raise RuntimeError
+    with repo.transaction():
+        repo.update_many([Item('e', 0, pk)])
+        repo.delete_many([pk, pks[1]])
+    assert received == [Change(ADDED, Item, pk), Change(UPDATED, Item, pk),
+                        Change(ADDED, Item, pks[0]), Change(ADDED, Item, pks[1]),
+                        Change(DELETED, Item, pks[0]), Change(UPDATED, Item, pk),
+                        Change(DELETED, Item, pk), Change(DELETED, Item, pks[1])]
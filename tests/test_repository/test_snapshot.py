@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository import snapshot
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt
+from bookkeeper.repository.snapshot import ChangeLog, read_snapshot, write_snapshot
+
+
+@dataclass
+class Item:
+    name: str
+    amount: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'repo.snapshot'), str(tmp_path / 'repo.log')
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    write_snapshot(path, 3, [Item('a', pk=1), Item('b', pk=2)])
+    assert read_snapshot(path) == (3, [Item('a', pk=1), Item('b', pk=2)])
+    with open(path, 'wb') as file:
+        file.write(b'garbage')
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+
+
+def test_change_log_drops_torn_record(tmp_path):
+    path = str(tmp_path / 'log')
+    log = ChangeLog(path)
+    log.append('put', [1])
+    log.append('delete', [2])
+    log.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x80\x05\x95')
+    log = ChangeLog(path)
+    assert list(log.replay()) == [('put', [1]), ('delete', [2])]
+    log.append('put', [3])
+    assert list(log.replay()) == [('put', [1]), ('delete', [2]), ('put', [3])]
+    log.clear()
+    assert list(log.replay()) == []
+    log.close()
+
+
+def test_change_log_append_is_durable(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(snapshot.os, 'fsync', synced.append)
+    log = ChangeLog(str(tmp_path / 'log'))
+    log.append('put', [1])
+    assert synced == [log._file.fileno()]
+    log.close()
+
+
+def test_dump_and_load(paths):
+    snapshot, log = paths
+    repo = MemoryRepository()
+    repo.add_many([Item('a', 1), Item('b', 2), Item('c', 3)])
+    repo.delete(3)
+    repo.dump(snapshot)
+    loaded = MemoryRepository()
+    loaded.load(snapshot)
+    assert loaded.get_all() == repo.get_all()
+    assert loaded.add(Item('d')) == 4
+
+
+def test_log_is_replayed(paths):
+    snapshot, log = paths
+    repo = MemoryRepository()
+    repo.load(snapshot, log)
+    repo.add_many([Item('a', 1), Item('b', 2)])
+    repo.dump(snapshot)
+    repo.add(Item('c', 3))
+    repo.update(Item('a', 10, pk=1))
+    repo.delete(2)
+    repo.update_many([Item('c', 30, pk=3)])
+    repo.add_many([Item('d', 4), Item('e', 5)])
+    repo.delete_many([5])
+    expected = repo.get_all()
+    repo.close()
+
+    loaded = MemoryRepository(sorted_indexes=['amount'])
+    loaded.load(snapshot, log)
+    assert loaded.get_all() == expected
+    assert loaded.get_all(Gt('amount', 5), order_by='-amount') == [
+        Item('c', 30, pk=3), Item('a', 10, pk=1)]
+    assert loaded.add(Item('f')) == 6
+    loaded.dump(snapshot)
+    loaded.close()
+
+    again = MemoryRepository()
+    again.load(snapshot, log)
+    assert [o.name for o in again.get_all()] == ['a', 'c', 'd', 'f']
+    again.close()
+
+
+def test_load_replaces_contents(paths):
+    snapshot, _ = paths
+    repo = MemoryRepository(hash_indexes=['name'])
+    repo.add(Item('a'))
+    repo.load(snapshot)
+    assert repo.get_all() == []
+    assert repo.get_all({'name': 'a'}) == []
+    assert repo.add(Item('b')) == 1
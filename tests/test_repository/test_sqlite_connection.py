@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from bookkeeper.repository.sqlite_connection import (
+    ConnectionManager, PERFORMANCE_PRAGMAS, RetryPolicy, is_busy)
+
+DB_FILE = 'test.db'
+
+
+@pytest.fixture
+def manager():
+    manager = ConnectionManager(DB_FILE)
+    yield manager
+    manager.close()
+
+
+def test_persistent_connection_is_reused(manager):
+    with manager.connect() as con1:
+        pass
+    with manager.connect() as con2:
+        pass
+    assert con1 is con2
+
+
+def test_connection_per_call():
+    manager = ConnectionManager(DB_FILE, persistent=False)
+    with manager.connect() as con1:
+        with manager.connect() as nested:
+            assert nested is con1
+    with manager.connect() as con2:
+        pass
+    assert con1 is not con2
+    with pytest.raises(sqlite3.ProgrammingError):
+        con1.execute('SELECT 1')
+
+
+def test_connection_per_thread(manager):
+    connections = []
+
+    def worker():
+        with manager.connect() as con:
+            connections.append(con)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with manager.connect() as con:
+        connections.append(con)
+    assert len({id(c) for c in connections}) == 4
+
+
+def test_connections_of_finished_threads_are_closed(manager):
+    connections = []
+
+    def worker():
+        with manager.connect() as con:
+            connections.append(con)
+
+    for _ in range(3):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    with manager.connect() as con:
+        con.execute('SELECT 1')
+    assert len(manager._connections) == 1
+    for old in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            old.execute('SELECT 1')
+
+
+def test_pragmas(tmp_path):
+    pragmas = PERFORMANCE_PRAGMAS | {'cache_size': -1000}
+    with ConnectionManager(str(tmp_path / 'test.db'), pragmas) as manager:
+        with manager.connect() as con:
+            assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert con.execute('PRAGMA cache_size').fetchone()[0] == -1000
+            assert con.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_invalid_pragma():
+    with pytest.raises(ValueError):
+        ConnectionManager(DB_FILE, {'journal_mode': 'WAL; DROP TABLE x'})
+    with pytest.raises(ValueError):
+        ConnectionManager(DB_FILE, {'bad name': 1})
+
+
+def test_transaction_rollback(manager):
+    with manager.transaction() as con:
+        con.execute('CREATE TABLE IF NOT EXISTS tr_test (x)')
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as con:
+            con.execute('INSERT INTO tr_test VALUES (1)')
+            raise RuntimeError
+    with manager.connect() as con:
+        assert con.execute('SELECT count(*) FROM tr_test').fetchone()[0] == 0
+        con.execute('DROP TABLE tr_test')
+
+
+def test_closed_manager(manager):
+    manager.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        with manager.connect():
+            pass
+
+
+def test_retry_policy_delays():
+    delays = list(RetryPolicy(attempts=6, delay=0.1, max_delay=0.5).delays())
+    assert len(delays) == 5
+    for delay, limit in zip(delays, [0.1, 0.2, 0.4, 0.5, 0.5]):
+        assert limit / 2 <= delay <= limit
+    assert not list(RetryPolicy(attempts=1).delays())
+
+
+def test_is_busy(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    holder = sqlite3.connect(db_file, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    other = sqlite3.connect(db_file, timeout=0, isolation_level=None)
+    with pytest.raises(sqlite3.OperationalError) as error:
+        other.execute('BEGIN IMMEDIATE')
+    assert is_busy(error.value)
+    assert not is_busy(sqlite3.OperationalError('no such table: x'))
+    assert not is_busy(ValueError('locked'))
+    holder.rollback()
+
+
+@pytest.fixture
+def locked_db(tmp_path):
+    """ База данных, заблокированная на запись другим соединением """
+    db_file = str(tmp_path / 'test.db')
+    holder = sqlite3.connect(db_file, isolation_level=None, check_same_thread=False)
+    holder.execute('CREATE TABLE t (x)')
+    holder.execute('BEGIN IMMEDIATE')
+    yield db_file, holder
+    holder.close()
+
+
+def test_transaction_begins_immediate(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    with ConnectionManager(db_file) as manager:
+        with manager.transaction():
+            other = sqlite3.connect(db_file, timeout=0, isolation_level=None)
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute('BEGIN IMMEDIATE')
+            other.close()
+
+
+def test_busy_transaction_gives_up(locked_db):
+    db_file, _ = locked_db
+    retry = RetryPolicy(attempts=3, delay=0.01)
+    with ConnectionManager(db_file, busy_timeout=0, retry=retry) as manager:
+        start = time.perf_counter()
+        with pytest.raises(sqlite3.OperationalError) as error:
+            with manager.transaction() as con:
+                con.execute('INSERT INTO t VALUES (1)')
+        assert is_busy(error.value)
+        assert time.perf_counter() - start < 1
+        with manager.connect() as con:
+            assert not con.in_transaction
+
+
+def test_busy_transaction_retries(locked_db):
+    db_file, holder = locked_db
+    retry = RetryPolicy(attempts=20, delay=0.01, max_delay=0.05)
+    timer = threading.Timer(0.1, holder.rollback)
+    timer.start()
+    with ConnectionManager(db_file, busy_timeout=0, retry=retry) as manager:
+        with manager.transaction() as con:
+            con.execute('INSERT INTO t VALUES (1)')
+        with manager.connect() as con:
+            assert con.execute('SELECT count(*) FROM t').fetchone()[0] == 1
+    timer.join()
+
+
+def test_on_commit(manager):
+    calls = []
+    manager.on_commit(calls.append, 'now')
+    with manager.transaction():
+        manager.on_commit(calls.append, 'committed')
+        with manager.transaction():
+            manager.on_commit(calls.append, 'nested')
+        assert calls == ['now']
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            manager.on_commit(calls.append, 'rolled back')
+            raise RuntimeError
+    assert calls == ['now', 'committed', 'nested']
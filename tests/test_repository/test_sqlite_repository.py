@@ -1,6 +1,16 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from inspect import isgenerator
+from typing import Annotated
+
 import pytest
+from bookkeeper.repository.changes import ADDED, DELETED, UPDATED, Change
+from bookkeeper.repository.columns import Money, Timestamp
+from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
-from dataclasses import dataclass
+from bookkeeper.repository.query import Between, Eq, Gt, In, Lt, StartsWith
+from dataclasses import dataclass, replace
 
 DB_FILE = 'test.db'
 
@@ -22,6 +32,7 @@ def repos(custom_class):
     yield repos
     for cls, repo in repos.items():
         repo.drop_table()
+        repo.close()
 
 
 @pytest.fixture
@@ -106,4 +117,467 @@ def test_row_to_obj(repo):
     assert obj.f2 == 'test value'
 
 
+def test_factory_shares_connection(repos, custom_class):
+    @dataclass
+    class Other:
+        pk: int = 0
+        f1: int = 1
+
+    repo = repos[custom_class]
+    other = SQLiteRepository(DB_FILE, Other, repo.connection)
+    with other.connection.connect() as con1, repo.connection.connect() as con2:
+        assert con1 is con2
+    other.drop_table()
+
+
+def test_close(custom_class):
+    with SQLiteRepository(DB_FILE, custom_class, persistent=True) as repo:
+        repo.add(custom_class())
+        repo.drop_table()
+    with pytest.raises(sqlite3.ProgrammingError):
+        repo.get_all()
+
+
+def test_add_many(repo, custom_class):
+    repo.add(custom_class(f1=-1))
+    objects = [custom_class(f1=i) for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert len(set(pks)) == 5
+    assert repo.get_all()[1:] == objects
+    assert repo.add_many([]) == []
+
+
+def test_get_many(repo, custom_class, monkeypatch):
+    import bookkeeper.repository.sqlite_repository as sqlite_repository
+    monkeypatch.setattr(sqlite_repository, 'GET_MANY_CHUNK', 2)
+    objects = [custom_class(f1=i) for i in range(5)]
+    pks = repo.add_many(objects)
+    result = repo.get_many([pks[4], -1, pks[0], pks[2], pks[4]])
+    assert result == {pks[4]: objects[4], pks[0]: objects[0], pks[2]: objects[2]}
+    assert list(result) == [pks[4], pks[0], pks[2]]
+    assert repo.get_many([]) == {}
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class(), custom_class(pk=1)]
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class(f1=i) for i in range(3)])
+    new_objects = [custom_class(pk=pk, f2='updated') for pk in pks]
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class()])
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class(f1=i) for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == [objects[2]]
+    with pytest.raises(ValueError):
+        repo.delete_many([pks[2], 0])
+    assert repo.get_all() == [objects[2]]
+
+
+@pytest.fixture
+def other_class():
+    @dataclass
+    class Other:
+        pk: int = 0
+        name: str = ''
+    return Other
+
+
+@pytest.fixture
+def uow(custom_class, other_class):
+    repos = SQLiteRepository.repo_factory(db_file=DB_FILE,
+                                          models=[custom_class, other_class])
+    yield repos
+    for repo in repos.values():
+        repo.drop_table()
+    repos.close()
+
+
+def test_transaction_commits_all_repos(uow, custom_class, other_class):
+    with uow.transaction():
+        uow[custom_class].add(custom_class())
+        uow[other_class].add(other_class(name='other'))
+    assert len(uow[custom_class].get_all()) == 1
+    assert uow[other_class].get_all() == [other_class(pk=1, name='other')]
+
+
+def test_transaction_rollback(uow, custom_class, other_class):
+    uow[custom_class].add(custom_class())
+    with pytest.raises(RuntimeError):
+        with uow.transaction():
+            uow[custom_class].delete(1)
+            uow[other_class].add_many([other_class(), other_class()])
+            raise RuntimeError
+    assert len(uow[custom_class].get_all()) == 1
+    assert uow[other_class].get_all() == []
+
+
+def test_repository_transaction(repo, custom_class):
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            with repo.transaction():
+                repo.add(custom_class())
+            raise RuntimeError
+    assert repo.get_all() == []
+
+
+def test_pk_last_model():
+    @dataclass
+    class PkLast:
+        name: str
+        parent: int | None = None
+        pk: int = 0
+
+    with SQLiteRepository(DB_FILE, PkLast, persistent=True) as repo:
+        obj = PkLast('child', 1)
+        repo.add(obj)
+        assert repo.get(obj.pk) == obj
+        assert repo.get_all() == [obj]
+        repo.drop_table()
+
 
+def test_non_dataclass_model():
+    class Plain:
+        pk: int
+        name: str
+
+        def __init__(self, name, pk=0):
+            self.name = name
+            self.pk = pk
+
+    with SQLiteRepository(DB_FILE, Plain, persistent=True) as repo:
+        pk = repo.add(Plain('plain'))
+        obj = repo.get(pk)
+        assert (obj.pk, obj.name) == (pk, 'plain')
+        repo.drop_table()
+
+
+def test_iter_all(repo, custom_class):
+    objects = [custom_class(f1=i % 2) for i in range(7)]
+    repo.add_many(objects)
+    gen = repo.iter_all(batch_size=2)
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'f1': 1}, batch_size=3)) == objects[1::2]
+    with pytest.raises(ValueError):
+        next(repo.iter_all(batch_size=0))
+
+
+@pytest.fixture
+def dated_objects(repo, custom_class):
+    objects = [custom_class(f2=date) for date in
+               ['2023-01-02', None, '2023-01-01', '2023-01-02', None, '2023-01-03']]
+    repo.add_many(objects)
+    return objects
+
+
+def test_get_all_order_by(repo, dated_objects):
+    o = dated_objects
+    assert repo.get_all(order_by='f2') == [o[1], o[4], o[2], o[0], o[3], o[5]]
+    assert repo.get_all(order_by='-f2') == [o[5], o[3], o[0], o[2], o[4], o[1]]
+    assert repo.get_all(order_by='-f2', limit=2) == [o[5], o[3]]
+    assert repo.get_all(limit=2) == [o[0], o[1]]
+    with pytest.raises(ValueError):
+        repo.get_all(limit=-1)
+    with pytest.raises(ValueError):
+        repo.get_all(order_by='f2; DROP TABLE custom')
+
+
+@pytest.mark.parametrize('order_by', [None, 'f2', '-f2', '-pk'])
+def test_get_all_keyset_pagination(repo, dated_objects, order_by):
+    expected = repo.get_all(order_by=order_by)
+    pages = []
+    page = repo.get_all(order_by=order_by, limit=2)
+    while page:
+        pages.extend(page)
+        page = repo.get_all(order_by=order_by, limit=2, after=page[-1])
+    assert pages == expected
+    assert list(repo.iter_all(order_by=order_by, after=expected[0])) == expected[1:]
+
+
+def test_get_all_keyset_with_condition(repo, custom_class):
+    objects = [custom_class(f1=i % 2, f2=str(i)) for i in range(6)]
+    repo.add_many(objects)
+    page = repo.get_all({'f1': 0}, order_by='-f2', limit=2)
+    assert page == [objects[4], objects[2]]
+    assert repo.get_all({'f1': 0}, order_by='-f2', after=page[-1]) == [objects[0]]
+
+
+def test_get_all_with_query(repo, custom_class):
+    objects = [custom_class(f1=i, f2=f'2023-01-0{i + 1}', f3=i / 2) for i in range(5)]
+    repo.add_many(objects)
+    assert repo.get_all(Between('f2', '2023-01-02', '2023-01-03')) == objects[1:3]
+    assert repo.get_all(In('f1', [0, 4]) | Gt('f3', 1.2)) == [objects[0]] + objects[3:]
+    assert repo.get_all(StartsWith('f2', '2023-01-0') & Lt('f1', 2)) == objects[:2]
+    assert repo.get_all(Eq('f1', 1) | Eq('f1', 3), order_by='-f1', limit=1) == \
+        [objects[3]]
+    assert list(repo.iter_all(In('pk', [objects[2].pk]))) == [objects[2]]
+    assert repo.get_all(Lt('f1', None)) == []
+    last = custom_class(f2='\U0010ffff\U0010ffffz')
+    repo.add(last)
+    assert repo.get_all(StartsWith('f2', '\U0010ffff')) == [last]
+    with pytest.raises(ValueError):
+        repo.get_all({'unknown': 1})
+
+
+def test_get_all_with_none(repo, custom_class):
+    obj = custom_class(f2=None)
+    repo.add_many([obj, custom_class()])
+    assert repo.get_all({'f2': None}) == [obj]
+
+
+def test_in_with_none_matches_memory(repo, custom_class):
+    repo.add_many([custom_class(f2=None), custom_class(f2='a'), custom_class(f1=None)])
+    memory = MemoryRepository(hash_indexes=['f2'])
+    memory.add_many(replace(o, pk=0) for o in repo.get_all())
+    for where in [In('f2', ['a', None]), In('f2', [None]), In('f1', [1, None]),
+                  Eq('f2', None)]:
+        assert repo.get_all(where) == memory.get_all(where)
+        assert repo.aggregate('count', where=where) == \
+            memory.aggregate('count', where=where)
+    assert repo.get_all(In('f2', ['a', None])) == [custom_class(pk=2, f2='a')]
+
+
+@pytest.fixture
+def dated_amounts(repo, custom_class):
+    objects = [custom_class(f1=1, f2='2023-03-06 10:00:00', f3=10),
+               custom_class(f1=2, f2='2023-03-06 20:00:00', f3=2.5),
+               custom_class(f1=1, f2='2023-03-13 10:00:00', f3=None),
+               custom_class(f1=2, f2='2023-04-01 10:00:00', f3=4)]
+    repo.add_many(objects)
+    return objects
+
+
+def test_aggregate(repo, dated_amounts):
+    assert repo.aggregate('sum', 'f3') == 16.5
+    assert repo.aggregate('count') == 4
+    assert repo.aggregate('count', 'f3') == 3
+    assert repo.aggregate('max', 'f3', where={'f1': 1}) == 10
+    assert repo.aggregate('sum', 'f3', where={'f1': 3}) is None
+    assert repo.aggregate('sum', 'f3', group_by='f1') == {1: 10, 2: 6.5}
+    assert repo.aggregate('sum', 'f3', where=Lt('f2', '2023-04'), group_by='f2',
+                          period='day') == {'2023-03-06': 12.5, '2023-03-13': None}
+    assert repo.aggregate('count', 'f3', group_by='f2', period='month') == \
+        {'2023-03': 2, '2023-04': 1}
+    with pytest.raises(ValueError):
+        repo.aggregate('sum', 'unknown')
+    with pytest.raises(ValueError):
+        repo.aggregate('drop', 'f3')
+
+
+def test_aggregate_matches_memory(repo, dated_amounts):
+    memory = MemoryRepository()
+    memory.add_many(replace(o, pk=0) for o in repo.get_all())
+    for kwargs in [{}, {'group_by': 'f1'}, {'group_by': 'f2', 'period': 'week'},
+                   {'group_by': 'f2', 'period': 'year', 'where': Gt('f3', 3)}]:
+        for func in ['sum', 'count', 'avg', 'min', 'max']:
+            assert repo.aggregate(func, 'f3', **kwargs) == \
+                memory.aggregate(func, 'f3', **kwargs)
+
+
+def test_declared_indexes():
+    @dataclass
+    class Indexed:
+        __indexes__ = ('f1', ('f1', 'f2'))
+        pk: int = 0
+        f1: int = 0
+        f2: str = ''
+
+    with SQLiteRepository(DB_FILE, Indexed, persistent=True) as repo:
+        assert repo.list_indexes() == {'ix_indexed_f1': ('f1',),
+                                       'ix_indexed_f1_f2': ('f1', 'f2')}
+        with repo.connection.connect() as con:
+            plan = con.execute('EXPLAIN QUERY PLAN SELECT * FROM indexed WHERE f1 = 1'
+                               ).fetchall()
+        assert 'ix_indexed_f1' in str(plan)
+
+        Indexed.__indexes__ = (('f2',),)
+        repo = SQLiteRepository(DB_FILE, Indexed, repo.connection)
+        assert repo.list_indexes() == {'ix_indexed_f2': ('f2',)}
+        repo.drop_table()
+
+
+def test_invalid_index():
+    @dataclass
+    class Indexed:
+        __indexes__ = (('unknown',),)
+        pk: int = 0
+
+    with pytest.raises(ValueError):
+        SQLiteRepository(DB_FILE, Indexed)
+
+
+@pytest.fixture
+def typed_repo():
+    @dataclass
+    class Typed:
+        amount: Annotated[Decimal, Money()]
+        date: Annotated[datetime, Timestamp()]
+        comment: str = ''
+        pk: int = 0
+    with SQLiteRepository(DB_FILE, Typed) as repo:
+        yield repo
+        repo.drop_table()
+
+
+def test_typed_columns(typed_repo):
+    with typed_repo.connection.connect() as con:
+        sql = con.execute("SELECT sql FROM sqlite_master WHERE name = 'typed'"
+                          ).fetchone()[0]
+    assert 'amount INTEGER' in sql
+    assert 'date INTEGER' in sql
+    assert 'comment TEXT' in sql
+
+
+def test_typed_round_trip(typed_repo):
+    obj = typed_repo.cls(Decimal('10.25'), datetime(2023, 1, 2, 3, 4, 5))
+    typed_repo.add(obj)
+    assert typed_repo.get(obj.pk) == obj
+    with typed_repo.connection.connect() as con:
+        assert con.execute('SELECT typeof(amount), typeof(date) FROM typed'
+                           ).fetchone() == ('integer', 'integer')
+
+
+def test_typed_query_and_aggregate(typed_repo):
+    cls = typed_repo.cls
+    objs = [cls(Decimal('0.10'), datetime(2023, 1, 1, 10)),
+            cls(Decimal('0.20'), datetime(2023, 1, 1, 20)),
+            cls(Decimal('1.05'), datetime(2023, 2, 1))]
+    typed_repo.add_many(objs)
+    january = Between('date', datetime(2023, 1, 1), datetime(2023, 1, 31))
+    assert typed_repo.get_all(january) == objs[:2]
+    assert typed_repo.get_all(Gt('amount', Decimal('0.15'))) == objs[1:]
+    assert typed_repo.get_all(order_by='-date', limit=1, after=objs[2]) == [objs[1]]
+    assert typed_repo.aggregate('sum', 'amount') == Decimal('1.35')
+    average = typed_repo.aggregate('avg', 'amount', Gt('amount', Decimal('0.15')))
+    assert str(average) == '0.62'
+    assert typed_repo.aggregate('max', 'date') == datetime(2023, 2, 1)
+    assert typed_repo.aggregate('sum', 'amount', group_by='date', period='month') == {
+        '2023-01': Decimal('0.30'), '2023-02': Decimal('1.05')}
+    memory = MemoryRepository()
+    memory.add_many([replace(o, pk=0) for o in objs])
+    assert memory.aggregate('sum', 'amount', group_by='date', period='day') == \
+        typed_repo.aggregate('sum', 'amount', group_by='date', period='day')
+
+
+def test_changes_are_published_after_commit(repo, custom_class):
+    received = []
+
+    def listener(changes):
+        received.append(changes)
+        assert [repo.get(c.pk) is not None for c in changes] == [
+            c.kind != DELETED for c in changes]
+
+    repo.subscribe(listener)
+    pk = repo.add(custom_class())
+    repo.update(custom_class(pk=pk, f1=5))
+    repo.update(custom_class(pk=pk + 100))
+    with repo.transaction():
+        pks = repo.add_many([custom_class(), custom_class()])
+        repo.delete(pk)
+        assert len(received) == 2
+    assert received == [
+        [Change(ADDED, custom_class, pk)], [Change(UPDATED, custom_class, pk)],
+        [Change(ADDED, custom_class, pks[0]), Change(ADDED, custom_class, pks[1]),
+         Change(DELETED, custom_class, pk)]]
+
+
+def test_rolled_back_changes_are_not_published(repo, custom_class):
+    received = []
+    repo.subscribe(received.append)
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            raise RuntimeError
+    with pytest.raises(RuntimeError):
+        with repo.connection.transaction():
+            repo.add(custom_class())
+            raise RuntimeError
+    assert received == []
+
+
+def test_unit_of_work_batches_changes(repos, repo, custom_class):
+    received = []
+    repo.subscribe(received.append)
+    with repos.transaction():
+        pk = repo.add(custom_class())
+        repo.update_many([custom_class(pk=pk, f1=3)])
+        repo.delete_many([pk])
+    assert received == [[Change(ADDED, custom_class, pk),
+                         Change(UPDATED, custom_class, pk),
+                         Change(DELETED, custom_class, pk)]]
+
+
+def test_bulk_changes_publish_only_existing_rows(repo, custom_class):
+    pks = repo.add_many([custom_class(), custom_class()])
+    received = []
+    repo.subscribe(received.append)
+    repo.update_many([custom_class(pk=pks[0], f1=3), custom_class(pk=100)])
+    repo.delete_many([100, pks[1], pks[1]])
+    repo.delete_many([100])
+    assert received == [[Change(UPDATED, custom_class, pks[0])],
+                        [Change(DELETED, custom_class, pks[1])]]
+
+
+@dataclass
+class Node:
+    name: str = ''
+    parent: int | None = None
+    pk: int = 0
+
+
+@pytest.fixture
+def tree_repos(tmp_path):
+    """ Одинаковые деревья в sqlite и в памяти: 1 -> (2 -> (4, 5), 3 -> 6), 7 """
+    sqlite_repo = SQLiteRepository(str(tmp_path / 'tree.db'), Node)
+    memory_repo = MemoryRepository(hash_indexes=['parent'])
+    for repo in sqlite_repo, memory_repo:
+        for name, parent in [('1', None), ('2', 1), ('3', 1), ('4', 2),
+                             ('5', 2), ('6', 3), ('7', None)]:
+            repo.add(Node(name, parent))
+    yield sqlite_repo, memory_repo
+    sqlite_repo.close()
+
+
+def test_get_subtree_and_ancestors(tree_repos):
+    for repo in tree_repos:
+        assert [n.name for n in repo.get_subtree(1)] == ['2', '3', '4', '5', '6']
+        assert [n.name for n in repo.get_subtree(3)] == ['6']
+        assert repo.get_subtree(7) == [] and repo.get_subtree(100) == []
+        assert [n.name for n in repo.get_ancestors(5)] == ['2', '1']
+        assert repo.get_ancestors(1) == [] and repo.get_ancestors(100) == []
+
+
+def test_tree_queries_survive_cycles(tree_repos):
+    for repo in tree_repos:
+        repo.update(Node('1', 5, 1))
+        assert [n.name for n in repo.get_subtree(2)] == ['4', '5', '1', '3', '6']
+        assert [n.name for n in repo.get_ancestors(4)] == ['2', '1', '5']
+
+
+def test_tree_queries_check_field(tree_repos):
+    with pytest.raises(ValueError):
+        tree_repos[0].get_subtree(1, 'unknown')
+
+
+def test_iter_tree(tree_repos):
+    sqlite_repo, memory_repo = tree_repos
+    for repo in tree_repos:
+        repo.add(Node('8', 7))
+        repo.add(Node('orphan', 100))
+    names = ['1', '2', '4', '5', '3', '6', '7', '8']
+    assert [n.name for n in memory_repo.iter_tree()] == names
+    assert isgenerator(sqlite_repo.iter_tree())
+    assert [n.name for n in sqlite_repo.iter_tree(batch_size=3)] == names
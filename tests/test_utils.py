@@ -1,9 +1,12 @@
+import csv
+import io
+import json
 import tempfile
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import read_tree, write_tree
 
 
 def test_create_tree():
@@ -14,7 +17,7 @@ def test_create_tree():
             child2
         parent2
     ''')
-    assert read_tree(text.splitlines()) == [
+    assert list(read_tree(text.splitlines())) == [
         ('parent1', None),
         ('child1', 'parent1'),
         ('grandchild', 'child1'),
@@ -33,7 +36,7 @@ def test_ignore_empty_strings():
 
         parent2
     ''')
-    assert read_tree(text.splitlines()) == [
+    assert list(read_tree(text.splitlines())) == [
         ('parent1', None),
         ('child1', 'parent1'),
         ('grandchild', 'child1'),
@@ -50,7 +53,7 @@ def test_indentation_error():
           child2
     ''')
     with pytest.raises(IndentationError):
-        read_tree(text.splitlines())
+        list(read_tree(text.splitlines()))
 
 
 def test_with_file():
@@ -64,10 +67,61 @@ def test_with_file():
     with tempfile.TemporaryFile('w+') as f:
         f.write(text)
         f.seek(0)
-        assert read_tree(f) == [
+        assert list(read_tree(f)) == [
             ('parent1', None),
             ('child1', 'parent1'),
             ('grandchild', 'child1'),
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_read_tree_is_lazy():
+    def lines():
+        yield 'parent'
+        yield '    child'
+        raise AssertionError('read too far')
+
+    pairs = read_tree(lines())
+    assert next(pairs) == ('parent', None)
+    assert next(pairs) == ('child', 'parent')
+
+
+PAIRS = [('parent1', None), ('child1', 'parent1'), ('grandchild', 'child1'),
+         ('child2', 'parent1'), ('parent2', None)]
+
+
+def test_write_tree_round_trip():
+    out = io.StringIO()
+    write_tree(iter(PAIRS), out, indent=2)
+    assert out.getvalue().splitlines()[:3] == ['parent1', '  child1', '    grandchild']
+    out.seek(0)
+    assert list(read_tree(out)) == PAIRS
+
+
+def test_write_tree_json():
+    out = io.StringIO()
+    write_tree(PAIRS, out, 'json')
+    assert json.loads(out.getvalue()) == [
+        {'name': 'parent1', 'children': [
+            {'name': 'child1', 'children': [{'name': 'grandchild', 'children': []}]},
+            {'name': 'child2', 'children': []}]},
+        {'name': 'parent2', 'children': []}]
+    out = io.StringIO()
+    write_tree([], out, 'json')
+    assert json.loads(out.getvalue()) == []
+
+
+def test_write_tree_csv():
+    out = io.StringIO(newline='')
+    write_tree([('a', None), ('b', None), ('c', 'a')], out, 'csv')
+    out.seek(0)
+    assert list(csv.reader(out)) == [['name', 'parent'], ['a', ''], ['b', ''],
+                                     ['c', 'a']]
+
+
+def test_write_tree_errors():
+    with pytest.raises(ValueError):
+        write_tree(PAIRS, io.StringIO(), 'xml')
+    with pytest.raises(ValueError):
+        write_tree([('a', None), ('b', None), ('c', 'a')], io.StringIO())